@@ -1,26 +1,106 @@
 from fastapi import FastAPI,HTTPException
 import uvicorn
 import os
+import json
 import time
 import uuid
-from typing import List,Tuple
+import asyncio
+from typing import Any,Dict,List,Optional,Tuple
+from contextlib import aclosing, asynccontextmanager
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.responses import RedirectResponse
+from starlette.responses import JSONResponse, PlainTextResponse, RedirectResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from AI_ChatBot.pipeline.queryprocessing import QueryProcessingPipeline
-from AI_ChatBot.pipeline.cache import CacheTrainingPipeline
-from AI_ChatBot.components.rag import RAG
-from supabase import create_client, Client
+from AI_ChatBot.config.configuration import ConfigurationManager
+from AI_ChatBot.utils.startup import StartupReport
+from AI_ChatBot.utils.metrics import REGISTRY, span, start_timings
+from AI_ChatBot.logging import logger
 
+startup_report = StartupReport()
 load_dotenv()
 supabase_url = os.getenv('SUPABASE_URL')
 supabase_key = os.getenv('SUPABASE_KEY')
-supabase: Client = create_client(supabase_url, supabase_key)
+startup_config = ConfigurationManager().getStartupConfig()
+metrics_config = ConfigurationManager().getMetricsConfig()
 
-app = FastAPI()
-cache_pipeline = CacheTrainingPipeline()
-cache = cache_pipeline.main()
+# Chat services are built by `_warmup`, not at import time, so the heavy
+# dependencies (langchain, langgraph, provider SDKs) stay out of the import path.
+supabase = None
+cache = None
+query_processor = None
+history_store = None
+history_writer = None
+rag = None
+graph = None
+_warmup_task: asyncio.Task = None
+
+def _build_services():
+    """Import the pipelines and build the services; runs in a worker thread."""
+    global cache, query_processor, history_store, history_writer, rag, graph
+    cache_pipeline = startup_report.import_module("AI_ChatBot.pipeline.cache")
+    query_pipeline = startup_report.import_module("AI_ChatBot.pipeline.queryprocessing")
+    history_pipeline = startup_report.import_module("AI_ChatBot.pipeline.history")
+    persistence_pipeline = startup_report.import_module("AI_ChatBot.pipeline.persistence")
+    rag_module = startup_report.import_module("AI_ChatBot.components.rag")
+
+    with startup_report.step("cache"):
+        cache = cache_pipeline.CacheTrainingPipeline().main()
+    with startup_report.step("query processor"):
+        query_processor = query_pipeline.QueryProcessingPipeline().main()
+    # retrieval and the semantic response cache share one embedder and one vector cache
+    query_processor.attach_vector_cache(cache.vector_cache)
+    cache.attach_embedder(query_processor.embed_query, query_processor.preprocess_query)
+
+    history_store = history_pipeline.SessionHistoryPipeline().main()
+    # chat_history writes are queued and flushed in bulk off the request path
+    history_writer = persistence_pipeline.HistoryPersistencePipeline().main()
+
+    with startup_report.step("graph"):
+        configuration_manager = ConfigurationManager()
+        rag = rag_module.RAG(
+            query_processor,
+            configuration_manager.getRouterConfig(),
+            configuration_manager.getContextPackingConfig(),
+            configuration_manager.getLLMPoolConfig(),
+        )
+        graph = rag.build_graph()
+
+async def _warmup():
+    global supabase
+    try:
+        await asyncio.to_thread(_build_services)
+        with startup_report.step("supabase client"):
+            from supabase import acreate_client
+            # Async client, created inside the event loop
+            supabase = await acreate_client(supabase_url, supabase_key)
+        await history_writer.start(supabase)
+        logger.info(f"Chat services ready: {startup_report.as_dict()}")
+    except Exception:
+        logger.exception("Chat service warmup failed")
+        raise
+
+async def _ensure_ready():
+    """Hold early requests of a fast-start instance until warmup completes."""
+    try:
+        await asyncio.shield(_warmup_task)
+    except Exception:
+        raise HTTPException(503, "Service unavailable")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global _warmup_task
+    _warmup_task = asyncio.create_task(_warmup(), name="warmup")
+    if not startup_config.fast_start:
+        await _warmup_task
+    yield
+    await asyncio.wait({_warmup_task})
+    if history_writer is not None:
+        await history_writer.stop()
+    if cache is not None:
+        cache.close()
+
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://localhost:3000",  # Vite dev server
@@ -38,129 +118,336 @@ app.add_middleware(
 class ChatRequest(BaseModel):
     session_id: str = None
     message: str
+    timings: bool = False   # include the per-stage timing breakdown in the response
 
 class ChatResponse(BaseModel):
     session_id: str
     response: str
     cached: bool
     elapsed_time: float
-
-queryProcessing = QueryProcessingPipeline()
-query_processor = queryProcessing.main()
-
-rag = RAG(query_processor)
-graph = rag.build_graph()
+    timings: Optional[Dict[str, float]] = None
 
 
 @app.get('/',tags=["authentication"])
 async def index():
     return RedirectResponse(url='/docs')
 
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the process is up and serving; says nothing about warmup."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: 200 once the chat services are built, 503 while warming up or failed."""
+    if _warmup_task is not None and _warmup_task.done() and not _warmup_task.cancelled():
+        if _warmup_task.exception() is None:
+            return {"status": "ready", "startup": startup_report.as_dict()}
+        return JSONResponse({"status": "failed", "startup": startup_report.as_dict()}, status_code=503)
+    return JSONResponse({"status": "warming", "startup": startup_report.as_dict()}, status_code=503)
+
+@app.get("/cache/stats")
+async def cache_stats():
+    await _ensure_ready()
+    return {
+        "vectors": cache.vector_stats(),
+        "semantic": cache.semantic_stats(),
+        "history_writer": history_writer.stats(),
+        "embedding_batcher": query_processor.batcher.stats() if query_processor.batcher else None,
+        "router": rag.router.stats() if rag.router else None,
+        "retrieval": query_processor.retrieval_cache.stats() if query_processor.retrieval_cache else None,
+        "context_packing": rag.packer.stats() if rag.packer else None,
+        "llm": rag.pool.stats(),
+    }
+
+@app.get("/metrics")
+async def metrics():
+    """Stage latency histograms and cache hit/miss counters, Prometheus text format."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+def _timings_for(req: ChatRequest, timings: Dict[str, float]) -> Optional[Dict[str, float]]:
+    return timings if req.timings or metrics_config.timings_in_response else None
+
+def _observe_request(endpoint: str, cached: bool, elapsed: float):
+    REGISTRY.observe("chat_request_seconds", elapsed, endpoint=endpoint, cached=str(cached).lower())
+
+async def _open_turn(req: ChatRequest):
+    """Resolve the session, snapshot its history and record the user message."""
+    session_id = req.session_id or str(uuid.uuid4())
+    # recent history from the in-process store (fetched from Supabase on first touch)
+    with span("history_fetch"):
+        if req.session_id:
+            session = await history_store.get(supabase, session_id)
+        else:
+            session = history_store.create(session_id)
+    history = session.message_list()
+    history_pairs: List[Tuple[str,str]] = session.pair_list()
+
+    with span("history_write"):
+        await history_writer.enqueue(session_id, "user", req.message)
+        history_store.append(session_id, "user", req.message)
+    return session_id, history, history_pairs
+
+async def _record_reply(session_id: str, bot: str):
+    with span("history_write"):
+        await history_writer.enqueue(session_id, "assistant", bot)
+        history_store.append(session_id, "assistant", bot)
+
+def _source_artifacts(messages) -> list:
+    for m in reversed(messages):
+        if getattr(m, "type", None) == "tool" and hasattr(m, "artifact"):
+            return m.artifact or []
+    return []
+
+def _citations(artifacts: list) -> List[dict]:
+    citations = []
+    for doc in artifacts:
+        meta = doc.get("metadata") or {}
+        citations.append({"source": meta.get("filename", "unknown"), "score": doc.get("score")})
+    return citations
+
+async def _cache_result(user: str, history_pairs, bot: str, result: dict, artifacts: list):
+    # The response cache does gzip/disk IO, keep it off the event loop
+    with span("cache_store"):
+        await run_in_threadpool(
+            cache.set_response,
+            user,
+            history_pairs,
+            response_text=bot,
+            source_chunks=artifacts,
+            model=result.get("model", ""),
+            is_fallback=result.get("is_fallback", False),
+            latency=result.get("latency", 0.0)
+        )
+
+async def _lookup_response(user: str, history_pairs):
+    with span("cache_lookup"):
+        return await run_in_threadpool(cache.get_response, user, history_pairs)
+
+async def _lookup_semantic(user: str, history_pairs):
+    with span("semantic_lookup"):
+        try:
+            return await run_in_threadpool(cache.get_semantic_response, user, history_pairs)
+        except Exception as e:
+            logger.error(f"Semantic cache lookup failed: {e}")
+            return None
+
+def _start_semantic_lookup(user: str, history_pairs) -> Optional[asyncio.Task]:
+    """
+    The semantic tier embeds the query, so it runs alongside the graph instead of
+    in front of it: a miss costs nothing, a hit cancels the graph.
+    """
+    if cache.semantic_cache is None:
+        return None
+    return asyncio.create_task(_lookup_semantic(user, history_pairs))
+
+def _graph_input(flat_history, user: str) -> Dict[str, Any]:
+    # user_query lets the retrieve tool embed the same string as the semantic tier
+    return {"messages": flat_history, "user_query": user}
+
+async def _answer(flat_history, user: str, semantic: Optional[asyncio.Task]):
+    """graph.ainvoke raced against the semantic lookup; returns (semantic hit, None) or (None, result)."""
+    run = asyncio.create_task(graph.ainvoke(_graph_input(flat_history, user)))
+    try:
+        if semantic is not None:
+            await asyncio.wait({run, semantic}, return_when=asyncio.FIRST_COMPLETED)
+            hit = semantic.result() if semantic.done() else None
+            if hit:
+                return hit, None
+        return None, await run
+    finally:
+        run.cancel()
+
+async def _graph_events(flat_history, user: str, semantic: Optional[asyncio.Task]):
+    """
+    graph.astream items as ("graph", (mode, payload)), interleaved with one
+    ("semantic", hit or None) as soon as the semantic lookup finishes. Stops
+    after a semantic hit.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def produce():
+        try:
+            async for item in graph.astream(_graph_input(flat_history, user), stream_mode=["messages", "values"]):
+                await queue.put(item)
+        except Exception as e:
+            await queue.put(e)
+            return
+        await queue.put(None)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            get = asyncio.ensure_future(queue.get())
+            if semantic is not None:
+                await asyncio.wait({get, semantic}, return_when=asyncio.FIRST_COMPLETED)
+                if semantic.done():
+                    hit, semantic = semantic.result(), None
+                    yield "semantic", hit
+                    if hit:
+                        get.cancel()
+                        return
+            item = await get
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield "graph", item
+    finally:
+        producer.cancel()
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(req: ChatRequest):
     start_ts = time.time()
-
-    session_id = req.session_id or str(uuid.uuid4())
+    timings = start_timings()
+    await _ensure_ready()
     user = req.message
+    session_id, history, history_pairs = await _open_turn(req)
+
+    cache_hit = await _lookup_response(user, history_pairs)
+    if not cache_hit:
+        flat_history = history + [{"role": "user", "content": user}]
+        # invoke graph
+        try:
+            with span("graph"):
+                cache_hit, result = await _answer(flat_history, user, _start_semantic_lookup(user, history_pairs))
+        except Exception:
+            raise HTTPException(500, "Internal error")
 
-    # fetch & sort history
-    history = []
-    try:
-        resp = supabase.table("chat_history") \
-            .select("role,content,timestamp") \
-            .eq("session_id", session_id) \
-            .execute()
-        rows = resp.data or []
-        rows.sort(key=lambda r: r["timestamp"])
-        for r in rows:
-            history.append({"role": r["role"], "content": r["content"]})
-    except Exception:
-        history = []
-
-    # history.append({"role": "user", "content": user})
-
-    history_pairs: List[Tuple[str,str]] = []
-    # pair up user→assistant where possible
-    for i in range(len(history)-1):
-        if history[i]["role"] == "user" and history[i+1]["role"] == "assistant":
-            history_pairs.append((history[i]["content"], history[i+1]["content"]))
-    supabase.table("chat_history").insert({
-        "session_id": session_id,
-        "role": "user",
-        "content": user
-    }).execute()
-    cache_hit = cache.get_response(user, history_pairs)
     if cache_hit:
-        supabase.table("chat_history").insert({
-            "session_id": session_id,
-            "role": "assistant",
-            "content": cache_hit["response_text"]
-        }).execute()
+        await _record_reply(session_id, cache_hit["response_text"])
 
         elapsed = time.time() - start_ts
+        _observe_request("/chat", True, elapsed)
         return ChatResponse(
             session_id=session_id,
             response=cache_hit["response_text"],
             cached=True,
-            elapsed_time=round(elapsed, 4)
+            elapsed_time=round(elapsed, 4),
+            timings=_timings_for(req, timings)
         )
-    try:
-        supabase.table("chat_history").insert({
-            "session_id": session_id,
-            "role": "user",
-            "content": user
-        }).execute()
-    except Exception:
-        pass
-    
-    flat_history = history + [{"role": "user", "content": user}]
-    # invoke graph
-    try:
-        result = graph.invoke({"messages": flat_history})
-        bot = result["messages"][-1].content
-    except Exception:
-        raise HTTPException(500, "Internal error")
 
-    try:
-        supabase.table("chat_history").insert({
-            "session_id": session_id,
-            "role": "assistant",
-            "content": bot
-        }).execute()
-    except Exception:
-        pass
-
-    # # persist new turns
-    # try:
-    #     supabase.table("chat_history").insert([
-    #         {"session_id": session_id, "role": "user", "content": user},
-    #         {"session_id": session_id, "role": "assistant", "content": bot},
-    #     ]).execute()
-    # except Exception:
-    #     pass
-    artifacts = []
-    for m in reversed(result["messages"]):
-        if getattr(m, "type", None) == "tool" and hasattr(m, "artifact"):
-            artifacts = m.artifact
-            break
-    cache.set_response(
-        user,
-        history_pairs,
-        response_text=bot,
-        source_chunks=artifacts,
-        model=result.get("model", ""),
-        is_fallback=result.get("is_fallback", False),
-        latency=result.get("latency", 0.0)
-    )
+    bot = result["messages"][-1].content
+    await _record_reply(session_id, bot)
+    await _cache_result(user, history_pairs, bot, result, _source_artifacts(result["messages"]))
     elapsed = time.time() - start_ts
+    _observe_request("/chat", False, elapsed)
     return ChatResponse(
         session_id=session_id,
         response=bot,
         cached=False,
-        elapsed_time=round(elapsed, 4)
+        elapsed_time=round(elapsed, 4),
+        timings=_timings_for(req, timings)
     )
 
     # return ChatResponse(session_id=session_id, response=bot)
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _text_of(content) -> str:
+    # some providers stream content as a list of typed parts
+    if isinstance(content, str):
+        return content
+    return "".join(p.get("text", "") if isinstance(p, dict) else str(p) for p in content or [])
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(req: ChatRequest):
+    """
+    Server-Sent Events variant of /chat: `token` events carry the `generate`
+    node's output as it is produced, a final `done` event carries the full
+    response, `session_id`, `cached` and source citations. Cache hits are
+    served as a single `done` event.
+    """
+    start_ts = time.time()
+    timings = start_timings()
+    await _ensure_ready()
+    user = req.message
+    session_id, history, history_pairs = await _open_turn(req)
+    cache_hit = await _lookup_response(user, history_pairs)
+
+    async def events():
+        # the body is iterated by the response, not the endpoint: keep collecting into the same dict
+        start_timings(timings)
+        hit = cache_hit
+        result = None
+        streamed = False
+        held: List[str] = []    # generate tokens held back while the semantic tier may still answer
+        if not hit:
+            flat_history = history + [{"role": "user", "content": user}]
+            semantic = _start_semantic_lookup(user, history_pairs)
+            try:
+                with span("graph"):
+                    async with aclosing(_graph_events(flat_history, user, semantic)) as stream:
+                        async for source, payload in stream:
+                            if source == "semantic":
+                                if payload:
+                                    hit = payload
+                                    break
+                                semantic = None
+                                for token in held:
+                                    yield _sse("token", {"content": token})
+                                held.clear()
+                                continue
+                            mode, data = payload
+                            if mode == "messages":
+                                chunk, meta = data
+                                token = _text_of(chunk.content)
+                                if meta.get("langgraph_node") == "generate" and token:
+                                    streamed = True
+                                    if semantic is None:
+                                        yield _sse("token", {"content": token})
+                                    else:
+                                        held.append(token)
+                            else:
+                                result = data
+                if not hit:
+                    bot = _text_of(result["messages"][-1].content)
+            except Exception as e:
+                logger.exception(f"Streaming chat failed: {e}")
+                yield _sse("error", {"detail": "Internal error"})
+                return
+
+        if hit:
+            bot = hit["response_text"]
+            await _record_reply(session_id, bot)
+            elapsed = time.time() - start_ts
+            _observe_request("/chat/stream", True, elapsed)
+            yield _sse("done", {
+                "session_id": session_id,
+                "response": bot,
+                "cached": True,
+                "sources": _citations(hit.get("source_chunks") or []),
+                "elapsed_time": round(elapsed, 4),
+                "timings": _timings_for(req, timings),
+            })
+            return
+
+        # the graph finished before the semantic lookup did
+        for token in held:
+            yield _sse("token", {"content": token})
+        if not streamed:
+            # answered directly by query_or_respond, without the generate node
+            yield _sse("token", {"content": bot})
+        artifacts = _source_artifacts(result["messages"])
+        await _record_reply(session_id, bot)
+        await _cache_result(user, history_pairs, bot, result, artifacts)
+        elapsed = time.time() - start_ts
+        _observe_request("/chat/stream", False, elapsed)
+        yield _sse("done", {
+            "session_id": session_id,
+            "response": bot,
+            "cached": False,
+            "sources": _citations(artifacts),
+            "elapsed_time": round(elapsed, 4),
+            "timings": _timings_for(req, timings),
+        })
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 if  __name__ == "__main__":
     uvicorn.run(app,host='localhost',port = 8000)
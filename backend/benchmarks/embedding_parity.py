@@ -0,0 +1,203 @@
+"""
+Parity and latency check for the local ONNX embedding backend.
+
+Embeds a sample of stored `chunks` texts locally and compares the vectors with
+the embeddings already in the table (cosine), then times single-query
+embedding against the hosted endpoint when a token is configured.
+
+    python benchmarks/embedding_parity.py --sample 200 --min-cosine 0.99
+
+Exits non-zero when any sampled chunk falls below --min-cosine. int8 exports
+trade a little parity for speed; use a lower bound (e.g. 0.97) for those.
+
+    python benchmarks/embedding_parity.py --offline
+
+runs LocalEmbeddings end to end on a tiny synthetic model instead (a WordPiece
+tokenizer.json and an ONNX graph that looks token embeddings up in a fixed
+table, built in a temp dir; needs the `onnx` package) and compares the vectors
+of known sentences with pinned references. That covers tokenization,
+truncation, padding masks, mean pooling and normalization without the model
+download, Supabase or the HF endpoint.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from dotenv import load_dotenv
+from supabase import create_client
+
+ROOT = Path(__file__).resolve().parents[1]
+os.chdir(ROOT)              # config/config.yaml and params.yaml are read relative to the backend root
+sys.path.insert(0, str(ROOT / "src"))
+
+from AI_ChatBot.config.configuration import ConfigurationManager
+from AI_ChatBot.components.local_embeddings import LocalEmbeddings
+
+QUERIES = [
+    "What was NVDA revenue last quarter?",
+    "AAPL dividend",
+    "How do rising interest rates affect bond prices?",
+    "Explain the difference between an ETF and a mutual fund",
+]
+
+
+# synthetic model for --offline: token i embeds as sin((i + 1) * (d + 1)), d < _TINY_DIM
+_TINY_VOCAB = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "what", "is", "an", "etf", "?", "bond",
+               "yield", "##s", "rise", "when", "rates", "fall", "."]
+_TINY_DIM = 4
+_TINY_MAX_LENGTH = 8
+# sentence → (token ids, vector); ids include [CLS]/[SEP] and truncation to _TINY_MAX_LENGTH
+_TINY_REFERENCE = {
+    "What is an ETF?": ([2, 4, 5, 6, 7, 8, 3], [0.160168, -0.328212, 0.518875, -0.772912]),
+    "bond yields rise when rates fall.": ([2, 9, 10, 11, 12, 13, 14, 3], [-0.5252, 0.623332, -0.17047, -0.55368]),
+    "ETF": ([2, 7, 3], [0.309971, 0.35009, -0.854432, -0.2265]),
+    "what is an etf what is an etf": ([2, 4, 5, 6, 7, 4, 5, 3], [-0.863038, -0.446758, -0.235617, 0.007514]),
+    "zebra bond": ([2, 1, 9, 3], [-0.132375, 0.45785, -0.735819, 0.481062]),
+}
+
+
+def _percentiles(samples):
+    arr = np.asarray(samples) * 1000
+    return {"p50_ms": round(float(np.percentile(arr, 50)), 2),
+            "p95_ms": round(float(np.percentile(arr, 95)), 2),
+            "mean_ms": round(float(arr.mean()), 2)}
+
+
+def _time_queries(embed, runs):
+    samples = []
+    for i in range(runs):
+        started = time.perf_counter()
+        embed(QUERIES[i % len(QUERIES)])
+        samples.append(time.perf_counter() - started)
+    return _percentiles(samples)
+
+
+def _build_tiny_model(model_dir: Path):
+    """Write tokenizer.json and model.onnx of the synthetic model into `model_dir`."""
+    try:
+        import onnx
+        from onnx import TensorProto, helper, numpy_helper
+    except ImportError:
+        sys.exit("--offline needs the onnx package (pip install onnx)")
+    from tokenizers import Tokenizer, normalizers, pre_tokenizers, processors
+    from tokenizers.models import WordPiece
+
+    vocab = {token: i for i, token in enumerate(_TINY_VOCAB)}
+    tokenizer = Tokenizer(WordPiece(vocab, unk_token="[UNK]"))
+    tokenizer.normalizer = normalizers.BertNormalizer(lowercase=True)
+    tokenizer.pre_tokenizer = pre_tokenizers.BertPreTokenizer()
+    tokenizer.post_processor = processors.TemplateProcessing(
+        single="[CLS] $A [SEP]", special_tokens=[("[CLS]", vocab["[CLS]"]), ("[SEP]", vocab["[SEP]"])]
+    )
+    tokenizer.save(str(model_dir / "tokenizer.json"))
+
+    ids = np.arange(len(_TINY_VOCAB), dtype=np.float32)[:, None] + 1
+    table = np.sin(ids * np.arange(1, _TINY_DIM + 1, dtype=np.float32)).astype(np.float32)
+    graph = helper.make_graph(
+        [helper.make_node("Gather", ["table", "input_ids"], ["last_hidden_state"], axis=0)],
+        "tiny",
+        [helper.make_tensor_value_info(name, TensorProto.INT64, ["batch", "seq"])
+         for name in ("input_ids", "attention_mask", "token_type_ids")],
+        [helper.make_tensor_value_info("last_hidden_state", TensorProto.FLOAT, ["batch", "seq", _TINY_DIM])],
+        initializer=[numpy_helper.from_array(table, "table")],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.save(model, str(model_dir / "model.onnx"))
+
+
+def offline_check(tolerance: float, print_reference: bool = False) -> int:
+    """Embed the pinned sentences with the synthetic model; returns the number of mismatches."""
+    from AI_ChatBot.entity import EmbeddingConfig
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _build_tiny_model(Path(tmp))
+        config = EmbeddingConfig(backend="onnx", model_repo="tiny", onnx_file="model.onnx", model_dir=Path(tmp),
+                                 max_length=_TINY_MAX_LENGTH, batch_size=4, intra_op_threads=1, pool_workers=1)
+        local = LocalEmbeddings(config)
+        sentences = list(_TINY_REFERENCE)
+        # one padded batch: pooling has to ignore the padding of the shorter sentences
+        vectors = local.embed_documents(sentences)
+        ids = [e.ids for e in local.tokenizer.encode_batch(sentences)]
+        local.pool.shutdown()
+
+    if print_reference:
+        for sentence, vec, tokens in zip(sentences, vectors, ids):
+            tokens = [t for t in tokens if t != 0]
+            print(f"    {sentence!r}: ({tokens}, {[round(v, 6) for v in vec]}),")
+        return 0
+    failures = 0
+    for sentence, vec, tokens in zip(sentences, vectors, ids):
+        expected_ids, expected = _TINY_REFERENCE[sentence]
+        tokens = [t for t in tokens if t != 0]
+        error = float(np.abs(np.asarray(vec) - np.asarray(expected)).max())
+        ok = tokens == expected_ids and error <= tolerance
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {sentence!r}: max abs error {error:.2e}"
+              + ("" if tokens == expected_ids else f", token ids {tokens} != {expected_ids}"))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sample", type=int, default=200, help="stored chunks to compare")
+    parser.add_argument("--runs", type=int, default=50, help="single-query embeddings to time")
+    parser.add_argument("--min-cosine", type=float, default=0.99)
+    parser.add_argument("--offline", action="store_true",
+                        help="check against pinned vectors of a synthetic model (no network)")
+    parser.add_argument("--tolerance", type=float, default=1e-5, help="max abs error for --offline")
+    parser.add_argument("--print-reference", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.offline or args.print_reference:
+        failures = offline_check(args.tolerance, args.print_reference)
+        if failures:
+            sys.exit(f"offline check failed for {failures} sentences")
+        return
+
+    load_dotenv()
+    config = ConfigurationManager().getEmbeddingConfig()
+    local = LocalEmbeddings(config)
+
+    supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+    rows = supabase.table("chunks").select("id,text,embedding").limit(args.sample).execute().data or []
+    if not rows:
+        sys.exit("no chunks to compare against")
+    stored = np.asarray([json.loads(r["embedding"]) if isinstance(r["embedding"], str) else r["embedding"]
+                         for r in rows], dtype=np.float32)
+    stored /= np.clip(np.linalg.norm(stored, axis=1, keepdims=True), 1e-12, None)
+    if stored.shape[1] != 384:
+        sys.exit(f"stored embeddings have dim {stored.shape[1]}; the table was not ingested with MiniLM")
+
+    started = time.perf_counter()
+    vectors = np.asarray(local.embed_documents([r["text"] for r in rows]), dtype=np.float32)
+    batch_seconds = time.perf_counter() - started
+    cosine = (vectors * stored).sum(axis=1)
+
+    report = {
+        "model": f"{config.model_repo}/{config.onnx_file}",
+        "chunks": len(rows),
+        "cosine_min": round(float(cosine.min()), 5),
+        "cosine_mean": round(float(cosine.mean()), 5),
+        "worst_chunk": rows[int(cosine.argmin())]["id"],
+        "batch_chunks_per_sec": round(len(rows) / batch_seconds, 1),
+        "local_query": _time_queries(local.embed_query, args.runs),
+    }
+    token = os.getenv("HUGGINGFACEHUB_API_TOKEN")
+    if token:
+        from langchain_huggingface.embeddings.huggingface_endpoint import HuggingFaceEndpointEmbeddings
+        endpoint = HuggingFaceEndpointEmbeddings(model=config.model_repo, task="feature-extraction",
+                                                 huggingfacehub_api_token=token)
+        report["endpoint_query"] = _time_queries(endpoint.embed_query, min(args.runs, 20))
+    print(json.dumps(report, indent=2))
+    if cosine.min() < args.min_cosine:
+        sys.exit(f"parity check failed: min cosine {cosine.min():.5f} < {args.min_cosine}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+"""
+In-process stand-ins for the serving path's external services, used by
+benchmarks/serving.py:
+
+- FakeDatabase / FakeSupabase / FakeAsyncSupabase: in-memory tables behind the
+  supabase-py query builder subset the app uses (`table().select/insert/upsert/
+  eq/gt/in_/order/limit/range`) and `rpc("match_chunks")`, with a per-call latency.
+- DeterministicEmbeddings: hashed bag-of-words vectors, so texts sharing terms
+  are similar and every run embeds identically.
+- FakeChatModel: a LangChain chat model with configurable latency that calls
+  `retrieve` when tools are bound and otherwise answers (and streams) a fixed text.
+- build_corpus / make_queries: a synthetic finance corpus and query mix.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from AI_ChatBot.components.lexical_index import tokenize
+
+
+# — Supabase —
+class _Response:
+    def __init__(self, data: List[Dict[str, Any]], count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+class FakeDatabase:
+    """Tables shared by the sync and async clients; `match_chunks` over the `chunks` embeddings."""
+    def __init__(self):
+        self.tables: Dict[str, List[Dict[str, Any]]] = {}
+        self.lock = threading.Lock()
+        self._matrix: Optional[np.ndarray] = None
+
+    def rows(self, table: str) -> List[Dict[str, Any]]:
+        return self.tables.setdefault(table, [])
+
+    def write(self, table: str, rows: List[Dict[str, Any]], on_conflict: Optional[str], ignore_duplicates: bool):
+        with self.lock:
+            target = self.rows(table)
+            if on_conflict:
+                index = {r.get(on_conflict): i for i, r in enumerate(target)}
+                for row in rows:
+                    i = index.get(row.get(on_conflict))
+                    if i is None:
+                        index[row.get(on_conflict)] = len(target)
+                        target.append(dict(row))
+                    elif not ignore_duplicates:
+                        target[i] = {**target[i], **row}
+            else:
+                target.extend(dict(r) for r in rows)
+            if table == "chunks":
+                self._matrix = None
+
+    def match_chunks(self, query_embedding: List[float], match_count: int) -> List[Dict[str, Any]]:
+        with self.lock:
+            chunks = self.rows("chunks")
+            if self._matrix is None:
+                self._matrix = np.asarray([r["embedding"] for r in chunks], dtype=np.float32)
+            matrix = self._matrix
+        if not len(chunks):
+            return []
+        scores = matrix @ np.asarray(query_embedding, dtype=np.float32)
+        k = min(match_count, len(chunks))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {key: chunks[i][key] for key in ("id", "document_id", "chunk_index", "text", "metadata")}
+            | {"similarity": float(scores[i])}
+            for i in top
+        ]
+
+
+class _Query:
+    def __init__(self, db: FakeDatabase, table: str, latency: float):
+        self.db = db
+        self.table_name = table
+        self.latency = latency
+        self.op = "select"
+        self.columns: Optional[List[str]] = None
+        self.count: Optional[str] = None
+        self.payload: List[Dict[str, Any]] = []
+        self.on_conflict: Optional[str] = None
+        self.ignore_duplicates = False
+        self.filters = []
+        self.orders = []
+        self.window = (0, None)
+
+    # builders
+    def select(self, columns: str = "*", count: Optional[str] = None):
+        self.columns = None if columns.strip() == "*" else [c.strip() for c in columns.split(",")]
+        self.count = count
+        return self
+
+    def insert(self, rows):
+        self.op, self.payload = "insert", rows if isinstance(rows, list) else [rows]
+        return self
+
+    def upsert(self, rows, on_conflict: str = "id", ignore_duplicates: bool = False, **_):
+        self.op, self.payload = "upsert", rows if isinstance(rows, list) else [rows]
+        self.on_conflict, self.ignore_duplicates = on_conflict, ignore_duplicates
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda r: r.get(column) == value)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda r: r.get(column) is not None and r.get(column) > value)
+        return self
+
+    def in_(self, column, values):
+        values = set(values)
+        self.filters.append(lambda r: r.get(column) in values)
+        return self
+
+    def order(self, column, desc: bool = False):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, n: int):
+        self.window = (self.window[0], self.window[0] + n)
+        return self
+
+    def range(self, start: int, end: int):
+        self.window = (start, end + 1)
+        return self
+
+    def _run(self) -> _Response:
+        if self.op in ("insert", "upsert"):
+            self.db.write(self.table_name, self.payload,
+                          self.on_conflict if self.op == "upsert" else None, self.ignore_duplicates)
+            return _Response(self.payload)
+        with self.db.lock:
+            rows = [r for r in self.db.rows(self.table_name) if all(f(r) for f in self.filters)]
+        for column, desc in reversed(self.orders):
+            rows.sort(key=lambda r: (r.get(column) is None, r.get(column)), reverse=desc)
+        total = len(rows)
+        rows = rows[self.window[0]:self.window[1]]
+        if self.columns:
+            rows = [{c: r.get(c) for c in self.columns} for r in rows]
+        return _Response(rows, total if self.count else None)
+
+    def execute(self) -> _Response:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._run()
+
+
+class _AsyncQuery(_Query):
+    async def execute(self) -> _Response:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._run()
+
+
+class _Rpc:
+    def __init__(self, db: FakeDatabase, name: str, params: Dict[str, Any], latency: float):
+        if name != "match_chunks":
+            raise ValueError(f"unknown rpc {name}")
+        self.db, self.params, self.latency = db, params, latency
+
+    def execute(self) -> _Response:
+        if self.latency:
+            time.sleep(self.latency)
+        return _Response(self.db.match_chunks(self.params["query_embedding"], self.params["match_count"]))
+
+
+class _AsyncRpc(_Rpc):
+    async def execute(self) -> _Response:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return _Response(self.db.match_chunks(self.params["query_embedding"], self.params["match_count"]))
+
+
+class FakeSupabase:
+    """Sync client: `table()` and `rpc()` with a fixed latency per `execute`."""
+    query_class, rpc_class = _Query, _Rpc
+
+    def __init__(self, db: FakeDatabase, latency: float = 0.0):
+        self.db = db
+        self.latency = latency
+
+    def table(self, name: str):
+        return self.query_class(self.db, name, self.latency)
+
+    def rpc(self, name: str, params: Dict[str, Any]):
+        return self.rpc_class(self.db, name, params, self.latency)
+
+
+class FakeAsyncSupabase(FakeSupabase):
+    """Async client: `await ....execute()`."""
+    query_class, rpc_class = _AsyncQuery, _AsyncRpc
+
+
+# — Embeddings —
+class DeterministicEmbeddings:
+    """Sum of per-token pseudo-random vectors (seeded by the token), L2-normalized."""
+    def __init__(self, dim: int = 384, latency: float = 0.0):
+        self.dim = dim
+        self.latency = latency
+        self._tokens: Dict[str, np.ndarray] = {}
+
+    def _token(self, token: str) -> np.ndarray:
+        vec = self._tokens.get(token)
+        if vec is None:
+            rng = np.random.default_rng(zlib.crc32(token.encode("utf-8")))
+            vec = self._tokens[token] = rng.standard_normal(self.dim).astype(np.float32)
+        return vec
+
+    def _embed(self, text: str) -> List[float]:
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for token in tokenize(text):
+            vec += self._token(token)
+        norm = np.linalg.norm(vec)
+        return (vec / norm if norm else vec).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._embed(text)
+
+
+# — Chat model —
+class FakeChatModel(BaseChatModel):
+    """
+    Answers after `latency` seconds (scaled by up to `jitter` at random). With
+    tools bound it calls `retrieve` with the latest user message; otherwise it
+    returns `answer`, streamed word by word.
+    """
+    latency: float = 0.0
+    jitter: float = 0.0
+    answer: str = "Based on the knowledge base, diversification lowers portfolio risk [source]."
+    tools_bound: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.model_copy(update={"tools_bound": True})
+
+    def _delay(self) -> float:
+        return self.latency * (1 + self.jitter * random.random())
+
+    def _message(self, messages) -> AIMessage:
+        if self.tools_bound:
+            query = next((m.content for m in reversed(messages) if m.type == "human"), "")
+            call_id = "call_" + hashlib.md5(query.encode("utf-8")).hexdigest()[:12]
+            return AIMessage(content="", tool_calls=[{"name": "retrieve", "args": {"query": query}, "id": call_id}])
+        return AIMessage(content=self.answer)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self._delay())
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self._delay())
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self._delay())
+        message = self._message(messages)
+        if message.tool_calls:
+            call = message.tool_calls[0]
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[{
+                "name": call["name"], "args": json.dumps(call["args"]),
+                "id": call["id"], "index": 0,
+            }]))
+            return
+        for word in message.content.split(" "):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word + " "))
+            if run_manager:
+                await run_manager.on_llm_new_token(word + " ", chunk=chunk)
+            yield chunk
+
+
+# — Corpus and queries —
+TOPICS = [
+    "bond yields", "interest rates", "inflation", "mutual funds", "exchange traded funds", "dividends",
+    "earnings per share", "options pricing", "portfolio diversification", "credit risk", "liquidity",
+    "central banks", "cryptocurrency", "payment systems", "algorithmic trading", "machine learning models",
+    "risk management", "valuation ratios", "hedging with futures", "market volatility",
+]
+_SENTENCES = [
+    "{t} matter to investors because they shape expected returns over time.",
+    "Analysts compare {t} across markets to judge relative value.",
+    "Regulators monitor {t} closely when financial conditions tighten.",
+    "A common mistake is to look at {t} in isolation from portfolio risk.",
+    "Historical data on {t} shows long cycles and sudden regime changes.",
+    "Students should learn how {t} interact with monetary policy decisions.",
+]
+
+
+def build_corpus(db: FakeDatabase, embedder: DeterministicEmbeddings, documents: int, chunks_per_document: int,
+                 seed: int = 7):
+    """Fill the `documents` and `chunks` tables with a synthetic finance corpus."""
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    documents_rows, chunk_rows = [], []
+    for d in range(documents):
+        topic = TOPICS[d % len(TOPICS)]
+        content_hash = hashlib.sha256(f"doc-{d}".encode()).hexdigest()[:16]
+        filename = f"{topic.replace(' ', '_')}_{d}.pdf"
+        documents_rows.append({"id": d + 1, "title": filename, "version": 1,
+                               "updated_at": (now - timedelta(minutes=d)).isoformat()})
+        texts = []
+        for c in range(chunks_per_document):
+            other = rng.choice(TOPICS)
+            texts.append(" ".join(rng.choice(_SENTENCES).format(t=t.capitalize() if i == 0 else t)
+                                  for i, t in enumerate((topic, other, topic, other))))
+        for c, (text, embedding) in enumerate(zip(texts, embedder.embed_documents(texts))):
+            chunk_rows.append({
+                "id": f"{content_hash}_NarrativeText_{c}",
+                "document_id": d + 1,
+                "chunk_index": c,
+                "text": text,
+                "embedding": embedding,
+                "metadata": {"filename": filename, "content_hash": content_hash},
+                "updated_at": now.isoformat(),
+            })
+    db.write("documents", documents_rows, "id", False)
+    db.write("chunks", chunk_rows, "id", False)
+
+
+def make_queries(count: int, repeat_ratio: float, seed: int = 11) -> List[str]:
+    """`count` user questions; `repeat_ratio` of them are drawn from a small hot set."""
+    rng = random.Random(seed)
+    forms = ["What is {t}?", "How do {t} affect a portfolio?", "Explain {t} for a beginner",
+             "Compare {t} and {u}", "Why do {t} change?"]
+    hot = [forms[i % len(forms)].format(t=TOPICS[i], u=TOPICS[-1 - i]) for i in range(10)]
+    queries = []
+    for i in range(count):
+        if rng.random() < repeat_ratio:
+            queries.append(rng.choice(hot))
+        else:
+            t, u = rng.sample(TOPICS, 2)
+            queries.append(f"{rng.choice(forms).format(t=t, u=u)} (case {i})")
+    return queries
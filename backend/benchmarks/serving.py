@@ -0,0 +1,328 @@
+"""
+Offline benchmark of the chat serving path.
+
+Builds the app's services (CacheManager, QueryProcessor with its batcher,
+lexical index and retrieval cache, RAG with the LLM pool, history store and
+writer) against the in-process fakes in benchmarks/fakes.py, then
+  - drives `chat_endpoint` with a concurrent load generator, and
+  - micro-benchmarks CacheManager, QueryProcessor.process and RAG.generate.
+Reports throughput and p50/p95/p99 latency (plus per-stage p50/p95 from the
+/metrics spans) and compares the run against a stored baseline.
+
+    python benchmarks/serving.py                     # compare with benchmarks/baseline.json
+    python benchmarks/serving.py --requests 1000 --concurrency 64 --llm-ms 200
+    python benchmarks/serving.py --update-baseline   # after an intended change
+
+Fake latencies (--db-ms, --embed-ms, --llm-ms) stand in for the network, so
+the numbers measure the app's own overhead and concurrency behaviour. Absolute
+timings depend on the machine; keep the baseline from the machine that checks it.
+Exits non-zero when a p95 grows or a throughput drops by more than --tolerance.
+"""
+import argparse
+import asyncio
+import dataclasses
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+from unittest import mock
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+os.chdir(ROOT)              # config/config.yaml and params.yaml are read relative to the backend root
+sys.path.insert(0, str(ROOT))          # app.py
+sys.path.insert(0, str(ROOT / "src"))  # the AI_ChatBot package
+os.environ.setdefault("SUPABASE_URL", "http://supabase.invalid")
+os.environ.setdefault("SUPABASE_KEY", "offline")
+for _key in ("GOOGLE_API_KEY", "GROQ_API_KEY", "OPENAI_API_KEY"):
+    # the LLM pool only uses providers whose key is set; every provider is a FakeChatModel here
+    os.environ.setdefault(_key, "offline")
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from fakes import (DeterministicEmbeddings, FakeAsyncSupabase, FakeChatModel, FakeDatabase, FakeSupabase,
+                   build_corpus, make_queries)
+import app as app_module
+from AI_ChatBot.config.configuration import ConfigurationManager
+from AI_ChatBot.components import llm_pool, query_processing
+from AI_ChatBot.components.cache import CacheManager
+from AI_ChatBot.components.embedding_batcher import EmbeddingBatcher
+from AI_ChatBot.components.history import SessionHistoryStore
+from AI_ChatBot.components.lexical_index import LexicalIndex
+from AI_ChatBot.components.persistence import HistoryWriter
+from AI_ChatBot.components.rag import RAG
+from AI_ChatBot.components.retrieval_cache import RetrievalCache
+from AI_ChatBot.logging import logger
+from AI_ChatBot.utils.metrics import REGISTRY
+
+BASELINE = Path(__file__).with_name("baseline.json")
+
+
+def summarize(samples: List[float], wall: float) -> Dict[str, float]:
+    ms = np.asarray(samples) * 1000
+    return {
+        "count": len(samples),
+        "throughput_per_s": round(len(samples) / wall, 2) if wall else 0.0,
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+    }
+
+
+def bench(fn: Callable[[int], Any], iterations: int) -> Dict[str, float]:
+    samples = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - t0)
+    return summarize(samples, time.perf_counter() - started)
+
+
+# — Services —
+async def build_services(args, workdir: Path) -> Dict[str, Any]:
+    """Build the app's services on the fakes and install them as the app's globals."""
+    cm = ConfigurationManager()
+    db = FakeDatabase()
+    build_corpus(db, DeterministicEmbeddings(), args.documents, args.chunks_per_document)
+    embedder = DeterministicEmbeddings(latency=args.embed_ms / 1000)
+    sync_db = FakeSupabase(db, latency=args.db_ms / 1000)
+    async_db = FakeAsyncSupabase(db, latency=args.db_ms / 1000)
+
+    (workdir / "responses").mkdir(parents=True, exist_ok=True)
+    cache = CacheManager(dataclasses.replace(
+        cm.get_CacheConfig(),
+        json_dir=workdir / "responses",
+        query_dir=workdir / "query_cache.db",
+    ))
+
+    with mock.patch.object(query_processing, "create_client", lambda url, key: sync_db), \
+         mock.patch("AI_ChatBot.components.local_embeddings.LocalEmbeddings", lambda config: embedder):
+        processor = query_processing.QueryProcessor(
+            dataclasses.replace(cm.getQueryConfig(), backend="supabase"),
+            dataclasses.replace(cm.getEmbeddingConfig(), backend="onnx"),
+        )
+    processor.async_supabase = async_db
+    batcher_config = cm.getEmbeddingBatcherConfig()
+    if batcher_config.enabled:
+        processor.attach_batcher(EmbeddingBatcher(embedder.embed_documents, batcher_config))
+    lexical_config = cm.getLexicalIndexConfig()
+    if lexical_config.enabled:
+        lexical = LexicalIndex(dataclasses.replace(lexical_config, root_dir=workdir / "lexical"), sync_db)
+        lexical.build_from_table()
+        processor.attach_lexical_index(lexical)
+    retrieval_config = cm.getRetrievalCacheConfig()
+    if retrieval_config.enabled:
+        retrieval_cache = RetrievalCache(retrieval_config, sync_db)
+        retrieval_cache.check_version()
+        processor.attach_retrieval_cache(retrieval_cache)
+    processor.attach_vector_cache(cache.vector_cache)
+    cache.attach_embedder(processor.embed_query, processor.preprocess_query)
+
+    def chat_model(model, model_provider=None):
+        return FakeChatModel(latency=args.llm_ms / 1000, jitter=args.llm_jitter)
+
+    with mock.patch.object(llm_pool, "init_chat_model", chat_model):
+        rag = RAG(processor, cm.getRouterConfig(), cm.getContextPackingConfig(), cm.getLLMPoolConfig())
+    graph = rag.build_graph()
+
+    history_writer = HistoryWriter(cm.getPersistenceConfig())
+    await history_writer.start(async_db)
+    warmed = asyncio.get_running_loop().create_future()
+    warmed.set_result(None)
+
+    app_module.supabase = async_db
+    app_module.cache = cache
+    app_module.query_processor = processor
+    app_module.history_store = SessionHistoryStore(cm.getHistoryConfig())
+    app_module.history_writer = history_writer
+    app_module.rag = rag
+    app_module.graph = graph
+    app_module._warmup_task = warmed
+    return {"db": db, "cache": cache, "processor": processor, "rag": rag}
+
+
+async def close_services(services: Dict[str, Any]):
+    await app_module.history_writer.stop()
+    if services["processor"].batcher is not None:
+        services["processor"].batcher.close()
+    services["cache"].close()
+
+
+# — Load —
+async def run_load(args) -> Dict[str, Any]:
+    queries = make_queries(args.requests, args.repeat_ratio, seed=args.seed)
+    pending = iter(queries)
+    samples: List[float] = []
+    outcome = {"cached": 0, "errors": 0}
+
+    async def client(worker: int):
+        session_id = None
+        turns = 0
+        for message in pending:
+            req = app_module.ChatRequest(message=message, **({"session_id": session_id} if session_id else {}))
+            started = time.perf_counter()
+            try:
+                resp = await app_module.chat_endpoint(req)
+            except Exception as e:
+                outcome["errors"] += 1
+                logger.error(f"Benchmark request failed: {e}")
+                continue
+            samples.append(time.perf_counter() - started)
+            outcome["cached"] += resp.cached
+            # every client holds short conversations, so some turns carry history
+            turns = (turns + 1) % args.turns_per_session
+            session_id = resp.session_id if turns else None
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(w) for w in range(args.concurrency)))
+    wall = time.perf_counter() - started
+    return {**summarize(samples, wall), **outcome}
+
+
+def stage_latencies() -> Dict[str, Dict[str, float]]:
+    stages = {}
+    for (name, labels), histogram in sorted(REGISTRY.histograms.items()):
+        if name == "chat_stage_seconds":
+            stages[dict(labels)["stage"]] = {
+                "count": histogram.count,
+                "p50_ms": round(histogram.percentile(50) * 1000, 3),
+                "p95_ms": round(histogram.percentile(95) * 1000, 3),
+            }
+    return stages
+
+
+# — Micro-benchmarks —
+def run_micro(args, services: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    cache: CacheManager = services["cache"]
+    processor = services["processor"]
+    rag: RAG = services["rag"]
+    n = args.iterations
+    results = {}
+
+    cache.set_response("micro hit", [], "answer", [], "fake", False, 0.0)
+    results["cache.get_response hit"] = bench(lambda i: cache.get_response("micro hit", []), n)
+    results["cache.get_response miss"] = bench(lambda i: cache.get_response(f"micro miss {i}", []), n)
+    results["cache.get_semantic_response"] = bench(lambda i: cache.get_semantic_response(f"micro miss {i}", []), n)
+    results["cache.set_response"] = bench(
+        lambda i: cache.set_response(f"micro set {i}", [], "answer", [], "fake", False, 0.0), n)
+
+    retrieval_cache = processor.retrieval_cache
+    processor.attach_retrieval_cache(None)
+    results["QueryProcessor.process uncached"] = bench(
+        lambda i: processor.process(f"How do interest rates affect bond yields {i}?"), n)
+    processor.attach_retrieval_cache(retrieval_cache)
+    if retrieval_cache is not None:
+        results["QueryProcessor.process cached"] = bench(
+            lambda i: processor.process("How do interest rates affect bond yields?"), n)
+
+    question = "Explain portfolio diversification and credit risk"
+    docs = processor.process(question)["retrieved_chunks"]
+    state = {"messages": [
+        HumanMessage(question),
+        AIMessage(content="", tool_calls=[{"name": "retrieve", "args": {"query": question}, "id": "call_1"}]),
+        ToolMessage(content="\n\n".join(d["text"] for d in docs), artifact=docs, tool_call_id="call_1"),
+    ]}
+    results["RAG.generate"] = bench(lambda i: rag.generate(state), max(n // 10, 10))
+    return results
+
+
+# — Baseline —
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float, floor_ms: float) -> List[str]:
+    regressions = []
+    current = {"chat_endpoint": report["load"], **report["micro"]}
+    previous = {"chat_endpoint": baseline["load"], **baseline["micro"]}
+    for name, stats in current.items():
+        base = previous.get(name)
+        if base is None or max(stats["p95_ms"], base["p95_ms"]) < floor_ms:
+            # sub-floor timings are dominated by scheduler and GC noise
+            continue
+        if stats["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {base['p95_ms']} → {stats['p95_ms']} ms")
+        if stats["throughput_per_s"] < base["throughput_per_s"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {base['throughput_per_s']} → {stats['throughput_per_s']}/s")
+    return regressions
+
+
+def print_table(report: Dict[str, Any], baseline: Dict[str, Any] = None):
+    rows = {"chat_endpoint": report["load"], **report["micro"]}
+    previous = {"chat_endpoint": baseline["load"], **baseline["micro"]} if baseline else {}
+    print(f"{'benchmark':36} {'count':>6} {'per_s':>10} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9} {'base_p95':>9}")
+    for name, s in rows.items():
+        base = previous.get(name, {}).get("p95_ms", "")
+        print(f"{name:36} {s['count']:>6} {s['throughput_per_s']:>10} {s['p50_ms']:>9} "
+              f"{s['p95_ms']:>9} {s['p99_ms']:>9} {base:>9}")
+    load = report["load"]
+    print(f"chat_endpoint: {load['cached']} cached, {load['errors']} errors")
+    for stage, s in report["stages"].items():
+        print(f"  stage {stage:28} {s['count']:>6} {'':>10} {s['p50_ms']:>9} {s['p95_ms']:>9}")
+
+
+async def main_async(args) -> Dict[str, Any]:
+    with tempfile.TemporaryDirectory(prefix="chat-bench-") as tmp:
+        services = await build_services(args, Path(tmp))
+        try:
+            load = await run_load(args)
+            stages = stage_latencies()
+            micro = await asyncio.to_thread(run_micro, args, services)
+        finally:
+            await close_services(services)
+    config = {k: v for k, v in vars(args).items()
+              if k not in ("baseline", "update_baseline", "tolerance", "noise_floor_ms", "output", "verbose")}
+    return {"config": config, "load": load, "stages": stages, "micro": micro}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400, help="chat requests sent by the load generator")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent clients")
+    parser.add_argument("--repeat-ratio", type=float, default=0.3, help="share of questions from a small hot set")
+    parser.add_argument("--turns-per-session", type=int, default=3)
+    parser.add_argument("--iterations", type=int, default=300, help="calls per micro-benchmark")
+    parser.add_argument("--documents", type=int, default=40)
+    parser.add_argument("--chunks-per-document", type=int, default=25)
+    parser.add_argument("--db-ms", type=float, default=5.0, help="fake Supabase latency per call")
+    parser.add_argument("--embed-ms", type=float, default=10.0, help="fake embedding latency per call")
+    parser.add_argument("--llm-ms", type=float, default=50.0, help="fake LLM latency per call")
+    parser.add_argument("--llm-jitter", type=float, default=0.5, help="LLM latency is scaled by up to 1 + jitter")
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative p95/throughput change")
+    parser.add_argument("--noise-floor-ms", type=float, default=1.0,
+                        help="benchmarks whose p95 stays below this are not compared")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--output", type=Path, help="also write the report to this file")
+    parser.add_argument("--verbose", action="store_true", help="keep the app's INFO logs")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logger.setLevel(logging.WARNING)
+    report = asyncio.run(main_async(args))
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else None
+    print_table(report, baseline)
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"baseline written to {args.baseline}")
+        return
+    if baseline is None:
+        print(f"no baseline at {args.baseline}; run with --update-baseline to store one")
+        return
+    if baseline.get("config") != report["config"]:
+        print("warning: run settings differ from the baseline's; the comparison is indicative only")
+    regressions = compare(report, baseline, args.tolerance, args.noise_floor_ms)
+    if regressions:
+        sys.exit("regressions against baseline:\n  " + "\n  ".join(regressions))
+    print(f"no regressions against baseline (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
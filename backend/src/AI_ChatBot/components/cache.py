@@ -1,5 +1,6 @@
 from time import time
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from collections import OrderedDict, deque
 import threading
 import hashlib
 import json
@@ -9,7 +10,11 @@ import sqlite3
 from pathlib import Path
 from datetime import datetime
 
+import numpy as np
+
 from AI_ChatBot.entity import CacheConfig
+from AI_ChatBot.logging import logger
+from AI_ChatBot.utils.metrics import count_lookup
 
 def _hash_str(s: str) -> str:
     return hashlib.sha256(s.encode("utf-8")).hexdigest()
@@ -20,44 +25,101 @@ def _now_ts() -> float:
 def _is_expired(created_ts: float, ttl: int) -> bool:
     return (time() - created_ts) > ttl
 
+def _history_serial(history: Optional[List[Tuple[str, str]]]) -> str:
+    return "" if not history else "|".join(f"{u}→{a}" for u, a in history)
+
+def _response_key(query: str, history: Optional[List[Tuple[str, str]]]) -> str:
+    """Cache key of a response: the query in the context of its conversation history."""
+    return _hash_str(query + "||" + _history_serial(history))
+
 class VectorCache:
-    """In‑memory LRU cache for query embeddings."""
+    """
+    In‑memory LRU cache for query embeddings.
+
+    Vectors are stored in a preallocated float32 slab (max_size x dim) whose rows
+    are handed out from a free-list; an OrderedDict maps key → slot in recency
+    order, so get/set are O(1). The slab is allocated on the first `set`, once
+    the embedding dimension is known.
+    """
     def __init__(self, max_size: int):
         self.max_size = max_size
         self.lock = threading.Lock()
-        self.cache: Dict[str, Tuple[List[float], float]] = {}  # key → (vec, last_access_ts)
-        self.order: List[str] = []
+        self.slots: "OrderedDict[str, int]" = OrderedDict()  # key → slot, least recent first
+        self.slab: Optional[np.ndarray] = None
+        self.free: List[int] = []
+        self.hits = 0
+        self.misses = 0
 
-    def get(self, query: str) -> Optional[List[float]]:
+    def _allocate(self, dim: int):
+        self.slots.clear()
+        self.slab = np.zeros((self.max_size, dim), dtype=np.float32)
+        self.free = list(range(self.max_size - 1, -1, -1))
+
+    def _get(self, key: str) -> Optional[np.ndarray]:
+        slot = self.slots.get(key)
+        if slot is None:
+            self.misses += 1
+            count_lookup("vectors", False)
+            return None
+        self.slots.move_to_end(key)
+        self.hits += 1
+        count_lookup("vectors", True)
+        return self.slab[slot].copy()
+
+    def _set(self, key: str, vec):
+        arr = np.asarray(vec, dtype=np.float32).ravel()
+        if self.slab is None or arr.shape[0] != self.slab.shape[1]:
+            self._allocate(arr.shape[0])
+        slot = self.slots.get(key)
+        if slot is not None:
+            self.slots.move_to_end(key)
+        else:
+            # reuse a free slot, or evict the LRU entry and take its slot
+            slot = self.free.pop() if self.free else self.slots.popitem(last=False)[1]
+            self.slots[key] = slot
+        self.slab[slot] = arr
+
+    def get(self, query: str) -> Optional[np.ndarray]:
         key = _hash_str(query)
         with self.lock:
-            if key in self.cache:
-                vec, _ = self.cache[key]
-                # update recency
-                self.cache[key] = (vec, _now_ts())
-                self.order.remove(key)
-                self.order.insert(0, key)
-                return vec
-        return None
-
-    def set(self, query: str, vec: List[float]):
+            return self._get(key)
+
+    def set(self, query: str, vec):
+        if self.max_size <= 0:
+            return
         key = _hash_str(query)
         with self.lock:
-            if key in self.cache:
-                # update existing
-                self.order.remove(key)
-            elif len(self.order) >= self.max_size:
-                # evict LRU
-                lru = self.order.pop()
-                del self.cache[lru]
-            # insert as most recent
-            self.order.insert(0, key)
-            self.cache[key] = (vec, _now_ts())
+            self._set(key, vec)
+
+    def get_many(self, queries: List[str]) -> List[Optional[np.ndarray]]:
+        keys = [_hash_str(q) for q in queries]
+        with self.lock:
+            return [self._get(k) for k in keys]
+
+    def set_many(self, queries: List[str], vecs):
+        if self.max_size <= 0:
+            return
+        keys = [_hash_str(q) for q in queries]
+        with self.lock:
+            for key, vec in zip(keys, vecs):
+                self._set(key, vec)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.slots),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
 
     def clear(self):
         with self.lock:
-            self.cache.clear()
-            self.order.clear()
+            self.slots.clear()
+            if self.slab is not None:
+                self.free = list(range(self.max_size - 1, -1, -1))
 
 class QueryCache:
     """Persistent SQLite cache for raw query → metadata (e.g. stats, last used)."""
@@ -130,62 +192,187 @@ class ResponseCache:
     """
     JSON‑file cache mapping (query + history hash) → response payload,
     with TTL, LRU eviction, size limit, manual invalidation.
+
+    An in-memory index (key → size, created, last access) kept in LRU order makes
+    size-limit eviction incremental: a write only pops entries off the cold end
+    instead of scanning the directory, and recency does not depend on file atime.
+    The index can be persisted to `index.json`; expired entries are removed by a
+    background sweeper (`start_sweeper`) as well as on read.
     """
+    INDEX_FILE = "index.json"
+
     def __init__(self,
                  cache_dir: Path ,
                  ttl_seconds: int,
-                 max_total_bytes: int ):
+                 max_total_bytes: int,
+                 persist_index: bool = True):
         self.cache_dir = Path(cache_dir)
         self.ttl = ttl_seconds
         self.max_bytes = max_total_bytes
+        self.persist_index = persist_index
         self.lock = threading.Lock()
+        # key → [size_bytes, created_ts, last_access_ts], least recently used first
+        self.index: "OrderedDict[str, List[float]]" = OrderedDict()
+        self.total_bytes = 0
+        self._dirty = False
+        self._stop = threading.Event()
+        self._sweeper: Optional[threading.Thread] = None
+        self._load_index()
 
     def _cache_path(self, key: str) -> Path:
         return self.cache_dir / f"{key}.json.gz"
 
+    def _index_path(self) -> Path:
+        return self.cache_dir / self.INDEX_FILE
+
+    def _load_index(self):
+        """
+        Rebuild the index at startup: entries come from the persisted index when
+        present and from one directory listing otherwise (or for files it lacks).
+        """
+        saved: Dict[str, List[float]] = {}
+        if self.persist_index and self._index_path().exists():
+            try:
+                with open(self._index_path(), encoding="utf-8") as fp:
+                    saved = json.load(fp)
+            except (OSError, ValueError):
+                saved = {}
+        entries = []
+        for p in self.cache_dir.glob("*.json.gz"):
+            key = p.name[:-len(".json.gz")]
+            meta = saved.get(key)
+            if meta is None:
+                st = p.stat()
+                meta = [st.st_size, st.st_mtime, st.st_mtime]
+            entries.append((key, meta))
+        entries.sort(key=lambda kv: kv[1][2])
+        with self.lock:
+            self.index = OrderedDict(entries)
+            self.total_bytes = sum(meta[0] for _, meta in entries)
+
+    def save_index(self):
+        if not self.persist_index:
+            return
+        with self.lock:
+            if not self._dirty:
+                return
+            snapshot = dict(self.index)
+            self._dirty = False
+        tmp = self._index_path().with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as fp:
+            json.dump(snapshot, fp)
+        os.replace(tmp, self._index_path())
+
+    def _drop(self, key: str):
+        """Remove an entry from the index and disk. Caller holds the lock."""
+        meta = self.index.pop(key, None)
+        if meta is not None:
+            self.total_bytes -= meta[0]
+            self._dirty = True
+        try:
+            self._cache_path(key).unlink()
+        except FileNotFoundError:
+            pass
+
     def _enforce_size_limit(self):
-        """Evict LRU files if total size > max_bytes."""
-        files = list(self.cache_dir.glob("*.json.gz"))
-        files.sort(key=lambda p: p.stat().st_atime)  # oldest access first
-        total = sum(p.stat().st_size for p in files)
-        for p in files:
-            if total <= self.max_bytes:
-                break
-            size = p.stat().st_size
-            p.unlink()
-            total -= size
+        """Evict LRU entries until total size <= max_bytes. Caller holds the lock."""
+        while self.total_bytes > self.max_bytes and self.index:
+            lru = next(iter(self.index))
+            self._drop(lru)
 
-    def get(self, query: str, history: List[Tuple[str, str]]) -> Optional[Dict[str, Any]]:
-        hist_serial = "|".join(f"{u}→{a}" for u, a in history)
-        key = _hash_str(query)
-        path = self._cache_path(key)
-        if not path.exists():
+    def _adopt(self, key: str) -> Optional[List[float]]:
+        """Index a file written by another process sharing the cache dir."""
+        try:
+            st = self._cache_path(key).stat()
+        except FileNotFoundError:
             return None
+        meta = [st.st_size, st.st_mtime, st.st_mtime]
+        self.index[key] = meta
+        self.total_bytes += st.st_size
+        self._dirty = True
+        return meta
 
+    def get_by_key(self, key: str) -> Optional[Dict[str, Any]]:
         with self.lock:
+            meta = self.index.get(key) or self._adopt(key)
+            if meta is None:
+                return None
+            if _is_expired(meta[1], self.ttl):
+                self._drop(key)
+                return None
+        path = self._cache_path(key)
+        try:
             with gzip.open(path, "rt", encoding="utf-8") as fp:
                 payload = json.load(fp)
-            created = payload.get("_created_at", 0)
-            if _is_expired(created, self.ttl):
-                path.unlink()
-                return None
-            # update access time
-            os.utime(path, None)
-            return payload
+        except FileNotFoundError:
+            # evicted between the index check and the read
+            with self.lock:
+                meta = self.index.pop(key, None)
+                if meta is not None:
+                    self.total_bytes -= meta[0]
+            return None
+        with self.lock:
+            if key in self.index:
+                self.index[key][2] = _now_ts()
+                self.index.move_to_end(key)
+                self._dirty = True
+        return payload
+
+    def get(self, query: str, history: List[Tuple[str, str]]) -> Optional[Dict[str, Any]]:
+        return self.get_by_key(_response_key(query, history))
 
     def set(self,
             query: str,
             history: List[Tuple[str, str]],
-            response_payload: Dict[str, Any]):
-        hist_serial = "|".join(f"{u}→{a}" for u, a in history)
-        key = _hash_str(query)
+            response_payload: Dict[str, Any]) -> str:
+        key = _response_key(query, history)
         path = self._cache_path(key)
         payload = dict(response_payload)
-        payload["_created_at"] = _now_ts()
+        now = _now_ts()
+        payload["_created_at"] = now
         with self.lock:
             with gzip.open(path, "wt", encoding="utf-8") as fp:
                 json.dump(payload, fp)
+            size = path.stat().st_size
+            old = self.index.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[0]
+            self.index[key] = [size, now, now]
+            self.total_bytes += size
+            self._dirty = True
             self._enforce_size_limit()
+        return key
+
+    def sweep_expired(self) -> int:
+        """Delete every expired entry. Returns the number removed."""
+        cutoff = _now_ts() - self.ttl
+        with self.lock:
+            expired = [k for k, meta in self.index.items() if meta[1] < cutoff]
+            for k in expired:
+                self._drop(k)
+        return len(expired)
+
+    def start_sweeper(self, interval_seconds: int):
+        """Run `sweep_expired` and persist the index every `interval_seconds` in a daemon thread."""
+        if interval_seconds <= 0 or self._sweeper is not None:
+            return
+
+        def _loop():
+            while not self._stop.wait(interval_seconds):
+                try:
+                    removed = self.sweep_expired()
+                    if removed:
+                        logger.info(f"Response cache sweeper removed {removed} expired entries")
+                    self.save_index()
+                except Exception as e:
+                    logger.error(f"Response cache sweep failed: {e}")
+
+        self._sweeper = threading.Thread(target=_loop, name="response-cache-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def close(self):
+        self._stop.set()
+        self.save_index()
 
     def invalidate(self, query: Optional[str] = None, history: Optional[List[Tuple[str, str]]] = None):
         """
@@ -198,34 +385,209 @@ class ResponseCache:
                 # full wipe
                 for p in self.cache_dir.glob("*.json.gz"):
                     p.unlink()
+                self.index.clear()
+                self.total_bytes = 0
+                self._dirty = True
                 return
             # specific
-            hist_serial = "" if history is None else "|".join(f"{u}→{a}" for u, a in history)
-            pattern = _hash_str(query + "||" + hist_serial)
+            pattern = _response_key(query, history)
             for p in self.cache_dir.glob(f"{pattern}*.json.gz"):
-                p.unlink()
+                self._drop(p.name[:-len(".json.gz")])
+
+class SemanticCache:
+    """
+    Embedding index over cached queries, so paraphrases of a cached question
+    ("What is an ETF?" / "what's an etf") reuse its response.
+
+    Normalized query vectors live in one preallocated float32 matrix and are
+    scored with a single matrix-vector product. Rows are tagged with the hash of
+    the conversation history, so a follow-up only matches answers given in the
+    same context; a boolean `valid` mask beside the matrix hides removed rows.
+    When full, the oldest row is overwritten.
+    """
+    def __init__(self, threshold: float, near_miss_margin: float, max_entries: int):
+        self.threshold = threshold
+        self.near_miss_margin = near_miss_margin
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.matrix: Optional[np.ndarray] = None    # (max_entries, dim), allocated on first add
+        self.hist_ids = np.zeros(max_entries, dtype=np.int64)
+        self.valid = np.zeros(max_entries, dtype=bool)
+        self.keys: List[Optional[str]] = [None] * max_entries
+        self.rows: Dict[str, int] = {}              # response key → row
+        self.size = 0
+        self.cursor = 0                             # next row to overwrite once full
+        self.hits = 0
+        self.misses = 0
+        self.near_misses = 0
+        self.recent_scores: deque = deque(maxlen=1000)  # (best score, outcome)
+
+    @staticmethod
+    def _hist_id(hist_key: str) -> int:
+        return int(hist_key[:15], 16)
+
+    @staticmethod
+    def _as_unit(vec) -> np.ndarray:
+        arr = np.asarray(vec, dtype=np.float32).ravel()
+        norm = np.linalg.norm(arr)
+        return arr / norm if norm > 0 else arr
+
+    def add(self, key: str, vec, hist_key: str):
+        arr = self._as_unit(vec)
+        with self.lock:
+            if self.matrix is None:
+                self.matrix = np.zeros((self.max_entries, arr.shape[0]), dtype=np.float32)
+            if arr.shape[0] != self.matrix.shape[1]:
+                logger.warning("Semantic cache: embedding dimension changed, index reset")
+                self._reset()
+                self.matrix = np.zeros((self.max_entries, arr.shape[0]), dtype=np.float32)
+            row = self.rows.get(key)
+            if row is None:
+                if self.size < self.max_entries:
+                    row = self.size
+                    self.size += 1
+                else:
+                    row = self.cursor
+                    self.cursor = (self.cursor + 1) % self.max_entries
+                    self.rows.pop(self.keys[row], None)
+                self.rows[key] = row
+                self.keys[row] = key
+            self.matrix[row] = arr
+            self.hist_ids[row] = self._hist_id(hist_key)
+            self.valid[row] = True
+
+    def lookup(self, vec, hist_key: str) -> Optional[Tuple[str, float]]:
+        """Return (response key, cosine score) of the best match above the threshold."""
+        q = self._as_unit(vec)
+        with self.lock:
+            best_key, best_score = None, -1.0
+            if self.size and self.matrix is not None and q.shape[0] == self.matrix.shape[1]:
+                mask = (self.hist_ids[:self.size] == self._hist_id(hist_key)) & self.valid[:self.size]
+                candidates = np.flatnonzero(mask)
+                if candidates.size:
+                    scores = self.matrix[candidates] @ q
+                    best = int(np.argmax(scores))
+                    best_key, best_score = self.keys[candidates[best]], float(scores[best])
+
+            if best_key is not None and best_score >= self.threshold:
+                self.hits += 1
+                self.recent_scores.append((best_score, "hit"))
+                return best_key, best_score
+            self.misses += 1
+            if best_key is not None and best_score >= self.threshold - self.near_miss_margin:
+                self.near_misses += 1
+                self.recent_scores.append((best_score, "near_miss"))
+                logger.info(f"Semantic cache near-miss: score={best_score:.4f} threshold={self.threshold}")
+            else:
+                self.recent_scores.append((best_score, "miss"))
+            return None
+
+    def remove(self, key: str):
+        with self.lock:
+            row = self.rows.pop(key, None)
+            if row is not None:
+                # leave the row in place but masked out; it is reused by the cursor later
+                self.keys[row] = None
+                self.valid[row] = False
+
+    def _reset(self):
+        self.matrix = None
+        self.keys = [None] * self.max_entries
+        self.valid[:] = False
+        self.rows.clear()
+        self.size = 0
+        self.cursor = 0
+
+    def clear(self):
+        with self.lock:
+            self._reset()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss/near-miss counters plus score percentiles per outcome, for threshold tuning."""
+        with self.lock:
+            by_outcome: Dict[str, List[float]] = {"hit": [], "near_miss": [], "miss": []}
+            for score, outcome in self.recent_scores:
+                if score >= 0:
+                    by_outcome[outcome].append(score)
+            lookups = self.hits + self.misses
+            report = {
+                "entries": len(self.rows),
+                "threshold": self.threshold,
+                "near_miss_margin": self.near_miss_margin,
+                "hits": self.hits,
+                "misses": self.misses,
+                "near_misses": self.near_misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+        for outcome, scores in by_outcome.items():
+            if scores:
+                p50, p90 = np.percentile(scores, [50, 90])
+                report[f"{outcome}_scores"] = {
+                    "count": len(scores),
+                    "min": round(float(min(scores)), 4),
+                    "p50": round(float(p50), 4),
+                    "p90": round(float(p90), 4),
+                    "max": round(float(max(scores)), 4),
+                }
+        return report
 
 class CacheManager:
     """
-    Combines VectorCache, QueryCache, and ResponseCache into one interface.
+    Combines VectorCache, QueryCache, ResponseCache and SemanticCache into one interface.
     """
-    def __init__(self,config:CacheConfig):
+    def __init__(self,config:CacheConfig,embedder: Optional[Callable[[str], List[float]]] = None):
         self.config = config
         self.vector_cache = VectorCache(max_size=self.config.vectors_max_size)
         self.query_cache = QueryCache(db_path=self.config.query_dir)
         self.response_cache = ResponseCache(
             cache_dir=self.config.json_dir,
             ttl_seconds=self.config.response_ttl,
-            max_total_bytes=self.config.json_max_bytes
+            max_total_bytes=self.config.json_max_bytes,
+            persist_index=self.config.response_index_persist
             )
+        self.semantic_cache = None
+        if self.config.semantic_enabled:
+            self.semantic_cache = SemanticCache(
+                threshold=self.config.semantic_threshold,
+                near_miss_margin=self.config.semantic_near_miss_margin,
+                max_entries=self.config.semantic_max_entries
+            )
+        self.embedder = embedder
+        self.normalize: Callable[[str], str] = lambda query: query
+
+    def attach_embedder(self, embedder: Callable[[str], List[float]],
+                        normalize: Optional[Callable[[str], str]] = None):
+        """
+        Set the query embedder used by the semantic tier. It is expected to go
+        through `vector_cache` itself, as `QueryProcessor.embed_query` does once
+        the processor is given this manager's vector cache. `normalize` maps the
+        user's text to the string retrieval embeds (`QueryProcessor.preprocess_query`),
+        so both look up one vector-cache entry and the query is embedded once, also
+        when they run concurrently (`embed_query` shares in-flight calls). A retrieve
+        tool query that only rewrites the user's text in case or punctuation is
+        mapped back onto it (see `rag._retrieval_query`); a real rewrite is embedded
+        on its own.
+        """
+        self.embedder = embedder
+        if normalize is not None:
+            self.normalize = normalize
+
+    def _embed(self, query: str) -> List[float]:
+        return self.embedder(self.normalize(query))
+
+    def _semantic_ready(self) -> bool:
+        return self.semantic_cache is not None and self.embedder is not None
 
     # — Vector caching —
-    def get_vector(self, query: str) -> Optional[List[float]]:
+    def get_vector(self, query: str) -> Optional[np.ndarray]:
         return self.vector_cache.get(query)
 
     def set_vector(self, query: str, vec: List[float]):
         return self.vector_cache.set(query, vec)
 
+    def vector_stats(self) -> Dict[str, Any]:
+        return self.vector_cache.stats()
+
     # — Query metadata caching —
     def touch_query(self, query: str):
         return self.query_cache.touch(query)
@@ -235,7 +597,36 @@ class CacheManager:
 
     # — Response caching —
     def get_response(self, query: str, history: List[Tuple[str, str]]) -> Optional[Dict[str, Any]]:
-        return self.response_cache.get(query, history)
+        """Exact (query, history) lookup; no embedding involved."""
+        payload = self.response_cache.get(query, history)
+        count_lookup("response", payload is not None)
+        return payload
+
+    def get_semantic_response(self, query: str, history: List[Tuple[str, str]]) -> Optional[Dict[str, Any]]:
+        """
+        Semantic tier: the cached answer to the closest earlier query in the same
+        conversation context. Embeds `query`, so callers run it alongside the
+        answer pipeline rather than in front of it (see app.py).
+        """
+        if not self._semantic_ready():
+            return None
+        try:
+            vec = self._embed(query)
+        except Exception as e:
+            logger.warning(f"Semantic cache lookup skipped, embedding failed: {e}")
+            return None
+        match = self.semantic_cache.lookup(vec, _hash_str(_history_serial(history)))
+        payload = None
+        if match is not None:
+            key, score = match
+            payload = self.response_cache.get_by_key(key)
+            if payload is None:
+                # response expired or was evicted from disk
+                self.semantic_cache.remove(key)
+            else:
+                payload["_semantic_score"] = score
+        count_lookup("semantic", payload is not None)
+        return payload
 
     def set_response(self,
                      query: str,
@@ -252,16 +643,39 @@ class CacheManager:
             "is_fallback": is_fallback,
             "latency": latency
         }
-        return self.response_cache.set(query, history, payload)
+        key = self.response_cache.set(query, history, payload)
+        if self._semantic_ready():
+            try:
+                self.semantic_cache.add(key, self._embed(query), _hash_str(_history_serial(history)))
+            except Exception as e:
+                logger.warning(f"Semantic cache insert skipped, embedding failed: {e}")
+        return key
 
     def invalidate_response(self, query: Optional[str] = None, history: Optional[List[Tuple[str, str]]] = None):
+        if self.semantic_cache is not None:
+            if query is None:
+                self.semantic_cache.clear()
+            else:
+                self.semantic_cache.remove(_response_key(query, history))
         return self.response_cache.invalidate(query, history)
 
+    def semantic_stats(self) -> Optional[Dict[str, Any]]:
+        return self.semantic_cache.stats() if self.semantic_cache is not None else None
+
     # — Maintenance tasks —
+    def start_maintenance(self):
+        """Start the background TTL sweeper of the response cache."""
+        self.response_cache.start_sweeper(self.config.response_sweep_interval)
+
+    def close(self):
+        self.response_cache.close()
+
     def prune_query_cache(self, max_entries: int):
         return self.query_cache.prune_lru(max_entries)
 
     def clear_all(self):
         self.vector_cache.clear()
         self.query_cache.clear()
-        self.response_cache.invalidate()
\ No newline at end of file
+        self.response_cache.invalidate()
+        if self.semantic_cache is not None:
+            self.semantic_cache.clear()
@@ -0,0 +1,145 @@
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from AI_ChatBot.entity import ContextPackingConfig
+from AI_ChatBot.logging import logger
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+_SPAN_RE = re.compile(r"[^.!?]*[.!?]+|[^.!?]+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Fast local token estimate: one token per punctuation mark and per word,
+    plus one per further 6 characters of long words (BPE splits them).
+    Close to tiktoken/SentencePiece counts for English prose.
+    """
+    return sum(1 + (len(w) - 1) // 6 for w in _WORD_RE.findall(text))
+
+
+def _chunk_position(doc: Dict[str, Any]) -> Tuple[Optional[str], Optional[int]]:
+    """(document key, chunk index) of a retrieved chunk, or None where unknown."""
+    meta = doc.get("metadata") or {}
+    key = doc.get("document_id") or meta.get("content_hash") or meta.get("filename")
+    idx = doc.get("chunk_index")
+    if not isinstance(idx, int):
+        # chunk ids are "<content_hash>_<category>_<chunk_idx>"
+        tail = str(doc.get("id") or "").rsplit("_", 1)[-1]
+        idx = int(tail) if tail.isdigit() else None
+    return key, idx
+
+
+class ContextPacker:
+    """
+    Packs retrieved chunks into the generation prompt within a token budget.
+
+    Chunks are cut with an overlap and titles are merged into bodies, so
+    neighbouring results repeat text. The packer
+      1. drops duplicate chunks (same id, or text contained in another chunk),
+      2. merges runs of adjacent chunks of one document (consecutive
+         `chunk_idx`), removing the overlap between them,
+      3. drops sentences/lines already emitted by a higher-scored block,
+      4. fills `token_budget` with the blocks in score order.
+    """
+    def __init__(self, config: ContextPackingConfig):
+        self.config = config
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+
+    def _overlap(self, left: str, right: str) -> int:
+        """Length of the longest suffix of `left` that is a prefix of `right`."""
+        longest = min(len(left), len(right), self.config.max_overlap)
+        for size in range(longest, self.config.min_overlap - 1, -1):
+            if left.endswith(right[:size]):
+                return size
+        return 0
+
+    def _merge_adjacent(self, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        blocks: List[Dict[str, Any]] = []
+        runs: Dict[str, Dict[str, Any]] = {}     # document key → block ending at the latest chunk
+        positioned = sorted(
+            ((_chunk_position(d), d) for d in docs),
+            key=lambda p: (str(p[0][0]), p[0][1] if p[0][1] is not None else -1),
+        )
+        for (key, idx), doc in positioned:
+            run = runs.get(key) if key is not None and idx is not None else None
+            if run is not None and run["last_idx"] + 1 == idx:
+                text = doc["text"]
+                cut = self._overlap(run["text"], text)
+                run["text"] += text[cut:] if cut else "\n" + text
+                run["score"] = max(run["score"], doc.get("score", 0.0))
+                run["last_idx"] = idx
+                continue
+            block = {"text": doc["text"], "metadata": doc.get("metadata") or {},
+                     "score": doc.get("score", 0.0), "last_idx": idx}
+            blocks.append(block)
+            if key is not None and idx is not None:
+                runs[key] = block
+        return blocks
+
+    def _drop_seen_spans(self, text: str, seen: set) -> str:
+        kept = []
+        for line in text.split("\n"):
+            parts = []
+            for span in _SPAN_RE.findall(line):
+                norm = _SPACE_RE.sub(" ", span).strip().lower()
+                if len(norm) >= self.config.min_span_chars:
+                    if norm in seen:
+                        continue
+                    seen.add(norm)
+                parts.append(span)
+            if "".join(parts).strip():
+                kept.append("".join(parts).strip())
+        return "\n".join(kept)
+
+    def pack(self, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Return the packed blocks ({text, metadata, score}) in score order."""
+        unique: Dict[Any, Dict[str, Any]] = {}
+        for doc in docs:
+            key = doc.get("id") or doc["text"]
+            if key not in unique or doc.get("score", 0.0) > unique[key].get("score", 0.0):
+                unique[key] = doc
+        # a chunk fully contained in another (e.g. a bare title) adds nothing
+        texts = [d["text"] for d in unique.values()]
+        candidates = [
+            d for d in unique.values()
+            if not any(d["text"] in other and d["text"] != other for other in texts)
+        ]
+
+        blocks = sorted(self._merge_adjacent(candidates), key=lambda b: b["score"], reverse=True)
+        packed, seen, used = [], set(), 0
+        for block in blocks:
+            text = self._drop_seen_spans(block["text"], seen)
+            if not text:
+                continue
+            tokens = estimate_tokens(text)
+            remaining = self.config.token_budget - used
+            if tokens > remaining:
+                if remaining < self.config.min_block_tokens:
+                    continue
+                # keep the head of the block, proportionally to the budget left
+                text = text[:len(text) * remaining // tokens].rsplit(" ", 1)[0]
+                tokens = estimate_tokens(text)
+            packed.append({"text": text, "metadata": block["metadata"], "score": block["score"]})
+            used += tokens
+        return packed
+
+    def record(self, before: int, after: int):
+        with self.lock:
+            self.requests += 1
+            self.tokens_in += before
+            self.tokens_out += after
+        logger.info(f"Context packed: {before} → {after} tokens ({before - after} saved)")
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "tokens_in": self.tokens_in,
+                "tokens_out": self.tokens_out,
+                "tokens_saved": self.tokens_in - self.tokens_out,
+            }
@@ -1,5 +1,7 @@
 import os
+import shutil
 import gdown
+from pathlib import Path
 from AI_ChatBot.logging import logger
 from AI_ChatBot.entity import DataIngestionConfig
 
@@ -8,16 +10,32 @@ class DataIngestion:
         self.config = config
 
     def download_file(self)->str:
+        """
+        Download the source folder into a staging directory and swap it in, so
+        `local_data_file` always matches the remote folder (edits and deletions
+        included). A failed download keeps the previous copy when there is one.
+        """
+        os.makedirs(self.config.root_dir,exist_ok=True)
+        url = self.config.source_url
+        target = Path(self.config.local_data_file)
+        staging = target.with_name(target.name + ".download")
+        shutil.rmtree(staging, ignore_errors=True)
+        logger.info(f'Downloading Data from {url} to the location {target}')
         try:
-            if not os.path.exists(self.config.local_data_file) or len(os.listdir(self.config.local_data_file))==0:
-                os.makedirs(self.config.root_dir,exist_ok=True)
-                url = self.config.source_url
-                zip_location = self.config.local_data_file
-                logger.info(f'Downloading Data from {url} to the location {zip_location}')
-                gdown.download_folder(url=url,output=zip_location)
-                logger.info(f'Data Download Completed')
-            else:
-                logger.info("Files already exist")
+            files = gdown.download_folder(url=url,output=str(staging))
+            if not files:
+                raise RuntimeError(f"No files downloaded from {url}")
         except Exception as e:
+            shutil.rmtree(staging, ignore_errors=True)
+            if target.exists() and any(target.iterdir()):
+                logger.error(f"Download failed, keeping the existing files: {e}")
+                return str(target)
             raise e
-    
\ No newline at end of file
+        previous = target.with_name(target.name + ".old")
+        shutil.rmtree(previous, ignore_errors=True)
+        if target.exists():
+            os.replace(target, previous)
+        os.replace(staging, target)
+        shutil.rmtree(previous, ignore_errors=True)
+        logger.info(f'Data Download Completed: {len(files)} files')
+        return str(target)
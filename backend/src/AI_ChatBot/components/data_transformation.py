@@ -1,13 +1,14 @@
 import os
-import docx
-import torch
+import time
 import shutil
+import filecmp
 import hashlib
-import numpy as np
-import unstructured
-from typing import List
+from collections import deque
+from typing import Iterator, List, Tuple
 from pathlib import Path
 import concurrent.futures
+import multiprocessing
+from multiprocessing.connection import wait as wait_ready
 from dotenv import load_dotenv
 from AI_ChatBot.logging import logger
 from AI_ChatBot.utils.common import createDir
@@ -22,6 +23,66 @@ from langchain_huggingface.embeddings.huggingface_endpoint import HuggingFaceEnd
 from langchain_community.document_loaders import UnstructuredPDFLoader,TextLoader,UnstructuredWordDocumentLoader
 
 
+def _parse_file(transformer: "DataTransformation", file_path: Path) -> Tuple[List[Document], List[Document]]:
+    """
+    Load, merge and chunk one file. Module-level so it can run in a worker process.
+    """
+    docs = transformer._load_file(file_path)
+    fname = Path(docs[0].metadata.get('source','')).name if docs else file_path.name
+    return docs, transformer.chunk_docs(docs, fname)
+
+
+def _parse_loop(transformer: "DataTransformation", conn):
+    """
+    Worker process body: parse each path received on `conn` and send back
+    ("ok", (docs, chunks)) or ("error", message); None stops the loop.
+    """
+    while True:
+        path = conn.recv()
+        if path is None:
+            return
+        try:
+            conn.send(("ok", _parse_file(transformer, path)))
+        except Exception as e:
+            conn.send(("error", repr(e)))
+
+
+# workers start from a clean interpreter: forking a process that already runs the
+# ingestion threads and HTTP pools could leave children holding their locks
+_MP_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+
+class _ParseWorker:
+    """One parser process fed a file at a time over a pipe, so it can be killed on its own."""
+    def __init__(self, transformer: "DataTransformation"):
+        self.conn, child = _MP_CONTEXT.Pipe()
+        self.process = _MP_CONTEXT.Process(target=_parse_loop, args=(transformer, child),
+                                           name="parse-worker", daemon=True)
+        self.process.start()
+        child.close()
+        self.path = None
+        self.started = 0.0
+
+    def submit(self, path: Path):
+        self.conn.send(path)
+        self.path, self.started = path, time.monotonic()
+
+    def close(self):
+        # an idle worker exits on its own; a busy (possibly hung) one is killed
+        if self.path is None:
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+            self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
 class DataTransformation:
     def __init__(self,config:DataTransformationConfig,params:DataTransformationParams,max_workers: int = None):
       self.config = config
@@ -42,7 +103,7 @@ class DataTransformation:
       else:
          logger.error("No Embedding Model")
 
-      self.max_workers = max_workers or os.cpu_count() or 4
+      self.max_workers = max_workers or self.params.parsing.max_workers or os.cpu_count() or 4
       self.recursive_splitter = RecursiveCharacterTextSplitter(
           chunk_size=self.params.recursive.chunk_size,
           chunk_overlap=self.params.recursive.chunk_overlap
@@ -55,22 +116,39 @@ class DataTransformation:
           )
 
 
+    def __getstate__(self):
+      # worker processes only parse and split; the embedding clients stay in the parent
+      state = self.__dict__.copy()
+      state.pop("embeddings", None)
+      state.pop("chunker", None)
+      return state
+
     def separate_files(self):
       """
-      Separate Files based on extensions into TEXT and VIDEO
+      Separate Files based on extensions into TEXT and VIDEO.
+      The two directories mirror `source_dir`: changed files are copied again and
+      files gone from the source are removed, so the manifest sees edits and deletions.
       """
       createDir([self.config.text_dir])
       createDir([self.config.video_dir])
       text_exts = {"pdf", "docx", "doc", "txt"}
       logger.info("File Separation Started")
       path = Path(self.config.source_dir)
+      expected = set()
       for src in path.iterdir():
           if not src.is_file():
               continue
           dest_dir = self.config.text_dir if src.suffix.lower().lstrip('.') in text_exts else self.config.video_dir
-          dest = os.path.join(dest_dir,src.name)
-          if not os.path.exists(dest):
+          dest = Path(dest_dir) / src.name
+          expected.add(dest)
+          # same size and mtime counts as unchanged; otherwise the bytes decide
+          if not dest.exists() or not filecmp.cmp(src, dest, shallow=True):
               shutil.copy2(src, dest)
+      for dest_dir in (self.config.text_dir, self.config.video_dir):
+          for dest in Path(dest_dir).iterdir():
+              if dest.is_file() and dest not in expected:
+                  logger.info(f"Removing {dest.name}: no longer in the source data")
+                  dest.unlink()
       logger.info("File Separation Ended")
 
     def merge_titles_with_body(self,elements: List[Document]) -> List[Document]:
@@ -268,23 +346,95 @@ class DataTransformation:
       return final_chunks
 
 
-    def load_documents(self):
+    def list_source_files(self) -> List[Path]:
+      """
+      Separate the downloaded files and return the text files to ingest
+      """
       self.separate_files()
-      logger.info("Document loading started")
+      return sorted(Path(self.config.text_dir).iterdir())
 
-      docs = []
-      chunks = []
-      files = list(Path(self.config.text_dir).iterdir())
-      # Parallelize document loading
+    def _iter_threaded(self, files: List[Path]) -> Iterator[Tuple[Path, List[Document], List[Document]]]:
       with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-          for doc_list in executor.map(self._load_file, files):
-              docs.append(doc_list)
+          futures = {executor.submit(_parse_file, self, f): f for f in files}
+          for future in concurrent.futures.as_completed(futures):
+              path = futures[future]
+              try:
+                  docs, chunks = future.result()
+              except Exception:
+                  logger.exception(f"Failed to parse {path}")
+                  continue
+              yield path, docs, chunks
+
+    def _iter_processes(self, files: List[Path]) -> Iterator[Tuple[Path, List[Document], List[Document]]]:
+      """
+      Parse files in up to `max_workers` worker processes, one file per worker at
+      a time, so a file's wall clock starts when it is sent. A file running past
+      `file_timeout` or crashing its worker is skipped, and only that worker is
+      killed and replaced; the other in-flight files are not disturbed.
+      """
+      timeout = self.params.parsing.file_timeout
+      pending = deque(Path(f) for f in files)
+      idle: List[_ParseWorker] = []
+      busy: List[_ParseWorker] = []
+      try:
+          while pending or busy:
+              while pending and len(busy) < self.max_workers:
+                  worker = idle.pop() if idle else _ParseWorker(self)
+                  worker.submit(pending.popleft())
+                  busy.append(worker)
+
+              oldest = min(w.started for w in busy)
+              ready = wait_ready([w.conn for w in busy], timeout=max(0.0, oldest + timeout - time.monotonic()))
+              now = time.monotonic()
+              for worker in list(busy):
+                  path = worker.path
+                  if worker.conn in ready:
+                      try:
+                          status, result = worker.conn.recv()
+                      except (EOFError, OSError):
+                          logger.error(f"Parser process crashed on {path}; skipping it")
+                          busy.remove(worker)
+                          worker.close()
+                          continue
+                      busy.remove(worker)
+                      worker.path = None
+                      idle.append(worker)
+                      if status != "ok":
+                          logger.error(f"Failed to parse {path}: {result}")
+                          continue
+                      docs, chunks = result
+                      logger.info(f"Parsed {path.name} in {now - worker.started:.1f}s")
+                      yield path, docs, chunks
+                  elif now - worker.started >= timeout:
+                      logger.error(f"Parsing {path} exceeded {timeout:.0f}s; skipping it")
+                      busy.remove(worker)
+                      worker.close()
+      finally:
+          for worker in idle + busy:
+              worker.close()
+
+    def iter_documents(self, files: List[Path] = None) -> Iterator[Tuple[Path, List[Document], List[Document]]]:
+      """
+      Yield (path, docs, chunks) for each file as soon as it is parsed (completion order)
+      """
+      if files is None:
+        files = self.list_source_files()
+      if self.params.parsing.executor == "process":
+        yield from self._iter_processes(files)
+      else:
+        yield from self._iter_threaded(files)
+
+    def load_documents(self, files: List[Path] = None):
+      """
+      Load and chunk `files` (all text files when None)
+      """
+      logger.info("Document loading started")
       flat_docs = []
-      for doc in docs:
-        flat_docs.extend(doc)
-        fname = ""
-        if len(doc):
-          fname = Path(doc[0].metadata.get('source','')).name
-        chunks.extend(self.chunk_docs(doc,fname))
-      logger.info(f"Document loading completed: {len(docs)} documents")
+      chunks = []
+      parsed = 0
+      for _, docs, file_chunks in self.iter_documents(files):
+        flat_docs.extend(docs)
+        chunks.extend(file_chunks)
+        parsed += 1
+      logger.info(f"Document loading completed: {parsed} documents")
       return flat_docs,chunks
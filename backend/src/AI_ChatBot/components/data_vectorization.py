@@ -1,8 +1,13 @@
 import os
-import torch
+import json
+import hashlib
+import time
+import threading
 import numpy as np
+from pathlib import Path
 from datetime import datetime
-from typing import List
+from typing import Any, Dict, List, Optional, Set, Tuple
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from collections import defaultdict
 from supabase import create_client, Client
@@ -10,11 +15,19 @@ from langchain.schema import Document
 from langchain_openai import OpenAIEmbeddings
 from langchain_huggingface.embeddings.huggingface_endpoint import HuggingFaceEndpointEmbeddings
 from AI_ChatBot.logging import logger
+from AI_ChatBot.components.manifest import IngestionManifest, IngestionPlan
+from AI_ChatBot.components.embedding_store import EmbeddingStore, text_hash
+from AI_ChatBot.components.embedding_scheduler import EmbeddingScheduler
 
 class DataVectorization:
-    def __init__(self, params):
+    def __init__(self, params, store_path=None, scheduler_config=None, upsert_config=None,
+                 embedding_config=None):
         """
         Initialize the vectorization pipeline.
+        When `store_path` is given, embeddings are cached there (see EmbeddingStore).
+        When `scheduler_config` is given, API batches run concurrently (see EmbeddingScheduler).
+        When `upsert_config` is given, chunk upserts are byte-sized, parallel and retried.
+        `embedding_config` with backend "onnx" embeds on local CPU (see LocalEmbeddings).
         """
         load_dotenv()
 
@@ -26,21 +39,50 @@ class DataVectorization:
 
         self.params = params
 
-        device = "cuda" if torch.cuda.is_available() else "cpu"
         self.api_key = os.getenv("HUGGINGFACEHUB_API_TOKEN")
         self.api = os.getenv("OPENAI_API_KEY")
-        if self.api_key:
+        if embedding_config is not None and embedding_config.backend == "onnx":
+            from AI_ChatBot.components.local_embeddings import LocalEmbeddings
+            logger.info("Using local ONNX embeddings")
+            # fp32 vectors match the endpoint's, so they share its embedding store entries
+            self.model_name = embedding_config.model_repo
+            if embedding_config.onnx_file != "onnx/model.onnx":
+                self.model_name += f":{embedding_config.onnx_file}"
+            self.model = LocalEmbeddings(embedding_config)
+        elif self.api_key:
             logger.info("Using Huggingface embeddings")
+            self.model_name = "sentence-transformers/all-MiniLM-L6-v2"
             self.model = HuggingFaceEndpointEmbeddings(
-            model="sentence-transformers/all-MiniLM-L6-v2",
+            model=self.model_name,
             task="feature-extraction",          # required for embedding models
             huggingfacehub_api_token=self.api_key
         )
         elif self.api:
             logger.info("Using OpenAI embeddings")
-            self.model = OpenAIEmbeddings(api_key=self.api,model="text-embedding-3-small")
+            self.model_name = "text-embedding-3-small"
+            self.model = OpenAIEmbeddings(api_key=self.api,model=self.model_name)
         else:
             logger.error("No Embedding Model")
+            self.model_name = None
+
+        self.embedding_store = None
+        if store_path is not None and self.model_name:
+            self.embedding_store = EmbeddingStore(store_path, self.model_name)
+
+        # title → {id, version} of every document row seen this run
+        self.documents: Dict[str, Dict] = {}
+        # titles that already had a document row before this run
+        self.reversioned: Set[str] = set()
+
+        self.upsert_config = upsert_config
+        self.upsert_report: List[Dict[str, Any]] = []
+        # files with a chunk batch that could not be written; kept out of the manifest
+        self.failed_files: Set[str] = set()
+        self._report_lock = threading.Lock()
+
+        self.scheduler = None
+        if scheduler_config is not None and self.model_name:
+            self.scheduler = EmbeddingScheduler(self.model.embed_documents, scheduler_config)
 
         self.supabase: Client = create_client(self.supabase_url, self.supabase_key)
 
@@ -60,62 +102,134 @@ class DataVectorization:
 
     def upsert_document_details(self,chunks: List[Document]):
         """
-        Upsert document details in Supabase.
+        Register the documents `chunks` belong to (see `register_documents`).
         """
-        unique_filenames = self.get_unique_fields(chunks)
-        mp = defaultdict(str)
-        unique_pairs = {
-            (
-                chunk.metadata.get("filename", "unknown"),
-                chunk.metadata.get("content_hash", "unknown")
-            )
-            for chunk in chunks
-        }
-        for fname,hash in unique_pairs:
-          mp[fname] = hash
-        doc_id = {}
-        for filename in unique_filenames:
-          resp = self.supabase.table(self.params.docs).select("id","version").eq("title",filename).execute()
-          data = resp.data
-          if data:
-            doc = data[0]
-            document_id = doc["id"]
-            new_version = doc["version"] + 1
-            update_resp = self.supabase.table(self.params.docs).update({
-                "version": new_version,
-                "updated_at": datetime.now().isoformat()
-            }).eq("id", document_id).execute()
-            doc_id[filename] = document_id
-          else:
-              # Insert new document row
-              ext = filename.split('.')[-1]
-              insert_resp = self.supabase.table(self.params.docs).insert({
-                  "id": mp[filename],
-                  "title": filename,
-                  "file_type": filename.split('.')[-1],
-                  "version": 1,
-                  "updated_at": datetime.now().isoformat()
-
-              }).execute()
-              new_doc = insert_resp.data[0]
-              doc_id[filename] = new_doc["id"]
-        return doc_id
+        return self.register_documents(self.get_unique_fields(chunks))
+
+    @staticmethod
+    def document_id(filename: str) -> str:
+        """Id of a new document row, derived from its filename so identical files stay apart."""
+        return hashlib.md5(filename.encode("utf-8")).hexdigest()
+
+    def register_documents(self, filenames: List[str]) -> Dict[str, str]:
+        """
+        Document ids for `filenames`, leaving existing rows untouched: one `in_`
+        select for the titles, one insert of the missing ones at version 0.
+        Versions only move in `commit_documents`, once a file's chunks are
+        written. Returns filename → document id.
+        """
+        titles = [t for t in dict.fromkeys(filenames) if t not in self.documents]
+        existing: Dict[str, Dict] = {}
+        batch_size = self.params.batch_table
+        for i in range(0, len(titles), batch_size):
+            resp = self.supabase.table(self.params.docs) \
+                .select("id,title,version") \
+                .in_("title", titles[i:i + batch_size]) \
+                .execute()
+            for row in resp.data or []:
+                existing.setdefault(row["title"], row)
+        self.reversioned.update(existing)
+
+        now = datetime.now().isoformat()
+        rows = [{
+            "id": self.document_id(filename),
+            "title": filename,
+            "file_type": filename.split('.')[-1],
+            "version": 0,
+            "updated_at": now
+        } for filename in titles if filename not in existing]
+        if rows:
+            resp = self.supabase.table(self.params.docs).upsert(rows, on_conflict="id").execute()
+            if not resp.data:
+                raise Exception(f"Supabase document upsert failed: {resp}")
+            existing.update({row["title"]: row for row in resp.data})
+        self.documents.update(existing)
+        if titles:
+            logger.info(f"Registered {len(titles)} documents ({len(rows)} new)")
+        return {filename: self.documents[filename]["id"] for filename in filenames}
+
+    def commit_documents(self, filenames: List[str]):
+        """
+        Bump version and `updated_at` of documents whose chunks are all written,
+        in one upsert; this is what moves the corpus version readers watch.
+        """
+        now = datetime.now().isoformat()
+        rows = [{
+            "id": self.documents[filename]["id"],
+            "title": filename,
+            "file_type": filename.split('.')[-1],
+            "version": self.documents[filename]["version"] + 1,
+            "updated_at": now
+        } for filename in filenames if filename in self.documents]
+        if not rows:
+            return
+        resp = self.supabase.table(self.params.docs).upsert(rows, on_conflict="id").execute()
+        if not resp.data:
+            raise Exception(f"Supabase document upsert failed: {resp}")
+        self.documents.update({row["title"]: row for row in resp.data})
+        logger.info(f"Committed {len(rows)} documents")
+
+    def fetch_chunk_ids(self, document_ids: List[str], page_size: int = 1000) -> List[str]:
+        """Ids of every stored chunk of `document_ids`, paged past the API row limit."""
+        ids: List[str] = []
+        for i in range(0, len(document_ids), self.params.batch_table):
+            batch = document_ids[i:i + self.params.batch_table]
+            offset = 0
+            while True:
+                resp = self.supabase.table(self.params.chunks) \
+                    .select("id") \
+                    .in_("document_id", batch) \
+                    .order("id") \
+                    .range(offset, offset + page_size - 1) \
+                    .execute()
+                rows = resp.data or []
+                ids.extend(r["id"] for r in rows)
+                if len(rows) < page_size:
+                    break
+                offset += page_size
+        return ids
+
+    def _embed_texts(self, texts: List[str], batch_size: int) -> List[List[float]]:
+        if self.scheduler is not None:
+            raw = self.scheduler.embed(texts)
+        else:
+            raw = []
+            for i in range(0, len(texts), batch_size):
+                raw.extend(self.model.embed_documents(texts[i:i + batch_size]))
+        all_embeddings = []
+        for emb in raw:
+          arr = np.array(emb, dtype="float32")
+          norm = np.linalg.norm(arr)
+          if norm > 0:
+              arr /= norm
+          all_embeddings.append(arr.tolist())
+        return all_embeddings
 
     def batch_embed(self, texts: List[str], batch_size: int):
-        """Create embeddings in batches to avoid memory issues."""
+        """
+        Create embeddings in batches to avoid memory issues.
+        Texts already in the embedding store are not sent to the API.
+        """
         logger.info("Batch embedding along with normalization has started")
-        all_embeddings = []
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i:i + batch_size]
-            batch_embeds = self.model.embed_documents(batch)
-            for emb in batch_embeds:
-              arr = np.array(emb, dtype="float32")
-              norm = np.linalg.norm(arr)
-              if norm > 0:
-                  arr /= norm
-              all_embeddings.append(arr.tolist())
-        logger.info("Batch embedding along with normalization has completed")
+        if self.embedding_store is None:
+            all_embeddings = self._embed_texts(texts, batch_size)
+            logger.info("Batch embedding along with normalization has completed")
+            return all_embeddings
+
+        cached = self.embedding_store.get_many(texts)
+        # identical texts among the misses are embedded once
+        missing = list(dict.fromkeys(t for t, v in zip(texts, cached) if v is None))
+        fresh = dict(zip(missing, self._embed_texts(missing, batch_size)))
+        self.embedding_store.put_many(missing, [fresh[t] for t in missing])
+        all_embeddings = [
+            vec.tolist() if vec is not None else fresh[text]
+            for text, vec in zip(texts, cached)
+        ]
+        hits = len(texts) - sum(v is None for v in cached)
+        logger.info(f"Batch embedding along with normalization has completed: "
+                    f"{hits}/{len(texts)} from the embedding store, {len(missing)} sent to the API")
         return all_embeddings
+
     def _normalize(self, vec: List[float]) -> List[float]:
         """
         L2-normalize a vector so cosine similarity can be done via Euclidean <-> if needed.
@@ -127,14 +241,9 @@ class DataVectorization:
         if norm > 0:
             arr /= norm
         return arr.tolist()
-    def ingest_chunks(self,chunks:List[Document]):
-        logger.info("Document details Upsertion Started")
-        doc_ids = self.upsert_document_details(chunks)
-        logger.info("Document details upserted")
+    def build_records(self, chunks: List[Document], embeddings: List[List[float]],
+                      doc_ids: Dict[str, str]) -> List[Dict]:
         records = []
-        text = [doc.page_content for doc in chunks]
-        embeddings = self.batch_embed(text, self.params.batch_embed)
-        logger.info("Records generation Started")
         for doc,emb in zip(chunks,embeddings):
             meta_data = {
                 "source": doc.metadata.get("source", "unknown"),
@@ -144,11 +253,6 @@ class DataVectorization:
                 'content_hash': doc.metadata.get('content_hash', 'unknown'),
                 'page_number': doc.metadata.get('page_number')
             }
-        #   if hasattr(self.model, "embed_documents"):
-        #       vec = self.model.embed_documents([doc.page_content])[0]
-        #   else:
-        #       vec = self.model.embed_query(doc.page_content)
-        #   emb = self._normalize(vec)
             records.append({
                     "id": doc.metadata.get("chunk_id", "unknown"),
                     "document_id": doc_ids[doc.metadata.get("filename", "unknown")],
@@ -158,14 +262,201 @@ class DataVectorization:
                     "metadata": meta_data or {},
                     "updated_at": datetime.now().isoformat()
                 })
+        return records
+
+    def upsert_records(self, records: List[Dict]) -> List[Dict[str, Any]]:
+        if self.upsert_config is None:
+            batch_size = self.params.batch_table
+            for i in range(0,len(records),batch_size):
+                batch = records[i:i+batch_size]
+                response = self.supabase.table(self.params.chunks).upsert(
+                    batch,
+                    on_conflict="id"
+                ).execute()
+                logger.info(f"Upserted chunks in the batch {i}–{i + len(batch)}")
+                if not response.data:
+                    raise Exception(f"Supabase insert failed: {response}")
+            return []
+
+        # the sync client's HTTP connection pool is shared by the worker threads
+        batches = self._size_batches(records)
+        with ThreadPoolExecutor(max_workers=self.upsert_config.concurrency,
+                                thread_name_prefix="upsert") as executor:
+            results = list(executor.map(lambda b: self._upsert_batch(*b), batches))
+        failed = [r for r in results if r["status"] != "ok"]
+        logger.info(f"Upserted {sum(r['rows'] for r in results) - sum(r['rows'] for r in failed)} chunks "
+                    f"in {len(results)} batches, {len(failed)} failed")
+        return results
+
+    def _size_batches(self, records: List[Dict]) -> List[Tuple[List[Dict], int]]:
+        """Cut records into batches of at most `max_batch_bytes` serialized JSON and `batch_table` rows."""
+        limit = self.upsert_config.max_batch_bytes
+        batches, batch, size = [], [], 0
+        for record in records:
+            n = len(json.dumps(record, separators=(",", ":")))
+            if batch and (size + n > limit or len(batch) >= self.params.batch_table):
+                batches.append((batch, size))
+                batch, size = [], 0
+            batch.append(record)
+            size += n
+        if batch:
+            batches.append((batch, size))
+        return batches
+
+    def _upsert_batch(self, batch: List[Dict], nbytes: int) -> Dict[str, Any]:
+        started = time.perf_counter()
+        error = None
+        attempts = 0
+        while attempts < self.upsert_config.max_retries:
+            attempts += 1
+            try:
+                response = self.supabase.table(self.params.chunks).upsert(
+                    batch,
+                    on_conflict="id"
+                ).execute()
+                if not response.data:
+                    raise Exception(f"Supabase insert failed: {response}")
+                error = None
+                break
+            except Exception as e:
+                error = e
+                logger.warning(f"Chunk batch of {len(batch)} rows failed (attempt {attempts}): {e}")
+                if attempts < self.upsert_config.max_retries:
+                    time.sleep(self.upsert_config.retry_backoff * (2 ** (attempts - 1)))
+        result = {
+            "first_id": batch[0]["id"],
+            "last_id": batch[-1]["id"],
+            "rows": len(batch),
+            "bytes": nbytes,
+            "attempts": attempts,
+            "seconds": round(time.perf_counter() - started, 3),
+            "status": "ok" if error is None else "failed",
+            "error": None if error is None else str(error),
+        }
+        with self._report_lock:
+            result["batch"] = len(self.upsert_report)
+            self.upsert_report.append(result)
+            if error is not None:
+                self.failed_files.update(r["metadata"].get("filename", "unknown") for r in batch)
+        if error is not None:
+            logger.error(f"Chunk batch {result['batch']} ({len(batch)} rows) failed after {attempts} attempts: {error}")
+        return result
+
+    def upsert_summary(self) -> Dict[str, Any]:
+        report = self.upsert_report
+        return {
+            "batches": len(report),
+            "failed_batches": sum(r["status"] != "ok" for r in report),
+            "retries": sum(r["attempts"] - 1 for r in report),
+            "bytes": sum(r["bytes"] for r in report),
+            "failed_files": sorted(self.failed_files),
+        }
+
+    def write_upsert_report(self, path: Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as fp:
+            json.dump({"summary": self.upsert_summary(), "batches": self.upsert_report}, fp, indent=2)
+
+    def ingest_chunks(self,chunks:List[Document]):
+        logger.info("Document details Upsertion Started")
+        doc_ids = self.upsert_document_details(chunks)
+        logger.info("Document details upserted")
+        text = [doc.page_content for doc in chunks]
+        embeddings = self.batch_embed(text, self.params.batch_embed)
+        logger.info("Records generation Started")
+        records = self.build_records(chunks, embeddings, doc_ids)
         logger.info("Records generation Ended")
+        self.upsert_records(records)
+        return doc_ids
+
+    def delete_chunks(self, chunk_ids: List[str]):
+        """Delete chunk rows by id, in batches of `batch_table`."""
         batch_size = self.params.batch_table
-        for i in range(0,len(records),batch_size):
-            batch = records[i:i+batch_size]
-            response = self.supabase.table(self.params.chunks).upsert(
-                batch,
-                on_conflict="id"
-            ).execute()
-            logger.info(f"Upserted chunks in the batch {i}–{i + len(batch)}")
-            if not response.data:
-                raise Exception(f"Supabase insert failed: {response}")
\ No newline at end of file
+        for i in range(0, len(chunk_ids), batch_size):
+            batch = chunk_ids[i:i + batch_size]
+            self.supabase.table(self.params.chunks).delete().in_("id", batch).execute()
+        if chunk_ids:
+            logger.info(f"Deleted {len(chunk_ids)} stale chunks")
+
+    def delete_documents(self, document_ids: List[str]):
+        if document_ids:
+            self.supabase.table(self.params.docs).delete().in_("id", document_ids).execute()
+            logger.info(f"Deleted {len(document_ids)} documents")
+
+    @staticmethod
+    def summarize_chunks(chunks: List[Document], new_ids: Dict[str, List[str]] = None,
+                         new_hashes: Dict[str, List[str]] = None):
+        """Collect per-file chunk ids and text hashes, the only chunk state the manifest keeps."""
+        new_ids = new_ids if new_ids is not None else defaultdict(list)
+        new_hashes = new_hashes if new_hashes is not None else defaultdict(list)
+        for doc in chunks:
+            filename = doc.metadata.get("filename", "unknown")
+            new_ids[filename].append(doc.metadata.get("chunk_id", "unknown"))
+            new_hashes[filename].append(text_hash(doc.page_content))
+        return new_ids, new_hashes
+
+    def sync_manifest(self, manifest: IngestionManifest, plan: IngestionPlan,
+                      chunks: List[Document], doc_ids: Dict[str, str]):
+        """
+        After `ingest_chunks`: remove chunks of deleted files and chunks that a
+        changed file no longer produces, record the new state in the manifest,
+        then bump the versions of the documents whose chunks were all written.
+        """
+        new_ids, new_hashes = self.summarize_chunks(chunks)
+        # without per-file parse results, only files that produced chunks count as parsed
+        self.sync_summaries(manifest, plan, new_ids, new_hashes, doc_ids, parsed=set(new_ids))
+        self.commit_documents(sorted(set(new_ids) - self.failed_files))
+
+    def sync_summaries(self, manifest: IngestionManifest, plan: IngestionPlan,
+                       new_ids: Dict[str, List[str]], new_hashes: Dict[str, List[str]],
+                       doc_ids: Dict[str, str], parsed: Optional[Set[str]] = None):
+        """
+        Remove chunks of deleted files and chunks that a changed file no longer
+        produces, then record the new state in the manifest. Takes per-file
+        summaries (see `summarize_chunks`); a changed file in `parsed` (default:
+        every changed file) without chunks loses all of its previous ones.
+        """
+        changed = {
+            path.name: [] for path in plan.changed
+            if parsed is None or path.name in parsed
+        }
+        new_ids = {**changed, **new_ids}
+        if self.failed_files:
+            # left unrecorded so the next run ingests these files again
+            logger.warning(f"Not recording {len(self.failed_files)} files with failed chunk batches")
+            new_ids = {f: ids for f, ids in new_ids.items() if f not in self.failed_files}
+        stale: List[str] = []
+        unknown: Dict[str, str] = {}
+        for filename, ids in new_ids.items():
+            previous = manifest.chunk_ids(filename)
+            if not previous and filename in self.reversioned and doc_ids.get(filename):
+                # re-versioned but not in the manifest (e.g. first incremental run): ask the table
+                unknown[doc_ids[filename]] = filename
+                continue
+            current = set(ids)
+            stale.extend(cid for cid in previous if cid not in current)
+        if unknown:
+            current = {cid for f in unknown.values() for cid in new_ids[f]}
+            stale.extend(cid for cid in self.fetch_chunk_ids(list(unknown)) if cid not in current)
+        for filename in plan.deleted:
+            stale.extend(manifest.chunk_ids(filename))
+        self.delete_chunks(stale)
+        self.delete_documents([
+            manifest.document_id(f) for f in plan.deleted if manifest.document_id(f)
+        ])
+
+        for filename, ids in new_ids.items():
+            content_hash = plan.hashes.get(filename)
+            if content_hash is None:
+                continue
+            manifest.record(filename, content_hash, doc_ids.get(filename), ids, new_hashes.get(filename, []))
+        for filename in plan.deleted:
+            manifest.remove(filename)
+        manifest.save()
+
+    def prune_embedding_store(self, manifest: IngestionManifest) -> int:
+        """Drop stored vectors whose text no longer belongs to any ingested chunk."""
+        if self.embedding_store is None:
+            return 0
+        return self.embedding_store.prune(manifest.text_hashes())
@@ -0,0 +1,106 @@
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+
+from AI_ChatBot.entity import EmbeddingBatcherConfig
+from AI_ChatBot.logging import logger
+from AI_ChatBot.utils.metrics import Histogram
+
+_STOP = None
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces concurrent single-query embeddings into `embed_documents` calls.
+
+    A collector thread takes the first waiting query, then keeps collecting until
+    `max_batch` queries are queued or `max_wait_ms` has passed since that first
+    query arrived, and hands the batch to a pool of `max_inflight` workers.
+    Identical texts within a batch are embedded once. Sync callers block on
+    `embed`, async callers await `aembed`; both get their own vector back.
+    """
+    def __init__(self, embed_fn: Callable[[List[str]], List[List[float]]], config: EmbeddingBatcherConfig):
+        self.embed_fn = embed_fn
+        self.config = config
+        self.max_wait = config.max_wait_ms / 1000
+        self.queue: "queue.Queue[Tuple[str, Future, float]]" = queue.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=config.max_inflight, thread_name_prefix="embed-batch")
+        self.batch_sizes = Histogram(buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+        self.wait_times = Histogram()    # enqueue → embedding call starts
+        self.call_times = Histogram()    # duration of the embedding call
+        self._collector = threading.Thread(target=self._collect, name="embed-batcher", daemon=True)
+        self._collector.start()
+
+    def submit(self, text: str) -> Future:
+        future: Future = Future()
+        self.queue.put((text, future, time.perf_counter()))
+        return future
+
+    def embed(self, text: str) -> List[float]:
+        return self.submit(text).result()
+
+    async def aembed(self, text: str) -> List[float]:
+        return await asyncio.wrap_future(self.submit(text))
+
+    def _collect(self):
+        while True:
+            first = self.queue.get()
+            if first is _STOP:
+                return
+            batch = [first]
+            deadline = first[2] + self.max_wait
+            stopping = False
+            while len(batch) < self.config.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self.executor.submit(self._dispatch, batch)
+            if stopping:
+                return
+
+    def _dispatch(self, batch: List[Tuple[str, Future, float]]):
+        # callers cancelled meanwhile (client gone, timeout) are dropped; the rest
+        # are marked running, so a later cancel can no longer race with set_result
+        batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        started = time.perf_counter()
+        for _, _, enqueued in batch:
+            self.wait_times.observe(started - enqueued)
+        self.batch_sizes.observe(len(batch))
+        texts = list(dict.fromkeys(text for text, _, _ in batch))
+        try:
+            vectors = self.embed_fn(texts)
+        except Exception as e:
+            logger.error(f"Batched embedding of {len(texts)} queries failed: {e}")
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        finally:
+            self.call_times.observe(time.perf_counter() - started)
+        by_text = dict(zip(texts, vectors))
+        for text, future, _ in batch:
+            future.set_result(by_text[text])
+
+    def close(self):
+        self.queue.put(_STOP)
+        self._collector.join(timeout=1)
+        self.executor.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batch_size": self.batch_sizes.snapshot(),
+            "wait_seconds": self.wait_times.snapshot(),
+            "call_seconds": self.call_times.snapshot(),
+        }
@@ -0,0 +1,213 @@
+import time
+import heapq
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+
+from AI_ChatBot.entity import EmbeddingSchedulerConfig
+from AI_ChatBot.logging import logger
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    """Best-effort HTTP status of an embedding client error (requests/httpx/openai/HF)."""
+    for attr in ("status_code", "http_status"):
+        code = getattr(error, attr, None)
+        if isinstance(code, int):
+            return code
+    response = getattr(error, "response", None)
+    code = getattr(response, "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def _is_retryable(error: Exception) -> bool:
+    code = _status_code(error)
+    if code is not None:
+        return code == 429 or code >= 500
+    # no status: connection resets, timeouts and the like
+    name = type(error).__name__.lower()
+    return any(k in name for k in ("timeout", "connection", "temporar")) or "429" in str(error)
+
+
+def _estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English BPE/WordPiece vocabularies
+    return max(1, len(text) // 4)
+
+
+class EmbeddingScheduler:
+    """
+    Keeps several `embed_documents` batches in flight on a thread pool.
+
+    Concurrency and batch size adapt to what the API reports: they grow while
+    batches return under `target_latency`, batch size shrinks when latency goes
+    over it, and both are halved on 429/5xx (AIMD). Failed batches are retried
+    with exponential backoff; results are written back by position, so output
+    order always matches input order.
+
+    The pool, the adaptive state and the in-flight window live as long as the
+    scheduler, so concurrent `embed` calls (e.g. one per ingestion slice) share
+    one `concurrency` limit and `report()` covers every call. `close()` stops
+    the pool.
+    """
+    def __init__(self, embed_fn: Callable[[List[str]], List[List[float]]], config: EmbeddingSchedulerConfig):
+        self.embed_fn = embed_fn
+        self.config = config
+        self.concurrency = max(1, min(config.initial_concurrency, config.max_concurrency))
+        self.batch_size = config.batch_size
+        self.lock = threading.Lock()
+        self.slot_free = threading.Condition(self.lock)
+        self.executor = ThreadPoolExecutor(max_workers=config.max_concurrency, thread_name_prefix="embed")
+        self.inflight = 0                 # batches in flight across all calls
+        self.peak_inflight = 0
+        self.last_report: Dict[str, Any] = {}
+        self.totals = {"calls": 0, "chunks": 0, "tokens_est": 0, "retries": 0, "throttled": 0}
+        self._active_calls = 0
+        self._busy_since = 0.0
+        self._busy_seconds = 0.0          # wall time with at least one call running
+
+    def _call(self, batch: List[str]):
+        started = time.perf_counter()
+        vectors = self.embed_fn(batch)
+        return vectors, time.perf_counter() - started
+
+    def _on_success(self, latency: float):
+        with self.lock:
+            if latency < self.config.target_latency:
+                self.concurrency = min(self.config.max_concurrency, self.concurrency + 1)
+                if latency < self.config.target_latency / 2:
+                    self.batch_size = min(self.config.max_batch, int(self.batch_size * 1.25) + 1)
+            else:
+                self.batch_size = max(self.config.min_batch, self.batch_size // 2)
+
+    def _on_throttle(self):
+        with self.lock:
+            self.concurrency = max(1, self.concurrency // 2)
+            self.batch_size = max(self.config.min_batch, self.batch_size // 2)
+
+    def _try_acquire(self) -> bool:
+        with self.lock:
+            if self.inflight >= self.concurrency:
+                return False
+            self.inflight += 1
+            self.peak_inflight = max(self.peak_inflight, self.inflight)
+            return True
+
+    def _release(self, _future=None):
+        with self.slot_free:
+            self.inflight -= 1
+            self.slot_free.notify_all()
+
+    def _wait_for_slot(self, timeout: Optional[float]):
+        with self.slot_free:
+            if self.inflight >= self.concurrency:
+                self.slot_free.wait(timeout)
+
+    def _call_started(self):
+        with self.lock:
+            if self._active_calls == 0:
+                self._busy_since = time.perf_counter()
+            self._active_calls += 1
+
+    def _call_finished(self, n: int, tokens: int, retried: int, throttled: int):
+        with self.lock:
+            self._active_calls -= 1
+            if self._active_calls == 0:
+                self._busy_seconds += time.perf_counter() - self._busy_since
+            for key, value in (("calls", 1), ("chunks", n), ("tokens_est", tokens),
+                               ("retries", retried), ("throttled", throttled)):
+                self.totals[key] += value
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        n = len(texts)
+        results: List[Optional[List[float]]] = [None] * n
+        pos = 0
+        inflight: Dict[Any, tuple] = {}   # future → (start, batch, attempt), this call only
+        retries: List[tuple] = []         # heap of (not_before, start, batch, attempt)
+        retried = throttled = 0
+        started = time.perf_counter()
+        self._call_started()
+
+        try:
+            while pos < n or inflight or retries:
+                now = time.monotonic()
+                while (retries and retries[0][0] <= now) or pos < n:
+                    if not self._try_acquire():
+                        break
+                    if retries and retries[0][0] <= now:
+                        _, start, batch, attempt = heapq.heappop(retries)
+                    else:
+                        start, batch, attempt = pos, texts[pos:pos + self.batch_size], 0
+                        pos += len(batch)
+                    future = self.executor.submit(self._call, batch)
+                    future.add_done_callback(self._release)
+                    inflight[future] = (start, batch, attempt)
+
+                # work left that only waits for a slot another call (or this one) holds
+                due = pos < n or bool(retries and retries[0][0] <= now)
+                if not inflight:
+                    if due:
+                        self._wait_for_slot(0.05)
+                    else:
+                        time.sleep(max(0.0, retries[0][0] - time.monotonic()))
+                    continue
+                timeout = 0.05 if due else (max(0.0, retries[0][0] - now) if retries else None)
+                done, _ = wait(list(inflight), timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    start, batch, attempt = inflight.pop(future)
+                    try:
+                        vectors, latency = future.result()
+                    except Exception as e:
+                        if not _is_retryable(e) or attempt >= self.config.max_retries:
+                            raise
+                        self._on_throttle()
+                        code = _status_code(e)
+                        throttled += int(code is not None)
+                        retried += 1
+                        delay = self.config.retry_backoff * (2 ** attempt)
+                        logger.warning(f"Embedding batch of {len(batch)} failed ({e}); "
+                                       f"retry {attempt + 1} in {delay:.1f}s, concurrency={self.concurrency}")
+                        heapq.heappush(retries, (time.monotonic() + delay, start, batch, attempt + 1))
+                        continue
+                    results[start:start + len(batch)] = vectors
+                    self._on_success(latency)
+        finally:
+            for future in inflight:
+                future.cancel()
+            tokens = sum(_estimate_tokens(t) for t in texts)
+            self._call_finished(n, tokens, retried, throttled)
+
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        self.last_report = {
+            "chunks": n,
+            "tokens_est": tokens,
+            "seconds": round(elapsed, 3),
+            "chunks_per_sec": round(n / elapsed, 2),
+            "tokens_per_sec": round(tokens / elapsed, 2),
+            "retries": retried,
+            "throttled": throttled,
+            "final_concurrency": self.concurrency,
+            "final_batch_size": self.batch_size,
+        }
+        logger.debug(f"Embedding call: {self.last_report}")
+        return results
+
+    def report(self) -> Dict[str, Any]:
+        """Throughput over every `embed` call so far; seconds count wall time with a call running."""
+        with self.lock:
+            busy = self._busy_seconds
+            if self._active_calls:
+                busy += time.perf_counter() - self._busy_since
+            totals = dict(self.totals)
+            concurrency, batch_size, peak = self.concurrency, self.batch_size, self.peak_inflight
+        busy = max(busy, 1e-9)
+        return {
+            **totals,
+            "seconds": round(busy, 3),
+            "chunks_per_sec": round(totals["chunks"] / busy, 2),
+            "tokens_per_sec": round(totals["tokens_est"] / busy, 2),
+            "peak_inflight": peak,
+            "final_concurrency": concurrency,
+            "final_batch_size": batch_size,
+        }
+
+    def close(self):
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,122 @@
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from time import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from AI_ChatBot.logging import logger
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Persistent, content-addressed embedding cache for ingestion.
+
+    Vectors are keyed by (embedding model, sha256 of the chunk text) and stored
+    as raw float32 blobs in SQLite, so byte-identical chunk texts are embedded once
+    across runs. Vectors no longer referenced by any ingested chunk can be pruned.
+    """
+    # SQLite limits the number of bound parameters per statement
+    MAX_PARAMS = 500
+
+    def __init__(self, db_path: Path, model_name: str):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.model_name = model_name
+        self.conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._init_table()
+
+    def _init_table(self):
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS embeddings (
+            model TEXT NOT NULL,
+            text_hash TEXT NOT NULL,
+            dim INTEGER NOT NULL,
+            vector BLOB NOT NULL,
+            last_used REAL,
+            PRIMARY KEY (model, text_hash)
+        ) WITHOUT ROWID""")
+        self.conn.commit()
+
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Look up vectors for `texts`, in order; None marks a miss."""
+        hashes = [text_hash(t) for t in texts]
+        found: Dict[str, np.ndarray] = {}
+        unique = list(dict.fromkeys(hashes))
+        now = time()
+        with self.lock:
+            for i in range(0, len(unique), self.MAX_PARAMS):
+                part = unique[i:i + self.MAX_PARAMS]
+                marks = ",".join("?" * len(part))
+                cur = self.conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({marks})",
+                    [self.model_name, *part]
+                )
+                for h, blob in cur.fetchall():
+                    found[h] = np.frombuffer(blob, dtype=np.float32)
+                self.conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(now, self.model_name, h) for h in part if h in found]
+                )
+            self.conn.commit()
+            results = [found.get(h) for h in hashes]
+            hits = sum(v is not None for v in results)
+            self.hits += hits
+            self.misses += len(results) - hits
+        return results
+
+    def put_many(self, texts: List[str], vectors: Iterable[Any]):
+        now = time()
+        rows = []
+        for text, vec in zip(texts, vectors):
+            arr = np.asarray(vec, dtype=np.float32)
+            rows.append((self.model_name, text_hash(text), arr.shape[0], arr.tobytes(), now))
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, dim, vector, last_used) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self.conn.commit()
+
+    def prune(self, referenced_hashes: Iterable[str]) -> int:
+        """Delete this model's vectors whose text hash is not in `referenced_hashes`."""
+        with self.lock:
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS keep (text_hash TEXT PRIMARY KEY)")
+            self.conn.execute("DELETE FROM keep")
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO keep (text_hash) VALUES (?)",
+                ((h,) for h in referenced_hashes)
+            )
+            cur = self.conn.execute(
+                "DELETE FROM embeddings WHERE model = ? AND text_hash NOT IN (SELECT text_hash FROM keep)",
+                (self.model_name,)
+            )
+            removed = cur.rowcount
+            self.conn.execute("DELETE FROM keep")
+            self.conn.commit()
+        if removed:
+            logger.info(f"Embedding store pruned {removed} unreferenced vectors")
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            count = self.conn.execute(
+                "SELECT COUNT(*) FROM embeddings WHERE model = ?", (self.model_name,)
+            ).fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "model": self.model_name,
+                "vectors": count,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
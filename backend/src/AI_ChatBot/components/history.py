@@ -0,0 +1,92 @@
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+
+from supabase import AsyncClient
+
+from AI_ChatBot.entity import HistoryConfig
+from AI_ChatBot.logging import logger
+
+
+class SessionHistory:
+    """
+    Ring buffers holding the last `turn_limit` turns of one session, both as flat
+    messages (graph input) and as (user, assistant) pairs (cache key).
+    """
+    __slots__ = ("messages", "pairs")
+
+    def __init__(self, turn_limit: int):
+        self.messages: deque = deque(maxlen=2 * turn_limit)
+        self.pairs: deque = deque(maxlen=turn_limit)
+
+    def append(self, role: str, content: str):
+        # a reply right after a user message completes a turn
+        if role == "assistant" and self.messages and self.messages[-1]["role"] == "user":
+            self.pairs.append((self.messages[-1]["content"], content))
+        self.messages.append({"role": role, "content": content})
+
+    def message_list(self) -> List[Dict[str, str]]:
+        return list(self.messages)
+
+    def pair_list(self) -> List[Tuple[str, str]]:
+        return list(self.pairs)
+
+
+class SessionHistoryStore:
+    """
+    Per-session chat history kept in process: an LRU of `SessionHistory` ring
+    buffers. A session is read from Supabase once, on first touch, limited to the
+    most recent rows and ordered by the database; afterwards turns are appended
+    locally as they are written, so lookups on the hot path are memory-only.
+
+    Each uvicorn worker has its own store; a session served by several workers
+    only sees turns written through the worker that loaded it until it is evicted.
+    """
+    def __init__(self, config: HistoryConfig, table_name: str = "chat_history"):
+        self.config = config
+        self.table_name = table_name
+        self.sessions: "OrderedDict[str, SessionHistory]" = OrderedDict()
+
+    def _put(self, session_id: str, history: SessionHistory) -> SessionHistory:
+        self.sessions[session_id] = history
+        self.sessions.move_to_end(session_id)
+        while len(self.sessions) > self.config.max_sessions:
+            self.sessions.popitem(last=False)
+        return history
+
+    def create(self, session_id: str) -> SessionHistory:
+        """Register a brand-new session; there is nothing to fetch for it."""
+        return self._put(session_id, SessionHistory(self.config.turn_limit))
+
+    async def _fetch(self, client: AsyncClient, session_id: str) -> SessionHistory:
+        resp = await client.table(self.table_name) \
+            .select("role,content,timestamp") \
+            .eq("session_id", session_id) \
+            .order("timestamp", desc=True) \
+            .limit(2 * self.config.turn_limit) \
+            .execute()
+        history = SessionHistory(self.config.turn_limit)
+        for r in reversed(resp.data or []):
+            history.append(r["role"], r["content"])
+        return history
+
+    async def get(self, client: AsyncClient, session_id: str) -> SessionHistory:
+        history = self.sessions.get(session_id)
+        if history is not None:
+            self.sessions.move_to_end(session_id)
+            return history
+        try:
+            fetched = await self._fetch(client, session_id)
+        except Exception as e:
+            # serve this request without history; the next one retries the fetch
+            logger.error(f"Chat history fetch failed for session {session_id}: {e}")
+            return SessionHistory(self.config.turn_limit)
+        # another request may have loaded the session while we were awaiting
+        history = self.sessions.get(session_id)
+        if history is not None:
+            return history
+        return self._put(session_id, fetched)
+
+    def append(self, session_id: str, role: str, content: str):
+        history: Optional[SessionHistory] = self.sessions.get(session_id)
+        if history is not None:
+            history.append(role, content)
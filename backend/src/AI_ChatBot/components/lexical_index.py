@@ -0,0 +1,308 @@
+import json
+import os
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+from supabase import Client
+
+from AI_ChatBot.components.retrieval_cache import fetch_corpus_version
+from AI_ChatBot.entity import LexicalIndexConfig
+from AI_ChatBot.logging import logger
+
+# keeps tickers and versions together: "brk.b", "gpt-4o", "s&p" → "s", "p"
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.\-][a-z0-9]+)*")
+# ignored when judging whether a query is a short keyword lookup
+_STOPWORDS = frozenset(
+    "a an and are as at be by can could did do does for from how i in is it me of on or "
+    "please should tell the this to was were what when where which who why will with would you".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+class _Postings:
+    """Immutable CSR snapshot: term t's postings are docs/tfs[offsets[t]:offsets[t+1]]."""
+    __slots__ = ("vocab", "offsets", "docs", "tfs", "doc_len", "idf", "avgdl", "rows", "row_of")
+
+    def __init__(self, vocab: Dict[str, int], offsets: np.ndarray, docs: np.ndarray,
+                 tfs: np.ndarray, doc_len: np.ndarray, rows: List[Dict[str, Any]]):
+        self.vocab = vocab
+        self.offsets = offsets
+        self.docs = docs
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.rows = rows
+        self.row_of = {r["id"]: i for i, r in enumerate(rows)}
+        n = len(rows)
+        df = np.diff(offsets).astype(np.float32)
+        self.idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        self.avgdl = float(doc_len.mean()) if n else 0.0
+
+
+class LexicalIndex:
+    """
+    In-process BM25 index over the `chunks` table.
+
+    Postings are stored CSR-style in flat NumPy arrays (uint32 doc ids, uint16 term
+    frequencies, int64 term offsets), persisted to `lexical.npz` next to the
+    vocabulary and chunk rows. Each snapshot records the corpus version it was
+    built from (see `fetch_corpus_version`); at startup and on every refresh a
+    snapshot whose version no longer matches is rebuilt from the table. Refreshes
+    run every `refresh_interval` seconds and whenever `request_refresh` is called
+    (the retrieval cache signals its version changes there). A rebuild swaps in a
+    new snapshot, so searches never see a half-built index.
+    """
+    COLUMNS = "id,document_id,chunk_index,text,metadata"
+
+    def __init__(self, config: LexicalIndexConfig, supabase: Client = None, table_name: str = "chunks"):
+        self.config = config
+        self.supabase = supabase
+        self.table_name = table_name
+        self.root_dir = Path(config.root_dir)
+        self.root_dir.mkdir(parents=True, exist_ok=True)
+        self.postings_path = self.root_dir / "lexical.npz"
+        self.vocab_path = self.root_dir / "vocab.json"
+        self.rows_path = self.root_dir / "rows.json"
+        self.meta_path = self.root_dir / "meta.json"
+        self.data: Optional[_Postings] = None
+        self.corpus_version: Optional[str] = None    # version the current snapshot was built from
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._requested_version: Optional[str] = None
+        self._refresher: Optional[threading.Thread] = None
+
+    # — Build —
+    def build(self, rows: Iterable[Dict[str, Any]]) -> int:
+        vocab: Dict[str, int] = {}
+        term_ids: List[int] = []
+        doc_ids: List[int] = []
+        freqs: List[int] = []
+        doc_len: List[int] = []
+        kept: List[Dict[str, Any]] = []
+        for row in rows:
+            tokens = tokenize(row.get("text") or "")
+            doc = len(kept)
+            for term, tf in Counter(tokens).items():
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+                doc_ids.append(doc)
+                freqs.append(min(tf, np.iinfo(np.uint16).max))
+            doc_len.append(len(tokens))
+            kept.append({
+                "id": row["id"],
+                "document_id": row.get("document_id"),
+                "chunk_index": row.get("chunk_index"),
+                "text": row.get("text", ""),
+                "metadata": row.get("metadata") or {},
+            })
+
+        terms = np.asarray(term_ids, dtype=np.uint32)
+        # stable sort keeps each term's doc ids ascending
+        order = np.argsort(terms, kind="stable")
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(vocab)), out=offsets[1:])
+        self.data = _Postings(
+            vocab,
+            offsets,
+            np.asarray(doc_ids, dtype=np.uint32)[order],
+            np.asarray(freqs, dtype=np.uint16)[order],
+            np.asarray(doc_len, dtype=np.uint32),
+            kept,
+        )
+        logger.info(f"Lexical index built: {len(kept)} chunks, {len(vocab)} terms, {terms.shape[0]} postings")
+        return len(kept)
+
+    def _fetch_rows(self) -> Iterator[Dict[str, Any]]:
+        start = 0
+        page = self.config.page_size
+        while True:
+            resp = self.supabase.table(self.table_name).select(self.COLUMNS) \
+                .order("id").range(start, start + page - 1).execute()
+            data = resp.data or []
+            yield from data
+            if len(data) < page:
+                break
+            start += page
+
+    def fetch_corpus_version(self) -> Optional[str]:
+        if self.supabase is None:
+            return None
+        return fetch_corpus_version(self.supabase, self.config.documents_table)
+
+    def build_from_table(self, version: Optional[str] = None) -> int:
+        # read before the rows, so a concurrent ingestion shows up as a newer version
+        version = version or self.fetch_corpus_version()
+        count = self.build(self._fetch_rows())
+        self.corpus_version = version
+        self.save()
+        return count
+
+    def is_stale(self, version: Optional[str]) -> bool:
+        return self.data is None or version is None or version != self.corpus_version
+
+    # — Persistence —
+    def save(self):
+        data = self.data
+        if data is None:
+            return
+        tmp = self.postings_path.with_suffix(".tmp.npz")
+        np.savez(tmp, offsets=data.offsets, docs=data.docs, tfs=data.tfs, doc_len=data.doc_len)
+        os.replace(tmp, self.postings_path)
+        terms = [None] * len(data.vocab)
+        for term, tid in data.vocab.items():
+            terms[tid] = term
+        meta = {"corpus_version": self.corpus_version}
+        for path, payload in ((self.vocab_path, terms), (self.rows_path, data.rows), (self.meta_path, meta)):
+            tmp = path.with_suffix(".tmp")
+            with open(tmp, "w", encoding="utf-8") as fp:
+                json.dump(payload, fp)
+            os.replace(tmp, path)
+
+    def load(self) -> bool:
+        if not (self.postings_path.exists() and self.vocab_path.exists() and self.rows_path.exists()):
+            return False
+        arrays = np.load(self.postings_path)
+        with open(self.vocab_path, encoding="utf-8") as fp:
+            terms = json.load(fp)
+        with open(self.rows_path, encoding="utf-8") as fp:
+            rows = json.load(fp)
+        meta = {}
+        if self.meta_path.exists():
+            with open(self.meta_path, encoding="utf-8") as fp:
+                meta = json.load(fp)
+        self.corpus_version = meta.get("corpus_version")
+        self.data = _Postings(
+            {t: i for i, t in enumerate(terms)},
+            arrays["offsets"], arrays["docs"], arrays["tfs"], arrays["doc_len"], rows
+        )
+        logger.info(f"Lexical index loaded: {len(rows)} chunks, {len(terms)} terms")
+        return True
+
+    def refresh(self, version: Optional[str] = None) -> bool:
+        """Rebuild when the corpus changed since the snapshot was built; True when rebuilt."""
+        version = version or self.fetch_corpus_version()
+        if not self.is_stale(version):
+            return False
+        if self.data is not None:
+            logger.info(f"Lexical index is stale ({self.corpus_version} → {version}), rebuilding")
+        self.build_from_table(version)
+        return True
+
+    def load_or_build(self):
+        self.load()
+        try:
+            self.refresh()
+        except Exception:
+            if self.data is None:
+                raise
+            logger.exception("Could not check the lexical index against the corpus; serving the snapshot")
+
+    def request_refresh(self, version: Optional[str] = None):
+        """Wake the refresher now (e.g. on a corpus version change seen elsewhere)."""
+        self._requested_version = version
+        self._wake.set()
+
+    def start_refresher(self):
+        """Refresh every `refresh_interval` seconds (0 = only on `request_refresh`)."""
+        if self._refresher is not None:
+            return
+        interval = self.config.refresh_interval if self.config.refresh_interval > 0 else None
+
+        def _loop():
+            while True:
+                self._wake.wait(interval)
+                self._wake.clear()
+                if self._stop.is_set():
+                    return
+                version, self._requested_version = self._requested_version, None
+                try:
+                    self.refresh(version)
+                except Exception as e:
+                    logger.error(f"Lexical index refresh failed: {e}")
+
+        self._refresher = threading.Thread(target=_loop, name="lexical-index-refresh", daemon=True)
+        self._refresher.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    # — Search —
+    def is_ready(self) -> bool:
+        return self.data is not None and len(self.data.rows) > 0
+
+    def search(self, query: str, top_k: int) -> List[Dict[str, Any]]:
+        """Return up to `top_k` chunks by BM25 in the shape of `match_chunks` rows, with a `bm25` score."""
+        data = self.data
+        if data is None or not data.rows:
+            return []
+        k1, b = self.config.k1, self.config.b
+        scores = np.zeros(len(data.rows), dtype=np.float32)
+        for term in set(tokenize(query)):
+            tid = data.vocab.get(term)
+            if tid is None:
+                continue
+            lo, hi = data.offsets[tid], data.offsets[tid + 1]
+            docs = data.docs[lo:hi]
+            tf = data.tfs[lo:hi].astype(np.float32)
+            norm = k1 * (1 - b + b * data.doc_len[docs] / max(data.avgdl, 1e-9))
+            # a term occurs once per doc in its postings, so plain fancy-index add is safe
+            scores[docs] += data.idf[tid] * tf * (k1 + 1) / (tf + norm)
+        hits = np.flatnonzero(scores)
+        if hits.size == 0:
+            return []
+        k = min(top_k, hits.size)
+        top = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [{**data.rows[i], "bm25": float(scores[i])} for i in top]
+
+    @staticmethod
+    def _contains(data: _Postings, term: str, doc: int) -> bool:
+        tid = data.vocab.get(term)
+        if tid is None:
+            return False
+        lo, hi = data.offsets[tid], data.offsets[tid + 1]
+        pos = lo + np.searchsorted(data.docs[lo:hi], doc)
+        return pos < hi and data.docs[pos] == doc
+
+    def reference_score(self, query: str) -> float:
+        """
+        BM25 of an average-length chunk holding each known query term once (the sum
+        of their idf), but at least `bm25_floor`. `bm25 / reference_score` is an
+        absolute 0..1 (capped) score that does not depend on the other hits and
+        stays low for queries made of common terms.
+        """
+        data = self.data
+        if data is None:
+            return 0.0
+        tids = [data.vocab[t] for t in set(tokenize(query)) if t in data.vocab]
+        return max(float(data.idf[tids].sum()) if tids else 0.0, self.config.bm25_floor)
+
+    @staticmethod
+    def normalized_score(bm25: float, reference: float) -> float:
+        return min(1.0, bm25 / reference) if reference > 0 else 0.0
+
+    def is_confident(self, query: str, hits: List[Dict[str, Any]]) -> bool:
+        """
+        True for short keyword queries (tickers, acronyms, product names) whose top
+        hit contains every query term, scores at least `bm25_floor` and
+        clearly outscores the runner-up; such queries are answered lexically,
+        without an embedding call.
+        """
+        data = self.data
+        if not hits or data is None:
+            return False
+        if hits[0]["bm25"] < self.config.bm25_floor:
+            return False
+        terms = {t for t in tokenize(query) if t not in _STOPWORDS}
+        if not terms or len(terms) > self.config.fast_path_max_terms:
+            return False
+        if len(hits) > 1 and hits[0]["bm25"] < self.config.fast_path_margin * hits[1]["bm25"]:
+            return False
+        doc = data.row_of.get(hits[0]["id"])
+        return doc is not None and all(self._contains(data, t, doc) for t in terms)
@@ -0,0 +1,257 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain.chat_models import init_chat_model
+from langchain_core.messages import BaseMessage
+from langchain_core.messages.utils import message_chunk_to_message
+
+from AI_ChatBot.entity import LLMPoolConfig, LLMProviderConfig
+from AI_ChatBot.logging import logger
+
+
+class Provider:
+    """One chat model with a rolling window of latencies and outcomes."""
+    def __init__(self, config: LLMProviderConfig, llm, window: int):
+        self.config = config
+        self.name = config.name
+        self.llm = llm
+        self.latencies: deque = deque(maxlen=window)   # seconds, successful calls only
+        self.outcomes: deque = deque(maxlen=window)    # True = success
+        self.open_until = 0.0                          # circuit open (skipped) until this time
+        self.bound: Dict[Tuple[int, ...], Any] = {}    # bind_tools results by tool identity
+
+    def model_for(self, tools: Optional[Sequence]):
+        if not tools:
+            return self.llm
+        key = tuple(id(t) for t in tools)
+        if key not in self.bound:
+            self.bound[key] = self.llm.bind_tools(list(tools))
+        return self.bound[key]
+
+    def latency_percentile(self, q: float) -> Optional[float]:
+        return float(np.percentile(self.latencies, q)) if self.latencies else None
+
+    def error_rate(self) -> float:
+        return 1 - sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+
+
+class LLMPool:
+    """
+    Chat models of several providers behind one call.
+
+    Each call goes to the fastest healthy provider (median of its recent
+    latencies; providers not measured yet rank after measured ones, in
+    configured order). If that provider has not produced its first token by a
+    deadline — its own p95 latency, clamped to [hedge_min_delay, hedge_max_delay]
+    — one hedged request is sent to the next provider and the first answer wins.
+    A failed call fails over to the next provider at once. A provider whose
+    error rate over the window exceeds `max_error_rate` is skipped for
+    `cooldown` seconds, then gets a fresh window.
+
+    Only the primary request streams tokens to the caller's callbacks (the
+    /chat/stream endpoint); hedged and failover requests run silently. Once
+    the primary has started streaming its answer is the one kept, and if it
+    fails after that the error is raised instead of failing over.
+    """
+    def __init__(self, config: LLMPoolConfig):
+        self.config = config
+        self.lock = threading.Lock()
+        self.providers: List[Provider] = []
+        for provider in config.providers:
+            if not os.getenv(provider.api_key_env):
+                continue
+            try:
+                llm = init_chat_model(provider.model, model_provider=provider.provider)
+            except Exception as e:
+                logger.error(f"Could not initialize {provider.name} ({provider.model}): {e}")
+                continue
+            self.providers.append(Provider(provider, llm, config.window))
+        if not self.providers:
+            raise ValueError("All model initializations failed")
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+        logger.info(f"LLM pool: {', '.join(p.name for p in self.providers)}")
+
+    # — Health and ranking —
+    def _record(self, provider: Provider, ok: bool, latency: float = 0.0):
+        with self.lock:
+            provider.outcomes.append(ok)
+            if ok:
+                provider.latencies.append(latency)
+            elif (len(provider.outcomes) >= self.config.min_samples
+                  and provider.error_rate() > self.config.max_error_rate):
+                provider.open_until = time.monotonic() + self.config.cooldown
+                provider.outcomes.clear()
+                logger.warning(f"LLM provider {provider.name} unhealthy, skipped for {self.config.cooldown}s")
+
+    def _record_cancelled(self, provider: Provider, elapsed: float):
+        # a request that lost a hedge took at least this long; without the sample
+        # a slow provider would keep its old latency and stay first in line
+        with self.lock:
+            provider.latencies.append(elapsed)
+
+    def ranked(self) -> List[Provider]:
+        """Healthy providers, fastest first; all of them when every circuit is open."""
+        now = time.monotonic()
+        with self.lock:
+            def key(item):
+                order, p = item
+                median = p.latency_percentile(50)
+                return (p.open_until > now, median is None, median or 0.0, order)
+            ranked = [p for _, p in sorted(enumerate(self.providers), key=key)]
+        healthy = [p for p in ranked if p.open_until <= now]
+        return healthy or ranked
+
+    def hedge_delay(self, provider: Provider) -> float:
+        with self.lock:
+            p95 = provider.latency_percentile(self.config.hedge_percentile) \
+                if len(provider.latencies) >= self.config.min_samples else None
+        delay = self.config.hedge_max_delay if p95 is None else p95
+        return min(max(delay, self.config.hedge_min_delay), self.config.hedge_max_delay)
+
+    # — Calls —
+    def invoke(self, messages: List[BaseMessage], tools: Optional[Sequence] = None) -> Tuple[BaseMessage, Dict[str, Any]]:
+        """Sync call: fastest healthy provider, failing over in rank order (no hedging)."""
+        self.calls += 1
+        ranked = self.ranked()
+        error = None
+        for attempt, provider in enumerate(ranked):
+            started = time.perf_counter()
+            try:
+                message = provider.model_for(tools).invoke(messages)
+            except Exception as e:
+                self._record(provider, False)
+                logger.error(f"LLM provider {provider.name} failed: {e}")
+                error = e
+                continue
+            latency = time.perf_counter() - started
+            self._record(provider, True, latency)
+            if attempt:
+                self.failovers += 1
+            return message, self._meta(provider, attempt > 0, latency)
+        raise error
+
+    async def _stream_primary(self, provider: Provider, messages, tools, first_token: asyncio.Event):
+        started = time.perf_counter()
+        try:
+            message = None
+            # streaming keeps the caller's callbacks, so /chat/stream sees the tokens
+            async for chunk in provider.model_for(tools).astream(messages):
+                first_token.set()
+                message = chunk if message is None else message + chunk
+        except Exception:
+            self._record(provider, False)
+            raise
+        latency = time.perf_counter() - started
+        self._record(provider, True, latency)
+        return message_chunk_to_message(message), latency
+
+    async def _call_silent(self, provider: Provider, messages, tools):
+        started = time.perf_counter()
+        try:
+            message = await provider.model_for(tools).ainvoke(messages, config={"callbacks": []})
+        except Exception:
+            self._record(provider, False)
+            raise
+        latency = time.perf_counter() - started
+        self._record(provider, True, latency)
+        return message, latency
+
+    async def ainvoke(self, messages: List[BaseMessage], tools: Optional[Sequence] = None) -> Tuple[BaseMessage, Dict[str, Any]]:
+        """Async call with hedging and failover; returns the message and {model, is_fallback, latency}."""
+        self.calls += 1
+        ranked = self.ranked()
+        primary = ranked[0]
+        backups = iter(ranked[1:])
+        first_token = asyncio.Event()
+        pending: Dict[asyncio.Task, Provider] = {}
+        started: Dict[asyncio.Task, float] = {}
+
+        def launch(provider: Provider, call):
+            task = asyncio.create_task(call)
+            pending[task] = provider
+            started[task] = time.perf_counter()
+
+        launch(primary, self._stream_primary(primary, messages, tools, first_token))
+        hedged = False
+        settled = False
+        error = None
+        deadline = asyncio.get_running_loop().time() + self.hedge_delay(primary)
+        try:
+            while pending:
+                can_hedge = self.config.hedge and not hedged and not first_token.is_set() and len(pending) == 1
+                timeout = max(deadline - asyncio.get_running_loop().time(), 0) if can_hedge else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if first_token.is_set():
+                        continue
+                    backup = next(backups, None)
+                    hedged = True
+                    if backup is not None:
+                        self.hedges += 1
+                        launch(backup, self._call_silent(backup, messages, tools))
+                    continue
+                for task in done:
+                    provider = pending.pop(task)
+                    if task.exception() is None:
+                        if provider is not primary and first_token.is_set() and primary in pending.values():
+                            # the primary is already streaming to the client: let it finish
+                            continue
+                        message, latency = task.result()
+                        if provider is not primary:
+                            if hedged and primary in pending.values():
+                                self.hedge_wins += 1
+                            else:
+                                self.failovers += 1
+                        settled = True
+                        return message, self._meta(provider, provider is not primary, latency)
+                    error = task.exception()
+                    logger.error(f"LLM provider {provider.name} failed: {error}")
+                    if provider is primary and first_token.is_set():
+                        # part of this answer already reached the client; another
+                        # provider's answer would be appended to it, so give up
+                        raise error
+                if not pending:
+                    backup = next(backups, None)
+                    if backup is not None:
+                        launch(backup, self._call_silent(backup, messages, tools))
+            raise error
+        finally:
+            for task, provider in pending.items():
+                task.cancel()
+                if settled:
+                    # only hedge losers cancelled by the pool; a caller going away says nothing about latency
+                    self._record_cancelled(provider, time.perf_counter() - started[task])
+
+    @staticmethod
+    def _meta(provider: Provider, is_fallback: bool, latency: float) -> Dict[str, Any]:
+        return {"model": provider.config.model, "is_fallback": is_fallback, "latency": round(latency, 4)}
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self.lock:
+            providers = {
+                p.name: {
+                    "model": p.config.model,
+                    "healthy": p.open_until <= now,
+                    "calls": len(p.outcomes),
+                    "error_rate": round(p.error_rate(), 4),
+                    "p50": round(p.latency_percentile(50) or 0.0, 4),
+                    "p95": round(p.latency_percentile(95) or 0.0, 4),
+                }
+                for p in self.providers
+            }
+        return {
+            "calls": self.calls,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "failovers": self.failovers,
+            "providers": providers,
+        }
@@ -0,0 +1,88 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+from AI_ChatBot.entity import EmbeddingConfig
+from AI_ChatBot.logging import logger
+
+
+class LocalEmbeddings:
+    """
+    sentence-transformers/all-MiniLM-L6-v2 on CPU through ONNX Runtime.
+
+    Same model, tokenizer, mean pooling and L2 normalization as the hosted
+    endpoint, so query vectors are comparable with the ingested `chunks`
+    embeddings (see benchmarks/embedding_parity.py). `onnx_file` selects the
+    fp32 export or one of the int8-quantized exports in the model repo.
+    Inference runs on a small thread pool; ONNX Runtime releases the GIL,
+    so concurrent queries are embedded in parallel.
+    """
+    def __init__(self, config: EmbeddingConfig):
+        try:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise ImportError(
+                "The onnx embedding backend needs `onnxruntime` and `tokenizers` (pip install onnxruntime tokenizers)"
+            ) from e
+        self.config = config
+        model_path, tokenizer_path = self._resolve_files()
+
+        self.tokenizer = Tokenizer.from_file(str(tokenizer_path))
+        self.tokenizer.enable_truncation(max_length=config.max_length)
+        self.tokenizer.enable_padding()
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = config.intra_op_threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(model_path), options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.pool = ThreadPoolExecutor(max_workers=config.pool_workers, thread_name_prefix="onnx-embed")
+        logger.info(f"Local ONNX embeddings loaded: {config.model_repo}/{config.onnx_file}")
+
+    def _resolve_files(self):
+        model_dir = Path(self.config.model_dir)
+        model_path = model_dir / self.config.onnx_file
+        tokenizer_path = model_dir / "tokenizer.json"
+        if model_path.exists() and tokenizer_path.exists():
+            return model_path, tokenizer_path
+        from huggingface_hub import hf_hub_download
+        logger.info(f"Downloading {self.config.model_repo} ONNX files to {model_dir}")
+        for name in (self.config.onnx_file, "tokenizer.json"):
+            hf_hub_download(self.config.model_repo, name, local_dir=str(model_dir),
+                            token=os.getenv("HUGGINGFACEHUB_API_TOKEN"))
+        return model_path, tokenizer_path
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        ids = np.asarray([e.ids for e in encodings], dtype=np.int64)
+        mask = np.asarray([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": ids, "attention_mask": mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.asarray([e.type_ids for e in encodings], dtype=np.int64)
+        hidden = self.session.run(None, feeds)[0]
+        # mean pooling over real tokens, then L2 normalization (sentence-transformers defaults)
+        weights = mask[..., None].astype(np.float32)
+        pooled = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(pooled, axis=1, keepdims=True)
+        return (pooled / np.clip(norms, 1e-12, None)).astype(np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        size = self.config.batch_size
+        batches = [texts[i:i + size] for i in range(0, len(texts), size)]
+        return [v.tolist() for part in self.pool.map(self._embed_batch, batches) for v in part]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed_batch([text])[0].tolist()
+
+    async def aembed_query(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        vec = await loop.run_in_executor(self.pool, self._embed_batch, [text])
+        return vec[0].tolist()
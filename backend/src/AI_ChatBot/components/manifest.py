@@ -0,0 +1,93 @@
+import os
+import json
+import hashlib
+from pathlib import Path
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set
+
+from AI_ChatBot.logging import logger
+
+
+@dataclass
+class IngestionPlan:
+    """Result of diffing the source files against the manifest."""
+    changed: List[Path] = field(default_factory=list)     # new or modified, to be (re)ingested
+    unchanged: List[Path] = field(default_factory=list)   # skipped entirely
+    deleted: List[str] = field(default_factory=list)      # filenames in the manifest but gone from disk
+    hashes: Dict[str, str] = field(default_factory=dict)  # filename → current content hash
+
+
+class IngestionManifest:
+    """
+    Persistent record of what is already in Supabase:
+    filename → {"content_hash", "document_id", "chunk_ids", "text_hashes"}.
+
+    The content hash is the md5 of the file bytes, the same value
+    `merge_titles_with_body` stores as `content_hash` in chunk metadata.
+    """
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.entries: Dict[str, Dict] = {}
+        if self.path.exists():
+            with open(self.path, encoding="utf-8") as fp:
+                self.entries = json.load(fp)
+            logger.info(f"Ingestion manifest loaded: {len(self.entries)} files")
+
+    @staticmethod
+    def file_hash(path: Path) -> str:
+        digest = hashlib.md5()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def plan(self, files: Iterable[Path]) -> IngestionPlan:
+        plan = IngestionPlan()
+        seen = set()
+        for path in files:
+            path = Path(path)
+            if not path.is_file():
+                continue
+            seen.add(path.name)
+            content_hash = self.file_hash(path)
+            plan.hashes[path.name] = content_hash
+            entry = self.entries.get(path.name)
+            if entry and entry.get("content_hash") == content_hash:
+                plan.unchanged.append(path)
+            else:
+                plan.changed.append(path)
+        plan.deleted = [name for name in self.entries if name not in seen]
+        logger.info(f"Ingestion plan: {len(plan.changed)} new/changed, "
+                    f"{len(plan.unchanged)} unchanged, {len(plan.deleted)} deleted")
+        return plan
+
+    def chunk_ids(self, filename: str) -> List[str]:
+        entry = self.entries.get(filename)
+        return list(entry.get("chunk_ids", [])) if entry else []
+
+    def document_id(self, filename: str) -> Optional[str]:
+        entry = self.entries.get(filename)
+        return entry.get("document_id") if entry else None
+
+    def text_hashes(self) -> Set[str]:
+        """Hashes of every chunk text currently ingested (embedding store references)."""
+        return {h for entry in self.entries.values() for h in entry.get("text_hashes", [])}
+
+    def record(self, filename: str, content_hash: str, document_id: str,
+               chunk_ids: List[str], text_hashes: List[str] = None):
+        self.entries[filename] = {
+            "content_hash": content_hash,
+            "document_id": document_id,
+            "chunk_ids": list(chunk_ids),
+            "text_hashes": list(text_hashes or []),
+        }
+
+    def remove(self, filename: str):
+        self.entries.pop(filename, None)
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as fp:
+            json.dump(self.entries, fp)
+        os.replace(tmp, self.path)
@@ -0,0 +1,133 @@
+import asyncio
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from supabase import AsyncClient
+
+from AI_ChatBot.entity import PersistenceConfig
+from AI_ChatBot.logging import logger
+
+
+class HistoryWriter:
+    """
+    Write-behind persistence of chat_history rows.
+
+    Handlers `enqueue` turn records and return immediately; a background task
+    flushes them to Supabase in bulk once `batch_size` rows are waiting or
+    `flush_interval` seconds have passed. Failed batches are retried with
+    exponential backoff and kept for the next flush if retries run out
+    (at-least-once). Every row carries a `message_id` idempotency key and is
+    upserted with ignore-duplicates, so a retried batch never duplicates rows.
+    `stop` drains everything still queued.
+    """
+    def __init__(self, config: PersistenceConfig, table_name: str = "chat_history"):
+        self.config = config
+        self.table_name = table_name
+        self.client: Optional[AsyncClient] = None
+        self.queue: Optional[asyncio.Queue] = None
+        self._retry: deque = deque()
+        self._inflight: List[Dict[str, Any]] = []
+        self._task: Optional[asyncio.Task] = None
+        self.flushed = 0
+        self.failed_attempts = 0
+
+    async def start(self, client: AsyncClient):
+        self.client = client
+        self.queue = asyncio.Queue(maxsize=self.config.queue_max)
+        self._task = asyncio.create_task(self._run(), name="history-writer")
+
+    async def enqueue(self, session_id: str, role: str, content: str):
+        """Queue one message; waits only when the queue is full (back-pressure)."""
+        record = {
+            "message_id": str(uuid.uuid4()),
+            "session_id": session_id,
+            "role": role,
+            "content": content,
+            # stamped now so ordering reflects the conversation, not the flush
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        }
+        await self.queue.put(record)
+
+    async def _next_batch(self) -> List[Dict[str, Any]]:
+        # collected in place so a cancellation mid-gather leaves the rows visible to `stop`
+        batch = self._inflight = []
+        while self._retry and len(batch) < self.config.batch_size:
+            batch.append(self._retry.popleft())
+        if not batch:
+            batch.append(await self.queue.get())
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.config.flush_interval
+        while len(batch) < self.config.batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _write(self, batch: List[Dict[str, Any]]) -> bool:
+        for attempt in range(self.config.max_retries):
+            try:
+                await self.client.table(self.table_name).upsert(
+                    batch,
+                    on_conflict="message_id",
+                    ignore_duplicates=True
+                ).execute()
+                self.flushed += len(batch)
+                return True
+            except Exception as e:
+                self.failed_attempts += 1
+                delay = self.config.retry_backoff * (2 ** attempt)
+                logger.warning(f"chat_history flush of {len(batch)} rows failed "
+                               f"(attempt {attempt + 1}/{self.config.max_retries}): {e}")
+                await asyncio.sleep(delay)
+        return False
+
+    def _keep_for_retry(self, batch: List[Dict[str, Any]]):
+        self._retry.extend(batch)
+        overflow = len(self._retry) - self.config.queue_max
+        if overflow > 0:
+            for _ in range(overflow):
+                self._retry.popleft()
+            logger.error(f"chat_history retry buffer full, dropped {overflow} oldest rows")
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            if not await self._write(batch):
+                self._keep_for_retry(batch)
+            self._inflight = []
+
+    async def stop(self):
+        """Stop the background task and flush whatever is still queued."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        # rows of a batch interrupted mid-write may already be stored; message_id dedupes them
+        pending = self._inflight + list(self._retry)
+        self._inflight = []
+        self._retry.clear()
+        while not self.queue.empty():
+            pending.append(self.queue.get_nowait())
+        for i in range(0, len(pending), self.config.batch_size):
+            batch = pending[i:i + self.config.batch_size]
+            if not await self._write(batch):
+                logger.error(f"chat_history drain lost {len(batch)} rows")
+        logger.info(f"History writer stopped: {self.flushed} rows flushed")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "retrying": len(self._retry),
+            "flushed": self.flushed,
+            "failed_attempts": self.failed_attempts,
+        }
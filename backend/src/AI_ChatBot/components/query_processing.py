@@ -1,30 +1,34 @@
 import re
-from typing import Dict, Any, List
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Dict, Any, List, Optional, Tuple
 import numpy as np
 import os
-import torch
-from AI_ChatBot.entity import QueryConfig
+from AI_ChatBot.entity import QueryConfig, EmbeddingConfig
 from AI_ChatBot.logging import logger
-from supabase import create_client, Client
-from langchain.schema import Document
-from langchain_openai import OpenAIEmbeddings
-from langchain_huggingface.embeddings.huggingface_endpoint import HuggingFaceEndpointEmbeddings
-from langchain.chains import LLMChain
-from langchain.prompts import PromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.output_parsers import StrOutputParser
-from langchain_openai import ChatOpenAI
+from AI_ChatBot.utils.metrics import span
+from supabase import create_client, acreate_client, Client, AsyncClient
+
+class _Abandoned(Exception):
+    """The caller computing an in-flight embedding was cancelled."""
+
 
 class QueryProcessor:
     """
     Processes user queries: preprocessing, intent analysis, embedding.
     """
-    def __init__(self,params:QueryConfig):
+    def __init__(self,params:QueryConfig,embedding_config:EmbeddingConfig=None):
         self.params = params
-        device = "cuda" if torch.cuda.is_available() else "cpu"
         self.api_key = os.getenv("HUGGINGFACEHUB_API_TOKEN")
         self.api = os.getenv("OPENAI_API_KEY")
-        if self.api_key:
+        # provider SDKs are imported only for the backend actually used
+        if embedding_config is not None and embedding_config.backend == "onnx":
+            from AI_ChatBot.components.local_embeddings import LocalEmbeddings
+            logger.info("Using local ONNX embeddings")
+            self.embedding_model = LocalEmbeddings(embedding_config)
+        elif self.api_key:
+            from langchain_huggingface.embeddings.huggingface_endpoint import HuggingFaceEndpointEmbeddings
             logger.info("Using Huggingface embeddings")
             self.embedding_model = HuggingFaceEndpointEmbeddings(
             model="sentence-transformers/all-MiniLM-L6-v2",
@@ -32,6 +36,7 @@ class QueryProcessor:
             huggingfacehub_api_token=self.api_key
         )
         elif self.api:
+            from langchain_openai import OpenAIEmbeddings
             logger.info("Using OpenAI embeddings")
             self.embedding_model = OpenAIEmbeddings(api_key=self.api,model="text-embedding-3-small")
         else:
@@ -43,7 +48,125 @@ class QueryProcessor:
             raise ValueError("Supabase credentials not found")
 
         self.supabase: Client = create_client(self.supabase_url, self.supabase_key)
+        # Async client is created lazily on first use, inside the running event loop
+        self.async_supabase: AsyncClient = None
+        self._async_client_lock = asyncio.Lock()
         self.table_name = "chunks"
+        # Optional in-process replica of the chunks table (see LocalVectorIndex)
+        self.vector_index = None
+        # Optional VectorCache consulted before any embedding API call
+        self.vector_cache = None
+        # Optional EmbeddingBatcher coalescing concurrent embedding calls
+        self.batcher = None
+        # Optional BM25 index for hybrid retrieval (see LexicalIndex)
+        self.lexical_index = None
+        self.lexical_fast_path_hits = 0
+        # Optional RetrievalCache consulted before embedding and search
+        self.retrieval_cache = None
+        # embeddings being computed, so concurrent callers for one string share a call
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+
+    def attach_vector_cache(self, vector_cache):
+        self.vector_cache = vector_cache
+
+    def attach_batcher(self, batcher):
+        self.batcher = batcher
+
+    def attach_index(self, vector_index):
+        """Serve retrieval from a local vector index instead of the match_chunks RPC."""
+        self.vector_index = vector_index
+
+    def attach_lexical_index(self, lexical_index):
+        """Fuse BM25 results into retrieval and answer confident keyword queries lexically."""
+        self.lexical_index = lexical_index
+
+    def attach_retrieval_cache(self, retrieval_cache):
+        self.retrieval_cache = retrieval_cache
+
+    def _cached_retrieval(self, pre_q: str):
+        if self.retrieval_cache is None:
+            return None, None
+        version = self.retrieval_cache.corpus_version
+        return self.retrieval_cache.get(pre_q, self.params.top_k, self.params.similarity_threshold), version
+
+    def _store_retrieval(self, pre_q: str, retrieved: List[Dict], version):
+        if self.retrieval_cache is not None:
+            self.retrieval_cache.set(pre_q, self.params.top_k, self.params.similarity_threshold, retrieved, version)
+
+    def _lexical_matches(self, query: str):
+        if self.lexical_index is None or not self.lexical_index.is_ready():
+            return None
+        try:
+            with span("lexical_search"):
+                return self.lexical_index.search(query, 2 * self.params.top_k)
+        except Exception as e:
+            logger.error(f"Lexical index search failed: {e}")
+            return None
+
+    def _lexical_fast_path(self, query: str, lexical) -> Optional[List[Dict]]:
+        """Lexical-only results when the BM25 match is unambiguous, so no embedding is needed."""
+        if not lexical or not self.lexical_index.is_confident(query, lexical):
+            return None
+        self.lexical_fast_path_hits += 1
+        reference = self.lexical_index.reference_score(query)
+        results = []
+        for row in lexical[:self.params.top_k]:
+            # absolute 0..1 score (see LexicalIndex.reference_score), held to the same threshold as cosine
+            score = self.lexical_index.normalized_score(row["bm25"], reference)
+            if score >= self.params.similarity_threshold:
+                results.append({"id": row["id"], "document_id": row.get("document_id"),
+                                "chunk_index": row.get("chunk_index"), "score": score,
+                                "text": row.get("text", ""), "metadata": row.get("metadata", {})})
+        return results
+
+    def _fuse(self, query: str, dense: List[Dict], lexical) -> List[Dict]:
+        """
+        Reciprocal-rank fusion of dense and BM25 results, ranked by the fused `rrf`.
+        `score` stays on a 0..1 scale: the cosine similarity or the normalized BM25
+        score (see LexicalIndex.reference_score), whichever is higher. Rows found
+        only lexically must clear `similarity_threshold` on the BM25 score.
+        """
+        if not lexical:
+            return dense
+        k = self.lexical_index.config.rrf_k
+        reference = self.lexical_index.reference_score(query)
+        fused: Dict[str, Dict] = {}
+        for rank, item in enumerate(dense):
+            key = item.get("id") or item["text"]
+            fused[key] = {**item, "similarity": item["score"], "rrf": 1.0 / (k + rank + 1)}
+        for rank, row in enumerate(lexical):
+            key = row["id"]
+            lexical_score = self.lexical_index.normalized_score(row["bm25"], reference)
+            entry = fused.get(key)
+            if entry is None:
+                if lexical_score < self.params.similarity_threshold:
+                    continue
+                entry = fused[key] = {"id": row["id"], "document_id": row.get("document_id"),
+                                      "chunk_index": row.get("chunk_index"), "text": row.get("text", ""),
+                                      "metadata": row.get("metadata", {}), "score": 0.0, "rrf": 0.0}
+            entry["bm25"] = row["bm25"]
+            entry["score"] = max(entry["score"], lexical_score)
+            entry["rrf"] += 1.0 / (k + rank + 1)
+        results = sorted(fused.values(), key=lambda x: x["rrf"], reverse=True)
+        return results[:self.params.top_k]
+
+    def _local_matches(self, emb: List[float]):
+        if self.vector_index is None or not self.vector_index.is_ready():
+            return None
+        try:
+            with span("local_search"):
+                return self.vector_index.search(emb, self.params.top_k)
+        except Exception as e:
+            logger.error(f"Local vector index search failed, falling back to RPC: {e}")
+            return None
+
+    async def _get_async_client(self) -> AsyncClient:
+        if self.async_supabase is None:
+            async with self._async_client_lock:
+                if self.async_supabase is None:
+                    self.async_supabase = await acreate_client(self.supabase_url, self.supabase_key)
+        return self.async_supabase
 
     def preprocess_query(self, query: str) -> str:
         # Normalize whitespace
@@ -81,28 +204,102 @@ class QueryProcessor:
         if norm > 0:
             arr /= norm
         return arr.tolist()
-    def search_similar_chunks(self,query:str)->List[Dict]:
-        if hasattr(self.embedding_model, "embed_query"):
-            vec = self.embedding_model.embed_query(query)
+
+    def _cached_embedding(self, query: str):
+        if self.vector_cache is None:
+            return None
+        vec = self.vector_cache.get(query)
+        return None if vec is None else vec.tolist()
+
+    def _store_embedding(self, query: str, emb: List[float]):
+        if self.vector_cache is not None:
+            self.vector_cache.set(query, emb)
+
+    def _claim(self, query: str) -> Tuple[Future, bool]:
+        """The in-flight embedding of `query`, and whether the caller has to compute it."""
+        with self._inflight_lock:
+            future = self._inflight.get(query)
+            if future is not None:
+                return future, False
+            future = self._inflight[query] = Future()
+            return future, True
+
+    def _settle(self, query: str, future: Future, emb: List[float] = None, error: BaseException = None):
+        with self._inflight_lock:
+            self._inflight.pop(query, None)
+        if error is None:
+            self._store_embedding(query, emb)
+            future.set_result(emb)
         else:
-            # Some embedder only has embed_documents
-            vec = self.embedding_model.embed_documents([query])[0]
-        emb = self._normalize(vec)
+            # a cancelled owner leaves the waiters to embed on their own
+            future.set_exception(error if isinstance(error, Exception) else _Abandoned())
+
+    def embed_query(self, query: str) -> List[float]:
+        emb = self._cached_embedding(query)
+        if emb is not None:
+            return emb
+        future, owner = self._claim(query)
+        if not owner:
+            try:
+                return future.result()
+            except _Abandoned:
+                return self.embed_query(query)
         try:
-          resp = self.supabase.rpc("match_chunks",{
-              "query_embedding":emb,
-              "match_count":self.params.top_k
-          }).execute()
-        except Exception as e:
-          print("Supabase RPC error:", e)
-          return []
-        data = getattr(resp,"data",None) or []
+            with span("embed"):
+                if self.batcher is not None:
+                    vec = self.batcher.embed(query)
+                elif hasattr(self.embedding_model, "embed_query"):
+                    vec = self.embedding_model.embed_query(query)
+                else:
+                    # Some embedder only has embed_documents
+                    vec = self.embedding_model.embed_documents([query])[0]
+            emb = self._normalize(vec)
+        except BaseException as e:
+            self._settle(query, future, error=e)
+            raise
+        self._settle(query, future, emb)
+        return emb
+
+    async def aembed_query(self, query: str) -> List[float]:
+        emb = self._cached_embedding(query)
+        if emb is not None:
+            return emb
+        future, owner = self._claim(query)
+        if not owner:
+            try:
+                # shielded: a cancelled waiter must not cancel the shared future
+                return await asyncio.shield(asyncio.wrap_future(future))
+            except _Abandoned:
+                return await self.aembed_query(query)
+        try:
+            with span("embed"):
+                if self.batcher is not None:
+                    vec = await self.batcher.aembed(query)
+                elif hasattr(self.embedding_model, "aembed_query"):
+                    vec = await self.embedding_model.aembed_query(query)
+                else:
+                    # No native async support: keep the event loop free by using a worker thread
+                    vec = await asyncio.to_thread(self.embedding_model.embed_documents, [query])
+                    vec = vec[0]
+            emb = self._normalize(vec)
+        except BaseException as e:
+            self._settle(query, future, error=e)
+            raise
+        self._settle(query, future, emb)
+        return emb
+
+    def _format_matches(self, data: List[Dict]) -> List[Dict]:
+        # `similarity` is a cosine similarity (higher is closer) for both the
+        # match_chunks RPC (1 - cosine distance, see README) and LocalVectorIndex
         results = []
         for row in data:
           score = row.get("similarity",0.0)
           if score < self.params.similarity_threshold:
             continue
           results.append({
+              "id": row.get("id"),
+              "document_id": row.get("document_id"),
+              "chunk_index": row.get("chunk_index"),
               'score':score,
               "text": row.get("text",""),
               "metadata": row.get("metadata",{})
@@ -110,17 +307,87 @@ class QueryProcessor:
         results.sort(key=lambda x: x["score"], reverse=True)
         return results
 
+    def _dense_search(self, query: str) -> List[Dict]:
+        emb = self.embed_query(query)
+        local = self._local_matches(emb)
+        if local is not None:
+            return self._format_matches(local)
+        try:
+          with span("match_chunks"):
+            resp = self.supabase.rpc("match_chunks",{
+                "query_embedding":emb,
+                "match_count":self.params.top_k
+            }).execute()
+        except Exception as e:
+          logger.error(f"Supabase RPC error: {e}")
+          return []
+        data = getattr(resp,"data",None) or []
+        return self._format_matches(data)
+
+    async def _adense_search(self, query: str) -> List[Dict]:
+        emb = await self.aembed_query(query)
+        # local search is an in-memory dot product, no need to leave the event loop
+        local = self._local_matches(emb)
+        if local is not None:
+            return self._format_matches(local)
+        try:
+          client = await self._get_async_client()
+          with span("match_chunks"):
+            resp = await client.rpc("match_chunks",{
+                "query_embedding":emb,
+                "match_count":self.params.top_k
+            }).execute()
+        except Exception as e:
+          logger.error(f"Supabase RPC error: {e}")
+          return []
+        data = getattr(resp,"data",None) or []
+        return self._format_matches(data)
+
+    def search_similar_chunks(self,query:str)->List[Dict]:
+        lexical = self._lexical_matches(query)
+        fast = self._lexical_fast_path(query, lexical)
+        if fast is not None:
+            return fast
+        return self._fuse(query, self._dense_search(query), lexical)
+
+    async def asearch_similar_chunks(self,query:str)->List[Dict]:
+        """Non-blocking variant of `search_similar_chunks` for use inside the event loop."""
+        # BM25 over in-memory postings is cheap enough to run on the loop
+        lexical = self._lexical_matches(query)
+        fast = self._lexical_fast_path(query, lexical)
+        if fast is not None:
+            return fast
+        return self._fuse(query, await self._adense_search(query), lexical)
+
     def process(self, raw_query: str) -> Dict[str, Any]:
         """
         Full pipeline up to retrieval. Returns intent, preprocessed query, and retrieved chunks.
         """
         pre_q = self.preprocess_query(raw_query)
         intent = self.analyze_intent(pre_q)
-        retrieved = self.search_similar_chunks(pre_q)
+        retrieved, version = self._cached_retrieval(pre_q)
+        if retrieved is None:
+            retrieved = self.search_similar_chunks(pre_q)
+            self._store_retrieval(pre_q, retrieved, version)
         # Attach intent and preprocessed query to results
         return {
             "preprocessed_query": pre_q,
             "intent": intent,
             "retrieved_chunks": retrieved
         }
-    
+
+    async def aprocess(self, raw_query: str) -> Dict[str, Any]:
+        """
+        Async counterpart of `process`; embedding and RPC calls do not block the event loop.
+        """
+        pre_q = self.preprocess_query(raw_query)
+        intent = self.analyze_intent(pre_q)
+        retrieved, version = self._cached_retrieval(pre_q)
+        if retrieved is None:
+            retrieved = await self.asearch_similar_chunks(pre_q)
+            self._store_retrieval(pre_q, retrieved, version)
+        return {
+            "preprocessed_query": pre_q,
+            "intent": intent,
+            "retrieved_chunks": retrieved
+        }
@@ -1,61 +1,102 @@
-import os
+import re
+import uuid
+from typing import Annotated
 from dotenv import load_dotenv
-from supabase import create_client,Client
 from AI_ChatBot.logging import logger
+from AI_ChatBot.utils.metrics import span
+from AI_ChatBot.entity import RouterConfig, ContextPackingConfig, LLMPoolConfig
+from AI_ChatBot.config.configuration import ConfigurationManager
 from AI_ChatBot.components.query_processing import QueryProcessor
+from AI_ChatBot.components.router import QueryRouter, RETRIEVE, SMALLTALK
+from AI_ChatBot.components.context_packer import ContextPacker, estimate_tokens
+from AI_ChatBot.components.llm_pool import LLMPool
 
 from langgraph.graph import END
-from langchain_core.tools import tool
-from langchain.chat_models import init_chat_model
+from langchain_core.tools import StructuredTool
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import MessagesState, StateGraph
-from langgraph.prebuilt import ToolNode, tools_condition
+from langgraph.prebuilt import InjectedState, ToolNode, tools_condition
 from langchain_core.messages import SystemMessage,AIMessage
 
+class ChatState(MessagesState):
+    # the LLM call that produced the latest answer (read by app.py for the response cache)
+    model: str
+    is_fallback: bool
+    latency: float
+    # the user's question as the semantic cache tier embeds it (set by app.py)
+    user_query: str
+
+def _same_question(a: str, b: str) -> bool:
+    """True when two queries differ only in case, punctuation or spacing."""
+    def words(text: str) -> str:
+        return " ".join(re.findall(r"\w+", text.casefold()))
+    return words(a) == words(b)
+
+def _retrieval_query(query: str, state) -> str:
+    """
+    The user's own text when the tool query is the same question, so retrieval
+    embeds the string the semantic tier embeds (one shared vector and embedding
+    call); the LLM's rewrite otherwise.
+    """
+    user_query = (state or {}).get("user_query")
+    if user_query and query != user_query and _same_question(query, user_query):
+        return user_query
+    return query
+
+def _format_docs(docs):
+    if not docs:
+        return "", []
+    serialized_parts = []
+    for doc in docs:
+        meta = doc['metadata'] or {}
+        source = meta.get("filename",'unknown')
+        citation = f"Source: {source}"
+        content = doc['text']
+        serialized_parts.append(f"{citation}\nContent: {content}")
+    serialized = "\n\nContext:\n" + "\n\n".join(serialized_parts)
+    return serialized, docs
+
 class RAG:
-    def __init__(self,processor:QueryProcessor):
+    def __init__(self,processor:QueryProcessor,router_config:RouterConfig=None,
+                 packing_config:ContextPackingConfig=None,pool_config:LLMPoolConfig=None):
         load_dotenv()
-        try: 
-            os.environ["GOOGLE_API_KEY"] = os.getenv('GOOGLE_API_KEY')
-            self.llm = init_chat_model("gemini-2.0-flash", model_provider="google_genai")
-        except Exception as e:
-            # fall back
-            try:
-                os.environ["GROQ_API_KEY"] = os.getenv("GROQ_API_KEY")
-                self.llm = init_chat_model("llama3-8b-8192", model_provider="groq")
-            except:
-                try:
-                    os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
-                    self.llm = init_chat_model("gpt-3.5-turbo", model_provider="openai")
-                except:
-                    raise ValueError("All model initializations failed")
+        self.processor = processor
+        self.router = QueryRouter(router_config) if router_config is not None and router_config.enabled else None
+        self.packer = ContextPacker(packing_config) if packing_config is not None and packing_config.enabled else None
+        # providers are ranked per call by latency and health (see LLMPool)
+        self.pool = LLMPool(pool_config or ConfigurationManager().getLLMPoolConfig())
         
-        @tool(response_format="content_and_artifact")
-        def retrieve(query: str):
+        def retrieve(query: str, state: Annotated[dict, InjectedState] = None):
             """Retrieve information related to a query."""
             try:
-                res = processor.process(query)
-                docs = res['retrieved_chunks']
-                if not docs:
-                    return "", []
-                serialized_parts = []
-                for doc in docs:
-                    meta = doc['metadata'] or {}
-                    source = meta.get("filename",'unknown')
-                    citation = f"Source: {source}"
-                    content = doc['text']
-                    serialized_parts.append(f"{citation}\nContent: {content}")
-                serialized = "\n\nContext:\n" + "\n\n".join(serialized_parts)
-                return serialized, docs
+                with span("retrieve"):
+                    res = processor.process(_retrieval_query(query, state))
+                return _format_docs(res['retrieved_chunks'])
             except Exception as e:
                 logger.error(f"Error in retrieve tool: {e}")
                 return "", []
-        
-        self.retrieve = retrieve
+
+        async def aretrieve(query: str, state: Annotated[dict, InjectedState] = None):
+            """Retrieve information related to a query."""
+            try:
+                with span("retrieve"):
+                    res = await processor.aprocess(_retrieval_query(query, state))
+                return _format_docs(res['retrieved_chunks'])
+            except Exception as e:
+                logger.error(f"Error in retrieve tool: {e}")
+                return "", []
+
+        # Sync and async implementations share one tool so both graph.invoke and graph.ainvoke work
+        self.retrieve = StructuredTool.from_function(
+            func=retrieve,
+            coroutine=aretrieve,
+            name="retrieve",
+            response_format="content_and_artifact",
+        )
     
     
     
-    def query_or_respond(self,state: MessagesState):
-        """Generate tool call for retrieval or respond."""
+    def _query_or_respond_messages(self, state: ChatState):
         override_system = SystemMessage(
             content=(
                 "You are a world‑class financial and AI tutor developed by Zetheta Algorithms. "
@@ -63,15 +104,86 @@ class RAG:
                 "Keep your tone conversational, concise, and jargon‑free. "
             )
         )
-        messages = [override_system] + state["messages"]
-        llm_with_tools = self.llm.bind_tools([self.retrieve])
-        response =  llm_with_tools.invoke(messages)
-            
+        return [override_system] + state["messages"]
+
+    def query_or_respond(self,state: ChatState):
+        """Generate tool call for retrieval or respond."""
+        messages = self._query_or_respond_messages(state)
+        with span("query_or_respond"):
+            response, meta = self.pool.invoke(messages, tools=[self.retrieve])
         # MessagesState appends messages to state instead of overwriting
-        return {"messages": [response]}
+        return {"messages": [response], **meta}
+
+    async def aquery_or_respond(self,state: ChatState):
+        """Async variant of `query_or_respond`."""
+        messages = self._query_or_respond_messages(state)
+        with span("query_or_respond"):
+            response, meta = await self.pool.ainvoke(messages, tools=[self.retrieve])
+        return {"messages": [response], **meta}
     
-    def generate(self,state: MessagesState):
-        """Generate answer."""
+    def _route(self, state: ChatState):
+        """
+        Decide locally whether the LLM router is needed. Returns the router's
+        message (a direct `retrieve` call) or None for small talk / fallback,
+        along with the chosen route.
+        """
+        messages = state["messages"]
+        last = messages[-1]
+        text = last.content if isinstance(last.content, str) else ""
+        intent = self.processor.analyze_intent(self.processor.preprocess_query(text))
+        route = self.router.route(text, intent, has_history=len(messages) > 1)
+        if route == RETRIEVE:
+            call = {"name": self.retrieve.name, "args": {"query": text}, "id": f"route_{uuid.uuid4().hex}"}
+            return route, AIMessage(content="", tool_calls=[call])
+        return route, None
+
+    def _smalltalk_messages(self, state: ChatState):
+        system = SystemMessage(content=(
+            "You are a friendly financial and AI tutor developed by Zetheta Algorithms. "
+            "Reply to this small talk in one or two short sentences and offer help with "
+            "financial markets, fintech or AI questions. Never mention your internal model name or provider."
+        ))
+        return [system] + state["messages"][-4:]
+
+    def route(self, state: ChatState):
+        with span("route"):
+            route, message = self._route(state)
+        if route == SMALLTALK:
+            with span("smalltalk"):
+                message, meta = self.pool.invoke(self._smalltalk_messages(state))
+            return {"messages": [message], **meta}
+        return {"messages": [message]} if message is not None else {"messages": []}
+
+    async def aroute(self, state: ChatState):
+        """Async variant of `route`."""
+        with span("route"):
+            route, message = self._route(state)
+        if route == SMALLTALK:
+            with span("smalltalk"):
+                message, meta = await self.pool.ainvoke(self._smalltalk_messages(state))
+            return {"messages": [message], **meta}
+        return {"messages": [message]} if message is not None else {"messages": []}
+
+    @staticmethod
+    def _after_route(state: ChatState):
+        last = state["messages"][-1]
+        if last.type == "ai":
+            return "tools" if last.tool_calls else END
+        return "query_or_respond"
+
+    def _pack_context(self, tool_messages) -> str:
+        """Context for the generation prompt: the retrieved chunks packed within the token budget."""
+        raw = "\n\n".join(doc.content for doc in tool_messages)
+        docs = [doc for message in tool_messages for doc in (message.artifact or [])]
+        if self.packer is None or not docs:
+            return raw
+        with span("context_pack"):
+            packed, _ = _format_docs(self.packer.pack(docs))
+        self.packer.record(estimate_tokens(raw), estimate_tokens(packed))
+        return packed
+
+    def _generate_prompt(self, state: ChatState):
+        """Build the generation prompt from the latest ToolMessages and the conversation."""
         # Get generated ToolMessages
         recent_tool_messages = []
         for message in reversed(state["messages"]):
@@ -82,7 +194,7 @@ class RAG:
         tool_messages = recent_tool_messages[::-1]
 
         # Format into prompt
-        docs_content = "\n\n".join(doc.content for doc in tool_messages)
+        docs_content = self._pack_context(tool_messages)
         system_parts = [
             "You are an expert educational assistant for financial markets, Fintech, and AI concepts. Created by Zetheta.",
             "Use the provided context from the organization's knowledge base to answer accurately.",
@@ -102,22 +214,56 @@ class RAG:
             if message.type in ("human", "system")
             or (message.type == "ai" and not message.tool_calls)
         ]
-        prompt = [SystemMessage(system_prompt)] + conversation_messages
+        return [SystemMessage(system_prompt)] + conversation_messages
+
+    def generate(self,state: ChatState):
+        """Generate answer."""
+        prompt = self._generate_prompt(state)
         try:
-            response = self.llm.invoke(prompt)
+            with span("generate"):
+                response, meta = self.pool.invoke(prompt)
         except Exception as e:
             logger.error(f"Error in generate node: {e}")
             response = AIMessage(content="I'm sorry, I encountered an error generating the response.")
-        return {"messages": [response]}
+            meta = {"model": "", "is_fallback": True, "latency": 0.0}
+        return {"messages": [response], **meta}
+
+    async def agenerate(self,state: ChatState):
+        """Async variant of `generate`."""
+        prompt = self._generate_prompt(state)
+        try:
+            with span("generate"):
+                response, meta = await self.pool.ainvoke(prompt)
+        except Exception as e:
+            logger.error(f"Error in generate node: {e}")
+            response = AIMessage(content="I'm sorry, I encountered an error generating the response.")
+            meta = {"model": "", "is_fallback": True, "latency": 0.0}
+        return {"messages": [response], **meta}
 
     def build_graph(self):
-        self.graph_builder = StateGraph(MessagesState)
+        self.graph_builder = StateGraph(ChatState)
         tools_node = ToolNode([self.retrieve])
-        self.graph_builder.add_node(self.query_or_respond)
+        self.graph_builder.add_node(
+            "query_or_respond",
+            RunnableLambda(self.query_or_respond, afunc=self.aquery_or_respond)
+        )
         self.graph_builder.add_node(tools_node)
-        self.graph_builder.add_node(self.generate)
+        self.graph_builder.add_node(
+            "generate",
+            RunnableLambda(self.generate, afunc=self.agenerate)
+        )
 
-        self.graph_builder.set_entry_point("query_or_respond")
+        if self.router is not None:
+            # local routing first; the LLM router only runs when it is unsure
+            self.graph_builder.add_node("route", RunnableLambda(self.route, afunc=self.aroute))
+            self.graph_builder.set_entry_point("route")
+            self.graph_builder.add_conditional_edges(
+                "route",
+                self._after_route,
+                {END: END, tools_node.name: tools_node.name, "query_or_respond": "query_or_respond"},
+            )
+        else:
+            self.graph_builder.set_entry_point("query_or_respond")
         self.graph_builder.add_conditional_edges(
             "query_or_respond",
             tools_condition,
@@ -0,0 +1,148 @@
+import threading
+from collections import OrderedDict
+from time import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from supabase import Client
+
+from AI_ChatBot.entity import RetrievalCacheConfig
+from AI_ChatBot.logging import logger
+from AI_ChatBot.utils.metrics import count_lookup
+
+
+def fetch_corpus_version(supabase: Client, documents_table: str) -> str:
+    """
+    Version of the ingested corpus: the document count plus the latest
+    `updated_at`/`version` of the documents table, which ingestion bumps on
+    every (re)ingestion and which drops with every deletion.
+    """
+    resp = supabase.table(documents_table) \
+        .select("version,updated_at", count="exact") \
+        .order("updated_at", desc=True).limit(1).execute()
+    latest = (resp.data or [{}])[0]
+    return f"{resp.count}:{latest.get('updated_at')}:{latest.get('version')}"
+
+
+class RetrievalCache:
+    """
+    In-memory TTL + LRU cache of retrieval results.
+
+    Keyed by the preprocessed query together with `top_k` and
+    `similarity_threshold`, so a repeated search string costs a dictionary
+    lookup instead of an embedding call and a `match_chunks` round-trip.
+    Entries are tagged with the corpus version (see `fetch_corpus_version`).
+    A background thread polls that version and drops every entry as soon as
+    it changes.
+    """
+    def __init__(self, config: RetrievalCacheConfig, supabase: Client = None):
+        self.config = config
+        self.supabase = supabase
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[Tuple[str, int, float], Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self.corpus_version: Optional[str] = None
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.invalidations = 0
+        self._stop = threading.Event()
+        self._refresher: Optional[threading.Thread] = None
+        # called with the new version whenever `check_version` sees it change
+        self.version_listeners: List[Callable[[str], None]] = []
+
+    @staticmethod
+    def _key(query: str, top_k: int, threshold: float) -> Tuple[str, int, float]:
+        return query, top_k, threshold
+
+    def get(self, query: str, top_k: int, threshold: float) -> Optional[List[Dict[str, Any]]]:
+        key = self._key(query, top_k, threshold)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                count_lookup("retrieval", False)
+                return None
+            created, results = entry
+            if time() - created > self.config.ttl:
+                del self.entries[key]
+                self.expired += 1
+                self.misses += 1
+                count_lookup("retrieval", False)
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        count_lookup("retrieval", True)
+        # callers may annotate their results; keep the cached rows untouched
+        return [dict(r) for r in results]
+
+    def set(self, query: str, top_k: int, threshold: float, results: List[Dict[str, Any]],
+            version: Optional[str] = None):
+        """
+        Store `results`. `version` is the corpus version read before the search
+        started; results computed against an older corpus are not stored.
+        """
+        key = self._key(query, top_k, threshold)
+        with self.lock:
+            if version != self.corpus_version:
+                return
+            self.entries[key] = (time(), [dict(r) for r in results])
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.config.max_entries:
+                self.entries.popitem(last=False)
+
+    # — Corpus version —
+    def fetch_corpus_version(self) -> Optional[str]:
+        if self.supabase is None:
+            return None
+        return fetch_corpus_version(self.supabase, self.config.documents_table)
+
+    def check_version(self) -> bool:
+        """Re-read the corpus version; returns True when the cache was invalidated."""
+        version = self.fetch_corpus_version()
+        with self.lock:
+            if version == self.corpus_version:
+                return False
+            previous, self.corpus_version = self.corpus_version, version
+            dropped = len(self.entries)
+            self.entries.clear()
+            if previous is not None:
+                self.invalidations += 1
+        if previous is not None:
+            logger.info(f"Corpus version changed ({previous} → {version}); dropped {dropped} cached retrievals")
+            for listener in self.version_listeners:
+                listener(version)
+        return True
+
+    def start_refresher(self):
+        if self.config.version_check_interval <= 0 or self._refresher is not None:
+            return
+
+        def _loop():
+            while not self._stop.wait(self.config.version_check_interval):
+                try:
+                    self.check_version()
+                except Exception as e:
+                    logger.error(f"Corpus version check failed: {e}")
+
+        self._refresher = threading.Thread(target=_loop, name="retrieval-cache-version", daemon=True)
+        self._refresher.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.config.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "expired": self.expired,
+                "invalidations": self.invalidations,
+                "corpus_version": self.corpus_version,
+            }
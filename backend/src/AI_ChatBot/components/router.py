@@ -0,0 +1,91 @@
+import re
+import threading
+from typing import Dict, Tuple
+
+from AI_ChatBot.entity import RouterConfig
+
+RETRIEVE = "retrieve"
+SMALLTALK = "smalltalk"
+LLM = "llm"
+
+_SMALLTALK_RE = re.compile(
+    r"^(hi|hello|hey|hiya|yo|good (morning|afternoon|evening)|thanks|thank you|thx|ok(ay)?|cool|great|nice|"
+    r"bye|goodbye|see you|how are you|how's it going|who are you|what can you do|what are you)\b",
+    re.I,
+)
+# vocabulary of the knowledge base: markets, fintech and AI
+_DOMAIN_TERMS = frozenset("""
+stock stocks share shares equity equities bond bonds yield yields etf etfs fund funds mutual index indices
+market markets trading trade trader option options futures derivative derivatives hedge hedging portfolio
+dividend dividends earnings revenue profit valuation ratio pe eps ipo inflation interest rate rates fed
+central bank banking loan loans credit debt risk volatility return returns asset assets liquidity forex
+currency crypto bitcoin ethereum blockchain defi fintech payment payments upi wallet insurance tax taxes
+capital investment invest investing investor broker exchange nasdaq nyse sensex nifty sebi sec regulation
+compliance kyc aml algorithm algorithmic quant quantitative model models machine learning ai neural
+network networks llm regression classification backtest backtesting alpha beta sharpe arbitrage
+""".split())
+_FOLLOW_UP_RE = re.compile(r"\b(it|its|that|this|those|these|they|them|their|he|she|above|previous)\b", re.I)
+_TICKER_RE = re.compile(r"\b[A-Z]{2,5}(\.[A-Z])?\b")
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
+class QueryRouter:
+    """
+    Cheap local routing in front of the tool-selection LLM call.
+
+    Scores the latest user message with a few weighted signals (the intent from
+    `QueryProcessor.analyze_intent`, domain vocabulary, tickers, question form,
+    small-talk phrases). Clear knowledge questions go straight to `retrieve`;
+    clear small talk gets one short LLM reply; anything in between, and
+    follow-ups that lean on earlier turns, goes to the LLM router as before.
+    """
+    def __init__(self, config: RouterConfig):
+        self.config = config
+        self.lock = threading.Lock()
+        self.counts: Dict[str, int] = {RETRIEVE: 0, SMALLTALK: 0, LLM: 0}
+
+    def score(self, text: str, intent: Dict, has_history: bool) -> Tuple[float, float]:
+        """Return (knowledge, smalltalk) evidence, each in [0, 1]."""
+        words = _WORD_RE.findall(text.lower())
+        domain_hits = sum(w in _DOMAIN_TERMS for w in words)
+        knowledge = 0.0
+        if intent.get("question_type") in ("definition", "comparison", "explanation"):
+            knowledge += 0.4
+        knowledge += min(domain_hits, 3) * 0.2
+        if _TICKER_RE.search(text):
+            knowledge += 0.3
+        if text.rstrip().endswith("?"):
+            knowledge += 0.1
+        smalltalk = 0.0
+        if _SMALLTALK_RE.match(text.strip()):
+            smalltalk += 0.6
+        if len(words) <= self.config.max_smalltalk_words and not domain_hits:
+            smalltalk += 0.3
+        if has_history and _FOLLOW_UP_RE.search(text) and not domain_hits:
+            # "what about its risks?" needs the conversation to become a search query
+            knowledge -= 0.5
+        return max(0.0, min(knowledge, 1.0)), min(smalltalk, 1.0)
+
+    def route(self, text: str, intent: Dict, has_history: bool) -> str:
+        knowledge, smalltalk = self.score(text, intent, has_history)
+        if knowledge >= self.config.retrieve_threshold and smalltalk < self.config.smalltalk_threshold:
+            route = RETRIEVE
+        elif smalltalk >= self.config.smalltalk_threshold and knowledge < self.config.retrieve_threshold / 2:
+            route = SMALLTALK
+        else:
+            route = LLM
+        with self.lock:
+            self.counts[route] += 1
+        return route
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            counts = dict(self.counts)
+        total = sum(counts.values())
+        return {
+            **counts,
+            "total": total,
+            # a direct retrieve skips the tool-selection call; small talk replaces it with a cheaper one
+            "llm_calls_saved": counts[RETRIEVE],
+            "llm_router_fallback_ratio": round(counts[LLM] / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,157 @@
+import queue
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set
+
+from AI_ChatBot.components.data_transformation import DataTransformation
+from AI_ChatBot.components.data_vectorization import DataVectorization
+from AI_ChatBot.components.manifest import IngestionManifest, IngestionPlan
+from AI_ChatBot.entity import StreamingConfig
+from AI_ChatBot.logging import logger
+
+_DONE = object()
+
+
+class StreamingIngestion:
+    """
+    parse → embed → upsert as concurrent stages joined by bounded queues.
+
+    The calling thread parses files (in the worker processes of `DataTransformation`)
+    and cuts each file's chunks into slices of `slice_chunks`; `embed_workers`
+    embed threads turn slices into chunk records (sharing the vectorizer's
+    embedding scheduler, so its batches from several slices are in flight at
+    once) and an upsert thread writes them. A full queue
+    blocks the stage feeding it, so at most `queue_size` slices wait between two
+    stages and memory does not grow with the corpus. Parsed documents are dropped
+    as soon as they are chunked; only chunk ids and text hashes are kept for the
+    manifest. Document versions are bumped in `sync_manifest`, and only for files
+    that parsed and had every chunk batch written.
+    """
+    def __init__(self, transformer: DataTransformation, vectorizer: DataVectorization,
+                 config: StreamingConfig):
+        self.transformer = transformer
+        self.vectorizer = vectorizer
+        self.config = config
+        self.embed_q: queue.Queue = queue.Queue(maxsize=config.queue_size)
+        self.upsert_q: queue.Queue = queue.Queue(maxsize=config.queue_size)
+        self.stop = threading.Event()
+        self.error: Optional[BaseException] = None
+        self.doc_ids: Dict[str, str] = {}
+        self.new_ids: Dict[str, List[str]] = defaultdict(list)
+        self.new_hashes: Dict[str, List[str]] = defaultdict(list)
+        self.parsed: Set[str] = set()
+        self.lock = threading.Lock()
+        self.embedders_left = max(1, config.embed_workers)
+        self.files = 0
+        self.chunks = 0
+        self.upserted = 0
+
+    def _put(self, q: queue.Queue, item):
+        # blocks while the next stage is behind (back-pressure), but not past a failure
+        while not self.stop.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+        raise RuntimeError("ingestion aborted") from self.error
+
+    def _get(self, q: queue.Queue):
+        while not self.stop.is_set():
+            try:
+                return q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _fail(self, error: BaseException):
+        if self.error is None:
+            self.error = error
+        self.stop.set()
+
+    def _embed_stage(self):
+        try:
+            while True:
+                item = self._get(self.embed_q)
+                if item is _DONE:
+                    # pass the marker on to the other embed threads; the last one closes the upsert stage
+                    self._put(self.embed_q, _DONE)
+                    with self.lock:
+                        self.embedders_left -= 1
+                        last = self.embedders_left == 0
+                    if last:
+                        self._put(self.upsert_q, _DONE)
+                    return
+                filename, chunks = item
+                if filename not in self.doc_ids:
+                    self.doc_ids.update(self.vectorizer.upsert_document_details(chunks))
+                texts = [doc.page_content for doc in chunks]
+                embeddings = self.vectorizer.batch_embed(texts, self.vectorizer.params.batch_embed)
+                records = self.vectorizer.build_records(chunks, embeddings, self.doc_ids)
+                with self.lock:
+                    self.vectorizer.summarize_chunks(chunks, self.new_ids, self.new_hashes)
+                self._put(self.upsert_q, records)
+        except BaseException as e:
+            if not self.stop.is_set():
+                logger.exception("Embedding stage failed")
+            self._fail(e)
+
+    def _upsert_stage(self):
+        try:
+            while True:
+                records = self._get(self.upsert_q)
+                if records is _DONE:
+                    return
+                results = self.vectorizer.upsert_records(records)
+                self.upserted += len(records) - sum(r["rows"] for r in results if r["status"] != "ok")
+        except BaseException as e:
+            if not self.stop.is_set():
+                logger.exception("Upsert stage failed")
+            self._fail(e)
+
+    def run(self, plan: IngestionPlan) -> Dict[str, Any]:
+        started = time.perf_counter()
+        workers = [
+            threading.Thread(target=self._embed_stage, name=f"ingest-embed-{i}", daemon=True)
+            for i in range(self.embedders_left)
+        ]
+        workers.append(threading.Thread(target=self._upsert_stage, name="ingest-upsert", daemon=True))
+        # document ids in one round-trip, without bumping versions; the embed stage
+        # only covers files missing here
+        self.doc_ids.update(self.vectorizer.register_documents([path.name for path in plan.changed]))
+        for w in workers:
+            w.start()
+        parsed = self.transformer.iter_documents(plan.changed)
+        try:
+            for path, docs, chunks in parsed:
+                del docs
+                self.files += 1
+                self.chunks += len(chunks)
+                filename = chunks[0].metadata.get("filename", path.name) if chunks else path.name
+                self.parsed.add(filename)
+                for i in range(0, len(chunks), self.config.slice_chunks):
+                    self._put(self.embed_q, (filename, chunks[i:i + self.config.slice_chunks]))
+            self._put(self.embed_q, _DONE)
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            parsed.close()
+            for w in workers:
+                w.join()
+        if self.error is not None:
+            raise self.error
+
+        elapsed = time.perf_counter() - started
+        logger.info(f"Streaming ingestion: {self.files} files, {self.upserted} chunks in {elapsed:.1f}s")
+        return {
+            "ingested_files": self.files,
+            "ingested_chunks": self.upserted,
+            "seconds": round(elapsed, 2),
+        }
+
+    def sync_manifest(self, manifest: IngestionManifest, plan: IngestionPlan):
+        self.vectorizer.sync_summaries(manifest, plan, self.new_ids, self.new_hashes, self.doc_ids,
+                                       parsed=self.parsed)
+        # after the stale chunks are gone, so a new corpus version means the final state
+        self.vectorizer.commit_documents(sorted(self.parsed - self.vectorizer.failed_files))
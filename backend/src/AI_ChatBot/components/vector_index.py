@@ -0,0 +1,354 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+from supabase import Client
+
+from AI_ChatBot.entity import VectorIndexConfig
+from AI_ChatBot.logging import logger
+
+
+class LocalVectorIndex:
+    """
+    In-process replica of the `chunks` table used as a retrieval backend.
+
+    Embeddings are kept in a memory-mapped float32 matrix (`embeddings.f32`) with a
+    parallel text/metadata store (`store.json`); Supabase stays the system of record.
+    Top-k is answered with a NumPy dot product over L2-normalized rows, optionally
+    restricted to the `nprobe` closest partitions of an IVF (k-means) layout.
+    Returned `similarity` values are cosine similarities.
+
+    Syncs page Supabase without holding `lock`; searches only wait while the
+    fetched rows are applied or a rebuilt snapshot is swapped in.
+    """
+    COLUMNS = "id,document_id,chunk_index,text,metadata,embedding,updated_at"
+    # k-means needs enough points per list to produce useful partitions
+    MIN_POINTS_PER_LIST = 39
+
+    def __init__(self, config: VectorIndexConfig, supabase: Client, table_name: str = "chunks"):
+        self.config = config
+        self.supabase = supabase
+        self.table_name = table_name
+        self.root_dir = Path(config.root_dir)
+        self.root_dir.mkdir(parents=True, exist_ok=True)
+        self.matrix_path = self.root_dir / "embeddings.f32"
+        self.store_path = self.root_dir / "store.json"
+        self.state_path = self.root_dir / "state.json"
+        self.ivf_path = self.root_dir / "ivf.npz"
+
+        self.lock = threading.RLock()           # guards the searchable state below
+        self._sync_lock = threading.Lock()      # one sync at a time
+        self.matrix: Optional[np.memmap] = None
+        self.capacity = 0
+        self.dim = 0
+        self.size = 0
+        self.rows: List[Dict[str, Any]] = []    # row → {id, document_id, chunk_index, text, metadata}
+        self.row_of: Dict[str, int] = {}        # chunk id → row
+        self.watermark: Optional[str] = None    # max updated_at seen
+        self.centroids: Optional[np.ndarray] = None
+        self.assignments: Optional[np.ndarray] = None
+        self._stop = threading.Event()
+        self._refresher: Optional[threading.Thread] = None
+
+    # — Storage —
+    def _open_matrix(self, capacity: int, mode: str) -> np.memmap:
+        return np.memmap(self.matrix_path, dtype=np.float32, mode=mode, shape=(capacity, self.dim))
+
+    def _grown_matrix(self, needed: int):
+        """
+        A larger copy of the matrix, written and mapped without taking `lock`
+        (only syncs write rows, and they are serialized). None when it fits.
+        """
+        if self.matrix is not None and needed <= self.capacity:
+            return None
+        new_capacity = max(needed, self.capacity * 2, 1024)
+        tmp_path = self.matrix_path.with_suffix(".tmp")
+        grown = np.memmap(tmp_path, dtype=np.float32, mode="w+", shape=(new_capacity, self.dim))
+        if self.matrix is not None and self.size:
+            grown[:self.size] = self.matrix[:self.size]
+        grown.flush()
+        del grown
+        # searches keep reading the old mapping; the inode outlives the rename
+        os.replace(tmp_path, self.matrix_path)
+        return new_capacity, self._open_matrix(new_capacity, "r+")
+
+    def _persist(self):
+        if self.matrix is not None:
+            self.matrix.flush()
+        with open(self.store_path, "w", encoding="utf-8") as fp:
+            json.dump(self.rows, fp)
+        with open(self.state_path, "w", encoding="utf-8") as fp:
+            json.dump({
+                "dim": self.dim,
+                "size": self.size,
+                "capacity": self.capacity,
+                "watermark": self.watermark,
+            }, fp)
+        if self.centroids is not None:
+            np.savez(self.ivf_path, centroids=self.centroids, assignments=self.assignments[:self.size])
+        elif self.ivf_path.exists():
+            self.ivf_path.unlink()
+
+    def load(self) -> bool:
+        """Load a previously persisted replica. Returns False when none exists."""
+        if not (self.state_path.exists() and self.store_path.exists() and self.matrix_path.exists()):
+            return False
+        with self.lock:
+            with open(self.state_path, encoding="utf-8") as fp:
+                state = json.load(fp)
+            with open(self.store_path, encoding="utf-8") as fp:
+                self.rows = json.load(fp)
+            self.dim = state["dim"]
+            self.size = state["size"]
+            self.capacity = state["capacity"]
+            self.watermark = state.get("watermark")
+            self.matrix = self._open_matrix(self.capacity, "r+") if self.capacity else None
+            self.row_of = {r["id"]: i for i, r in enumerate(self.rows)}
+            self.centroids, self.assignments = None, None
+            if self.ivf_path.exists():
+                ivf = np.load(self.ivf_path)
+                self.centroids = ivf["centroids"]
+                self.assignments = np.resize(ivf["assignments"], max(self.capacity, 1)).astype(np.int32)
+        logger.info(f"Local vector index loaded: {self.size} chunks, dim={self.dim}")
+        return True
+
+    # — Sync with Supabase —
+    def _fetch_rows(self, since: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        start = 0
+        page = self.config.page_size
+        while True:
+            query = self.supabase.table(self.table_name).select(self.COLUMNS)
+            if since:
+                query = query.gt("updated_at", since)
+            resp = query.order("updated_at").order("id").range(start, start + page - 1).execute()
+            data = resp.data or []
+            yield from data
+            if len(data) < page:
+                break
+            start += page
+
+    @staticmethod
+    def _parse_embedding(raw) -> np.ndarray:
+        # pgvector columns come back from PostgREST as a "[0.1,0.2,...]" string
+        if isinstance(raw, str):
+            raw = json.loads(raw)
+        arr = np.asarray(raw, dtype=np.float32)
+        norm = np.linalg.norm(arr)
+        return arr / norm if norm > 0 else arr
+
+    @staticmethod
+    def _record(row: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": row["id"],
+            "document_id": row.get("document_id"),
+            "chunk_index": row.get("chunk_index"),
+            "text": row.get("text", ""),
+            "metadata": row.get("metadata") or {},
+        }
+
+    def _fetch_changes(self, since: Optional[str], dim: int):
+        """Page rows from Supabase (no lock held); returns (records, vectors, watermark)."""
+        records, vectors, watermark = [], [], since
+        for row in self._fetch_rows(since):
+            vec = self._parse_embedding(row["embedding"])
+            if not dim:
+                dim = vec.shape[0]
+            elif vec.shape[0] != dim:
+                logger.warning(f"Skipping chunk {row['id']}: embedding dim {vec.shape[0]} != {dim}")
+                continue
+            records.append(self._record(row))
+            vectors.append(vec)
+            updated_at = row.get("updated_at")
+            if updated_at and (watermark is None or updated_at > watermark):
+                watermark = updated_at
+        return records, vectors, watermark
+
+    def _apply(self, records: List[Dict[str, Any]], vectors: List[np.ndarray], watermark: Optional[str]):
+        """Apply fetched rows in place; `lock` is held only for the row writes."""
+        if not self.dim:
+            self.dim = vectors[0].shape[0]
+        added = len({r["id"] for r in records} - self.row_of.keys())
+        grown = self._grown_matrix(self.size + added)
+        with self.lock:
+            if grown is not None:
+                self.capacity, self.matrix = grown
+                if self.assignments is not None and self.assignments.shape[0] < self.capacity:
+                    self.assignments = np.resize(self.assignments, self.capacity)
+            for record, vec in zip(records, vectors):
+                idx = self.row_of.get(record["id"])
+                if idx is None:
+                    idx = self.size
+                    self.size += 1
+                    self.rows.append(record)
+                    self.row_of[record["id"]] = idx
+                else:
+                    self.rows[idx] = record
+                self.matrix[idx] = vec
+                if self.centroids is not None:
+                    self.assignments[idx] = int(np.argmax(self.centroids @ vec))
+            self.watermark = watermark
+
+    def _swap_in(self, records: List[Dict[str, Any]], vectors: np.ndarray, watermark: Optional[str]):
+        """
+        Write `vectors` to a new matrix file, partition it, then replace the
+        searchable state in one step. The previous snapshot serves until then.
+        """
+        size = len(records)
+        dim = vectors.shape[1] if size else 0
+        capacity = max(size, 1024) if size else 0
+        if size:
+            tmp_path = self.matrix_path.with_suffix(".tmp")
+            fresh = np.memmap(tmp_path, dtype=np.float32, mode="w+", shape=(capacity, dim))
+            fresh[:size] = vectors
+            fresh.flush()
+            del fresh
+        centroids = assignments = None
+        if self.config.ivf_lists > 0 and size >= self.config.ivf_lists * self.MIN_POINTS_PER_LIST:
+            centroids, assignments = self._build_ivf(vectors, capacity)
+        with self.lock:
+            self.matrix = None
+            self.dim, self.capacity, self.size = dim, capacity, size
+            if size:
+                os.replace(self.matrix_path.with_suffix(".tmp"), self.matrix_path)
+                self.matrix = self._open_matrix(capacity, "r+")
+            elif self.matrix_path.exists():
+                self.matrix_path.unlink()
+            self.rows = records
+            self.row_of = {r["id"]: i for i, r in enumerate(records)}
+            self.watermark = watermark
+            self.centroids, self.assignments = centroids, assignments
+
+    def _remote_ids(self) -> Optional[set]:
+        ids, start, page = set(), 0, self.config.page_size
+        try:
+            while True:
+                resp = self.supabase.table(self.table_name).select("id") \
+                    .order("id").range(start, start + page - 1).execute()
+                data = resp.data or []
+                ids.update(r["id"] for r in data)
+                if len(data) < page:
+                    return ids
+                start += page
+        except Exception as e:
+            logger.warning(f"Local vector index: could not list remote chunk ids: {e}")
+            return None
+
+    def _drop_deleted(self) -> int:
+        """Compact away rows whose chunk no longer exists upstream; returns how many."""
+        remote = self._remote_ids()
+        if remote is None:
+            return 0
+        keep = [i for i, r in enumerate(self.rows) if r["id"] in remote]
+        removed = self.size - len(keep)
+        if removed:
+            vectors = np.asarray(self.matrix[keep]) if keep else np.zeros((0, self.dim), dtype=np.float32)
+            self._swap_in([self.rows[i] for i in keep], vectors, self.watermark)
+            logger.info(f"Local vector index: dropped {removed} chunks deleted upstream")
+        return removed
+
+    def sync(self, full: bool = False) -> int:
+        """
+        Pull rows changed since the last `updated_at` watermark (or everything when
+        `full`, swapped in only once complete). Deletions cannot be seen through
+        `updated_at`, so the remote ids are compared after each incremental pull.
+        Returns the number of rows applied.
+        """
+        with self._sync_lock:
+            if full:
+                records, vectors, watermark = self._fetch_changes(None, 0)
+                dim = vectors[0].shape[0] if vectors else 0
+                self._swap_in(records, np.stack(vectors) if vectors else np.zeros((0, dim), np.float32), watermark)
+                applied = len(records)
+            else:
+                records, vectors, watermark = self._fetch_changes(self.watermark, self.dim)
+                if records:
+                    self._apply(records, vectors, watermark)
+                applied = len(records)
+                removed = self._drop_deleted() if self.size else 0
+                if not (applied or removed):
+                    return 0
+            self._persist()
+        if applied:
+            logger.info(f"Local vector index synced: {applied} rows applied, {self.size} total")
+        return applied
+
+    def load_or_sync(self):
+        if self.load():
+            self.sync()
+        else:
+            self.sync(full=True)
+
+    def start_refresher(self):
+        """Refresh incrementally every `refresh_interval` seconds in a daemon thread."""
+        if self.config.refresh_interval <= 0 or self._refresher is not None:
+            return
+
+        def _loop():
+            while not self._stop.wait(self.config.refresh_interval):
+                try:
+                    self.sync()
+                except Exception as e:
+                    logger.error(f"Local vector index refresh failed: {e}")
+
+        self._refresher = threading.Thread(target=_loop, name="vector-index-refresh", daemon=True)
+        self._refresher.start()
+
+    def stop(self):
+        self._stop.set()
+
+    # — IVF partitioning —
+    def _build_ivf(self, data: np.ndarray, capacity: int, iterations: int = 10, seed: int = 0):
+        """Spherical k-means over (a sample of) `data`; returns the centroids and each row's list."""
+        size = data.shape[0]
+        nlist = self.config.ivf_lists
+        rng = np.random.default_rng(seed)
+        sample = data[rng.choice(size, size=min(size, nlist * 256), replace=False)]
+        centroids = sample[rng.choice(sample.shape[0], size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[labels == c]
+                if members.shape[0]:
+                    centroid = members.sum(axis=0)
+                    norm = np.linalg.norm(centroid)
+                    centroids[c] = centroid / norm if norm > 0 else centroid
+        centroids = centroids.astype(np.float32)
+        assignments = np.zeros(max(capacity, 1), dtype=np.int32)
+        batch = 65536
+        for start in range(0, size, batch):
+            block = data[start:start + batch]
+            assignments[start:start + block.shape[0]] = np.argmax(block @ centroids.T, axis=1)
+        logger.info(f"Local vector index: built IVF with {nlist} lists over {size} rows")
+        return centroids, assignments
+
+    # — Retrieval —
+    def is_ready(self) -> bool:
+        return self.size > 0
+
+    def search(self, query_vec, top_k: int) -> List[Dict[str, Any]]:
+        """Return the `top_k` closest chunks in the shape of `match_chunks` rows."""
+        q = np.asarray(query_vec, dtype=np.float32)
+        with self.lock:
+            if not self.size or q.shape[0] != self.dim:
+                return []
+            if self.centroids is not None:
+                nprobe = min(self.config.nprobe, self.centroids.shape[0])
+                probes = np.argpartition(-(self.centroids @ q), nprobe - 1)[:nprobe]
+                candidates = np.flatnonzero(np.isin(self.assignments[:self.size], probes))
+                scores = self.matrix[candidates] @ q
+            else:
+                candidates = None
+                scores = self.matrix[:self.size] @ q
+            k = min(top_k, scores.shape[0])
+            if k == 0:
+                return []
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            results = []
+            for i in top:
+                row = int(i) if candidates is None else int(candidates[i])
+                results.append({**self.rows[row], "similarity": float(scores[i])})
+        return results
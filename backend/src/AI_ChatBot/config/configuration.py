@@ -7,10 +7,28 @@ from AI_ChatBot.entity import (
     LoaderConfig, 
     RecursiveConfig, 
     SemanticConfig, 
+    ParsingConfig,
     DataTransformationParams,
+    DataVectorizationConfig,
     VectorizationConfig,
     QueryConfig,
-    CacheConfig
+    CacheConfig,
+    VectorIndexConfig,
+    HistoryConfig,
+    PersistenceConfig,
+    EmbeddingSchedulerConfig,
+    StreamingConfig,
+    UpsertConfig,
+    StartupConfig,
+    LexicalIndexConfig,
+    EmbeddingConfig,
+    EmbeddingBatcherConfig,
+    RouterConfig,
+    RetrievalCacheConfig,
+    ContextPackingConfig,
+    LLMProviderConfig,
+    LLMPoolConfig,
+    MetricsConfig
     )
 
 
@@ -71,12 +89,33 @@ class ConfigurationManager:
             buffer_size = int(params.buffer_size)
         )
 
+    def getParsingConfig(self)->ParsingConfig:
+        params = self.params.parsing
+
+        return ParsingConfig(
+            executor=str(params.executor),
+            max_workers=int(params.max_workers),
+            file_timeout=float(params.file_timeout)
+        )
+
     def getDataTransformationParams(self)->DataTransformationParams:
 
         return DataTransformationParams(
             loader = self.getLoaderConfig(),
             recursive = self.getRecursiveConfig(),
-            semantic = self.getSemanticConfig()
+            semantic = self.getSemanticConfig(),
+            parsing = self.getParsingConfig()
+        )
+
+    def get_DataVectorizationConfig(self) -> DataVectorizationConfig:
+        config = self.config.data_vectorization
+
+        createDir([config.root_dir])
+        return DataVectorizationConfig(
+            root_dir=Path(config.root_dir),
+            manifest_file=Path(config.manifest_file),
+            embedding_store=Path(config.embedding_store),
+            upsert_report=Path(config.upsert_report)
         )
 
     def getVectorizationConfig(self)->VectorizationConfig:
@@ -94,9 +133,23 @@ class ConfigurationManager:
 
         return QueryConfig(
             similarity_threshold=params.similarity_threshold,
-            top_k=params.top_k
+            top_k=params.top_k,
+            backend=str(params.backend)
         )    
 
+    def getVectorIndexConfig(self)->VectorIndexConfig:
+        config = self.config.vector_index
+        params = self.params.vector_index
+
+        createDir([config.root_dir])
+        return VectorIndexConfig(
+            root_dir=Path(config.root_dir),
+            ivf_lists=int(params.ivf_lists),
+            nprobe=int(params.nprobe),
+            refresh_interval=int(params.refresh_interval),
+            page_size=int(params.page_size)
+        )
+
     def get_CacheConfig(self) -> CacheConfig:
         config = self.config.cache
         params = self.params.cache
@@ -108,5 +161,176 @@ class ConfigurationManager:
             query_dir=config.query_dir,
             vectors_max_size=params.vectors_max_size,
             response_ttl=params.response_ttl,
-            json_max_bytes=params.json_max_bytes
-        )
\ No newline at end of file
+            json_max_bytes=params.json_max_bytes,
+            response_sweep_interval=int(params.response_sweep_interval),
+            response_index_persist=bool(params.response_index_persist),
+            semantic_enabled=bool(params.semantic_enabled),
+            semantic_threshold=float(params.semantic_threshold),
+            semantic_near_miss_margin=float(params.semantic_near_miss_margin),
+            semantic_max_entries=int(params.semantic_max_entries)
+        )
+
+    def getHistoryConfig(self)->HistoryConfig:
+        params = self.params.history
+
+        return HistoryConfig(
+            max_sessions=int(params.max_sessions),
+            turn_limit=int(params.turn_limit)
+        )
+
+    def getPersistenceConfig(self)->PersistenceConfig:
+        params = self.params.persistence
+
+        return PersistenceConfig(
+            batch_size=int(params.batch_size),
+            flush_interval=float(params.flush_interval),
+            max_retries=int(params.max_retries),
+            retry_backoff=float(params.retry_backoff),
+            queue_max=int(params.queue_max)
+        )
+
+    def getEmbeddingSchedulerConfig(self)->EmbeddingSchedulerConfig:
+        params = self.params.embedding_scheduler
+
+        return EmbeddingSchedulerConfig(
+            batch_size=int(self.params.supabase.batch_embed),
+            min_batch=int(params.min_batch),
+            max_batch=int(params.max_batch),
+            initial_concurrency=int(params.initial_concurrency),
+            max_concurrency=int(params.max_concurrency),
+            target_latency=float(params.target_latency),
+            max_retries=int(params.max_retries),
+            retry_backoff=float(params.retry_backoff)
+        )
+
+    def getStreamingConfig(self)->StreamingConfig:
+        params = self.params.streaming
+
+        return StreamingConfig(
+            queue_size=int(params.queue_size),
+            slice_chunks=int(params.slice_chunks),
+            embed_workers=int(params.embed_workers)
+        )
+
+    def getUpsertConfig(self)->UpsertConfig:
+        params = self.params.upsert
+
+        return UpsertConfig(
+            max_batch_bytes=int(params.max_batch_bytes),
+            concurrency=int(params.concurrency),
+            max_retries=int(params.max_retries),
+            retry_backoff=float(params.retry_backoff)
+        )
+
+    def getStartupConfig(self)->StartupConfig:
+        params = self.params.startup
+
+        return StartupConfig(
+            fast_start=bool(params.fast_start)
+        )
+
+    def getLexicalIndexConfig(self)->LexicalIndexConfig:
+        config = self.config.lexical_index
+        params = self.params.lexical_index
+
+        return LexicalIndexConfig(
+            root_dir=Path(config.root_dir),
+            enabled=bool(params.enabled),
+            k1=float(params.k1),
+            b=float(params.b),
+            rrf_k=int(params.rrf_k),
+            fast_path_max_terms=int(params.fast_path_max_terms),
+            fast_path_margin=float(params.fast_path_margin),
+            bm25_floor=float(params.bm25_floor),
+            page_size=int(params.page_size),
+            refresh_interval=int(params.refresh_interval),
+            documents_table=self.params.supabase.docs
+        )
+
+    def getEmbeddingConfig(self)->EmbeddingConfig:
+        config = self.config.embedding
+        params = self.params.embedding
+
+        return EmbeddingConfig(
+            backend=str(params.backend),
+            model_repo=str(params.model_repo),
+            onnx_file=str(params.onnx_file),
+            model_dir=Path(config.model_dir),
+            max_length=int(params.max_length),
+            batch_size=int(params.batch_size),
+            intra_op_threads=int(params.intra_op_threads),
+            pool_workers=int(params.pool_workers)
+        )
+
+    def getEmbeddingBatcherConfig(self)->EmbeddingBatcherConfig:
+        params = self.params.embedding_batcher
+
+        return EmbeddingBatcherConfig(
+            enabled=bool(params.enabled),
+            max_wait_ms=float(params.max_wait_ms),
+            max_batch=int(params.max_batch),
+            max_inflight=int(params.max_inflight)
+        )
+
+    def getRouterConfig(self)->RouterConfig:
+        params = self.params.router
+
+        return RouterConfig(
+            enabled=bool(params.enabled),
+            retrieve_threshold=float(params.retrieve_threshold),
+            smalltalk_threshold=float(params.smalltalk_threshold),
+            max_smalltalk_words=int(params.max_smalltalk_words)
+        )
+
+    def getRetrievalCacheConfig(self)->RetrievalCacheConfig:
+        params = self.params.retrieval_cache
+
+        return RetrievalCacheConfig(
+            enabled=bool(params.enabled),
+            max_entries=int(params.max_entries),
+            ttl=int(params.ttl),
+            version_check_interval=int(params.version_check_interval),
+            documents_table=self.params.supabase.docs
+        )
+
+    def getContextPackingConfig(self)->ContextPackingConfig:
+        params = self.params.context_packing
+
+        return ContextPackingConfig(
+            enabled=bool(params.enabled),
+            token_budget=int(params.token_budget),
+            min_overlap=int(params.min_overlap),
+            max_overlap=int(params.max_overlap),
+            min_span_chars=int(params.min_span_chars),
+            min_block_tokens=int(params.min_block_tokens)
+        )
+
+    def getLLMPoolConfig(self)->LLMPoolConfig:
+        params = self.params.llm_pool
+
+        return LLMPoolConfig(
+            providers=tuple(
+                LLMProviderConfig(
+                    name=p.name,
+                    model=p.model,
+                    provider=p.provider,
+                    api_key_env=p.api_key_env
+                )
+                for p in params.providers
+            ),
+            window=int(params.window),
+            min_samples=int(params.min_samples),
+            max_error_rate=float(params.max_error_rate),
+            cooldown=float(params.cooldown),
+            hedge=bool(params.hedge),
+            hedge_percentile=float(params.hedge_percentile),
+            hedge_min_delay=float(params.hedge_min_delay),
+            hedge_max_delay=float(params.hedge_max_delay)
+        )
+
+    def getMetricsConfig(self)->MetricsConfig:
+        params = self.params.metrics
+
+        return MetricsConfig(
+            timings_in_response=bool(params.timings_in_response)
+        )
@@ -1,5 +1,6 @@
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Tuple
 
 @dataclass(frozen=True)
 class DataIngestionConfig:
@@ -32,11 +33,25 @@ class SemanticConfig:
     breakpoint_threshold_amount: int
     buffer_size: int
 
+@dataclass(frozen=True)
+class ParsingConfig:
+    executor: str
+    max_workers: int
+    file_timeout: float
+
 @dataclass(frozen=True)
 class DataTransformationParams:
     loader: LoaderConfig
     recursive: RecursiveConfig
     semantic: SemanticConfig
+    parsing: ParsingConfig
+
+@dataclass(frozen=True)
+class DataVectorizationConfig:
+    root_dir: Path
+    manifest_file: Path
+    embedding_store: Path
+    upsert_report: Path
 
 @dataclass
 class VectorizationConfig:
@@ -49,6 +64,15 @@ class VectorizationConfig:
 class QueryConfig:
     similarity_threshold: int
     top_k: int
+    backend: str
+
+@dataclass(frozen=True)
+class VectorIndexConfig:
+    root_dir: Path
+    ivf_lists: int
+    nprobe: int
+    refresh_interval: int
+    page_size: int
 
 @dataclass(frozen=True)
 class CacheConfig:
@@ -56,4 +80,130 @@ class CacheConfig:
     query_dir: Path
     vectors_max_size: int
     response_ttl: int
-    json_max_bytes: int
\ No newline at end of file
+    json_max_bytes: int
+    response_sweep_interval: int
+    response_index_persist: bool
+    semantic_enabled: bool
+    semantic_threshold: float
+    semantic_near_miss_margin: float
+    semantic_max_entries: int
+
+@dataclass(frozen=True)
+class HistoryConfig:
+    max_sessions: int
+    turn_limit: int
+
+@dataclass(frozen=True)
+class PersistenceConfig:
+    batch_size: int
+    flush_interval: float
+    max_retries: int
+    retry_backoff: float
+    queue_max: int
+
+@dataclass(frozen=True)
+class EmbeddingSchedulerConfig:
+    batch_size: int
+    min_batch: int
+    max_batch: int
+    initial_concurrency: int
+    max_concurrency: int
+    target_latency: float
+    max_retries: int
+    retry_backoff: float
+
+@dataclass(frozen=True)
+class StreamingConfig:
+    queue_size: int
+    slice_chunks: int
+    embed_workers: int
+
+@dataclass(frozen=True)
+class UpsertConfig:
+    max_batch_bytes: int
+    concurrency: int
+    max_retries: int
+    retry_backoff: float
+
+@dataclass(frozen=True)
+class StartupConfig:
+    fast_start: bool
+
+@dataclass(frozen=True)
+class LexicalIndexConfig:
+    root_dir: Path
+    enabled: bool
+    k1: float
+    b: float
+    rrf_k: int
+    fast_path_max_terms: int
+    fast_path_margin: float
+    bm25_floor: float
+    page_size: int
+    refresh_interval: int
+    documents_table: str
+
+@dataclass(frozen=True)
+class EmbeddingConfig:
+    backend: str
+    model_repo: str
+    onnx_file: str
+    model_dir: Path
+    max_length: int
+    batch_size: int
+    intra_op_threads: int
+    pool_workers: int
+
+@dataclass(frozen=True)
+class EmbeddingBatcherConfig:
+    enabled: bool
+    max_wait_ms: float
+    max_batch: int
+    max_inflight: int
+
+@dataclass(frozen=True)
+class RouterConfig:
+    enabled: bool
+    retrieve_threshold: float
+    smalltalk_threshold: float
+    max_smalltalk_words: int
+
+@dataclass(frozen=True)
+class RetrievalCacheConfig:
+    enabled: bool
+    max_entries: int
+    ttl: int
+    version_check_interval: int
+    documents_table: str
+
+@dataclass(frozen=True)
+class ContextPackingConfig:
+    enabled: bool
+    token_budget: int
+    min_overlap: int
+    max_overlap: int
+    min_span_chars: int
+    min_block_tokens: int
+
+@dataclass(frozen=True)
+class LLMProviderConfig:
+    name: str
+    model: str
+    provider: str
+    api_key_env: str
+
+@dataclass(frozen=True)
+class LLMPoolConfig:
+    providers: Tuple[LLMProviderConfig, ...]
+    window: int
+    min_samples: int
+    max_error_rate: float
+    cooldown: float
+    hedge: bool
+    hedge_percentile: float
+    hedge_min_delay: float
+    hedge_max_delay: float
+
+@dataclass(frozen=True)
+class MetricsConfig:
+    timings_in_response: bool
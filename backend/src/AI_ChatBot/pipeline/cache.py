@@ -10,4 +10,5 @@ class CacheTrainingPipeline:
         configuration_manager = ConfigurationManager()
         cache_config = configuration_manager.get_CacheConfig()
         cache = CacheManager(cache_config)
+        cache.start_maintenance()
         return cache
\ No newline at end of file
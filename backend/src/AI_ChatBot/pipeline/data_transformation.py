@@ -1,5 +1,6 @@
 from AI_ChatBot.config.configuration import ConfigurationManager
 from AI_ChatBot.components.data_transformation import DataTransformation
+from AI_ChatBot.components.manifest import IngestionManifest
 from AI_ChatBot.logging import logger
 
 class DataTransformationTrainingPipeline:
@@ -10,6 +11,10 @@ class DataTransformationTrainingPipeline:
         configuration_manager = ConfigurationManager()
         data_transformation_config = configuration_manager.get_DataTransformationConfig()
         data_transformation_params = configuration_manager.getDataTransformationParams()
+        data_vectorization_config = configuration_manager.get_DataVectorizationConfig()
         data_transformation = DataTransformation(data_transformation_config,data_transformation_params)
-        docs,chunks = data_transformation.load_documents()
-        return docs,chunks
\ No newline at end of file
+        # only new or changed files are parsed and chunked
+        manifest = IngestionManifest(data_vectorization_config.manifest_file)
+        plan = manifest.plan(data_transformation.list_source_files())
+        docs,chunks = data_transformation.load_documents(plan.changed)
+        return docs,chunks,plan
@@ -1,5 +1,6 @@
 from AI_ChatBot.config.configuration import ConfigurationManager
 from AI_ChatBot.components.data_vectorization import DataVectorization
+from AI_ChatBot.components.manifest import IngestionManifest
 from AI_ChatBot.logging import logger
 from dotenv import load_dotenv
 import os
@@ -8,10 +9,36 @@ class DataVectorizationPipeline:
     def __init__(self):
         pass
 
-    def main(self, chunks):
+    def main(self, chunks, plan):
         configuration_manager = ConfigurationManager()
         data_vectorization_config = configuration_manager.getVectorizationConfig()
-        data_vectorization = DataVectorization(data_vectorization_config)
-        embed_status = data_vectorization.ingest_chunks(chunks)
+        data_vectorization_paths = configuration_manager.get_DataVectorizationConfig()
+        scheduler_config = configuration_manager.getEmbeddingSchedulerConfig()
+        upsert_config = configuration_manager.getUpsertConfig()
+        data_vectorization = DataVectorization(
+            data_vectorization_config,
+            data_vectorization_paths.embedding_store,
+            scheduler_config,
+            upsert_config,
+            configuration_manager.getEmbeddingConfig()
+        )
+        manifest = IngestionManifest(data_vectorization_paths.manifest_file)
+        doc_ids = data_vectorization.ingest_chunks(chunks) if chunks else {}
+        data_vectorization.sync_manifest(manifest, plan, chunks, doc_ids)
+        data_vectorization.prune_embedding_store(manifest)
+        embed_status = {
+            "ingested_files": len({c.metadata.get("filename") for c in chunks}),
+            "ingested_chunks": len(chunks),
+            "skipped_files": len(plan.unchanged),
+            "deleted_files": len(plan.deleted),
+        }
+        if data_vectorization.embedding_store is not None:
+            embed_status["embedding_store"] = data_vectorization.embedding_store.stats()
+        if data_vectorization.scheduler is not None:
+            embed_status["embedding_throughput"] = data_vectorization.scheduler.report()
+            data_vectorization.scheduler.close()
+        if data_vectorization.upsert_report:
+            data_vectorization.write_upsert_report(data_vectorization_paths.upsert_report)
+            embed_status["upsert"] = data_vectorization.upsert_summary()
         return embed_status
-    
\ No newline at end of file
+    
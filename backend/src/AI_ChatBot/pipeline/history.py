@@ -0,0 +1,13 @@
+from AI_ChatBot.config.configuration import ConfigurationManager
+from AI_ChatBot.components.history import SessionHistoryStore
+from AI_ChatBot.logging import logger
+
+class SessionHistoryPipeline:
+    def __init__(self):
+        pass
+
+    def main(self):
+        configuration_manager = ConfigurationManager()
+        history_config = configuration_manager.getHistoryConfig()
+        history_store = SessionHistoryStore(history_config)
+        return history_store
@@ -0,0 +1,53 @@
+from AI_ChatBot.config.configuration import ConfigurationManager
+from AI_ChatBot.components.data_transformation import DataTransformation
+from AI_ChatBot.components.data_vectorization import DataVectorization
+from AI_ChatBot.components.manifest import IngestionManifest
+from AI_ChatBot.components.streaming_ingestion import StreamingIngestion
+from AI_ChatBot.components.lexical_index import LexicalIndex
+from AI_ChatBot.logging import logger
+
+class StreamingIngestionPipeline:
+    def __init__(self):
+        pass
+
+    def main(self):
+        configuration_manager = ConfigurationManager()
+        data_transformation = DataTransformation(
+            configuration_manager.get_DataTransformationConfig(),
+            configuration_manager.getDataTransformationParams()
+        )
+        data_vectorization_paths = configuration_manager.get_DataVectorizationConfig()
+        data_vectorization = DataVectorization(
+            configuration_manager.getVectorizationConfig(),
+            data_vectorization_paths.embedding_store,
+            configuration_manager.getEmbeddingSchedulerConfig(),
+            configuration_manager.getUpsertConfig(),
+            configuration_manager.getEmbeddingConfig()
+        )
+        # only new or changed files are parsed, embedded and upserted
+        manifest = IngestionManifest(data_vectorization_paths.manifest_file)
+        plan = manifest.plan(data_transformation.list_source_files())
+        ingestion = StreamingIngestion(
+            data_transformation, data_vectorization, configuration_manager.getStreamingConfig()
+        )
+        embed_status = ingestion.run(plan)
+        ingestion.sync_manifest(manifest, plan)
+        data_vectorization.prune_embedding_store(manifest)
+        lexical_config = configuration_manager.getLexicalIndexConfig()
+        if lexical_config.enabled:
+            # rebuilt from the table so it covers unchanged files too
+            lexical_index = LexicalIndex(lexical_config, data_vectorization.supabase, data_vectorization.params.chunks)
+            embed_status["lexical_index_chunks"] = lexical_index.build_from_table()
+        embed_status.update({
+            "skipped_files": len(plan.unchanged),
+            "deleted_files": len(plan.deleted),
+        })
+        if data_vectorization.embedding_store is not None:
+            embed_status["embedding_store"] = data_vectorization.embedding_store.stats()
+        if data_vectorization.scheduler is not None:
+            embed_status["embedding_throughput"] = data_vectorization.scheduler.report()
+            data_vectorization.scheduler.close()
+        if data_vectorization.upsert_report:
+            data_vectorization.write_upsert_report(data_vectorization_paths.upsert_report)
+            embed_status["upsert"] = data_vectorization.upsert_summary()
+        return embed_status
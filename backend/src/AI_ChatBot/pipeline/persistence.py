@@ -0,0 +1,13 @@
+from AI_ChatBot.config.configuration import ConfigurationManager
+from AI_ChatBot.components.persistence import HistoryWriter
+from AI_ChatBot.logging import logger
+
+class HistoryPersistencePipeline:
+    def __init__(self):
+        pass
+
+    def main(self):
+        configuration_manager = ConfigurationManager()
+        persistence_config = configuration_manager.getPersistenceConfig()
+        history_writer = HistoryWriter(persistence_config)
+        return history_writer
@@ -1,5 +1,9 @@
 from AI_ChatBot.config.configuration import ConfigurationManager
 from AI_ChatBot.components.query_processing import QueryProcessor
+from AI_ChatBot.components.vector_index import LocalVectorIndex
+from AI_ChatBot.components.lexical_index import LexicalIndex
+from AI_ChatBot.components.embedding_batcher import EmbeddingBatcher
+from AI_ChatBot.components.retrieval_cache import RetrievalCache
 from AI_ChatBot.logging import logger
 
 class QueryProcessingPipeline:
@@ -9,7 +13,49 @@ class QueryProcessingPipeline:
     def main(self):
         configuration_manager = ConfigurationManager()
         query_config = configuration_manager.getQueryConfig()
-        query_processor = QueryProcessor(query_config)
+        embedding_config = configuration_manager.getEmbeddingConfig()
+        query_processor = QueryProcessor(query_config, embedding_config)
+
+        batcher_config = configuration_manager.getEmbeddingBatcherConfig()
+        if batcher_config.enabled and hasattr(query_processor, "embedding_model"):
+            query_processor.attach_batcher(
+                EmbeddingBatcher(query_processor.embedding_model.embed_documents, batcher_config)
+            )
+
+        if query_config.backend == "local":
+            index_config = configuration_manager.getVectorIndexConfig()
+            vector_index = LocalVectorIndex(index_config, query_processor.supabase, query_processor.table_name)
+            try:
+                vector_index.load_or_sync()
+                vector_index.start_refresher()
+                query_processor.attach_index(vector_index)
+            except Exception as e:
+                logger.exception(f"Local vector index unavailable, using match_chunks RPC: {e}")
+
+        lexical_index = None
+        lexical_config = configuration_manager.getLexicalIndexConfig()
+        if lexical_config.enabled:
+            lexical_index = LexicalIndex(lexical_config, query_processor.supabase, query_processor.table_name)
+            try:
+                lexical_index.load_or_build()
+                lexical_index.start_refresher()
+                query_processor.attach_lexical_index(lexical_index)
+            except Exception as e:
+                lexical_index = None
+                logger.exception(f"Lexical index unavailable, using dense retrieval only: {e}")
+
+        retrieval_cache_config = configuration_manager.getRetrievalCacheConfig()
+        if retrieval_cache_config.enabled:
+            retrieval_cache = RetrievalCache(retrieval_cache_config, query_processor.supabase)
+            try:
+                retrieval_cache.check_version()
+            except Exception as e:
+                logger.error(f"Corpus version unavailable, retrieval cache relies on its TTL: {e}")
+            if lexical_index is not None:
+                # rebuild BM25 on the same version change that drops cached retrievals
+                retrieval_cache.version_listeners.append(lexical_index.request_refresh)
+            retrieval_cache.start_refresher()
+            query_processor.attach_retrieval_cache(retrieval_cache)
 
         return query_processor
 
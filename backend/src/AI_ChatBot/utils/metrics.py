@@ -0,0 +1,168 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# seconds, from sub-millisecond in-process work up to slow upstream calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """
+    Thread-safe fixed-bucket histogram (Prometheus-style cumulative `le` buckets).
+    Percentiles are estimated by linear interpolation inside the bucket.
+    """
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.bounds: List[float] = sorted(buckets)
+        self.counts: List[int] = [0] * (len(self.bounds) + 1)   # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        slot = bisect.bisect_left(self.bounds, value)
+        with self.lock:
+            self.counts[slot] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def percentile(self, q: float) -> float:
+        with self.lock:
+            counts, total, top = list(self.counts), self.count, self.max
+        if not total:
+            return 0.0
+        rank = q / 100 * total
+        seen = 0
+        for slot, n in enumerate(counts):
+            if n and seen + n >= rank:
+                lower = self.bounds[slot - 1] if slot > 0 else 0.0
+                upper = self.bounds[slot] if slot < len(self.bounds) else top
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return top
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            counts, total, summed, top = list(self.counts), self.count, self.sum, self.max
+        cumulative, buckets = 0, {}
+        for bound, n in zip(self.bounds + [float("inf")], counts):
+            cumulative += n
+            buckets["+Inf" if bound == float("inf") else str(bound)] = cumulative
+        return {
+            "count": total,
+            "sum": round(summed, 6),
+            "mean": round(summed / total, 6) if total else 0.0,
+            "max": round(top, 6),
+            "p50": round(self.percentile(50), 6),
+            "p95": round(self.percentile(95), 6),
+            "p99": round(self.percentile(99), 6),
+            "buckets": buckets,
+        }
+
+
+class MetricsRegistry:
+    """
+    Labelled histograms and counters of the chat service, rendered in the
+    Prometheus text exposition format at /metrics.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.help: Dict[str, Tuple[str, str]] = {}   # name → (type, help)
+        self.histograms: Dict[Tuple[str, LabelSet], Histogram] = {}
+        self.counters: Dict[Tuple[str, LabelSet], float] = {}
+
+    def describe(self, name: str, kind: str, text: str):
+        self.help[name] = (kind, text)
+
+    def observe(self, name: str, value: float, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(key, Histogram())
+        histogram.observe(value)
+
+    def inc(self, name: str, amount: float = 1, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    @staticmethod
+    def _labels(labels: LabelSet, extra: str = "") -> str:
+        parts = [f'{k}="{v}"' for k, v in labels]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self) -> str:
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        lines: List[str] = []
+        described = set()
+
+        def header(name: str, kind: str):
+            if name not in described:
+                described.add(name)
+                lines.append(f"# HELP {name} {self.help.get(name, (kind, name))[1]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), histogram in histograms:
+            header(name, "histogram")
+            with histogram.lock:
+                counts, total, summed = list(histogram.counts), histogram.count, histogram.sum
+            cumulative = 0
+            for bound, n in zip(histogram.bounds + ["+Inf"], counts):
+                cumulative += n
+                le = 'le="%s"' % bound
+                lines.append(f"{name}_bucket{self._labels(labels, le)} {cumulative}")
+            lines.append(f"{name}_sum{self._labels(labels)} {summed}")
+            lines.append(f"{name}_count{self._labels(labels)} {total}")
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{name}{self._labels(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+REGISTRY.describe("chat_stage_seconds", "histogram", "Time spent in each stage of a chat request.")
+REGISTRY.describe("chat_request_seconds", "histogram", "End-to-end chat request latency.")
+REGISTRY.describe("cache_lookups_total", "counter", "Cache lookups by tier and result.")
+
+# per-request stage timings, set by `start_timings` for the request being served
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+def start_timings(timings: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+    """
+    Collect the spans of the current request (and the tasks/threads it starts)
+    into `timings`, or a new dict.
+    """
+    timings = {} if timings is None else timings
+    _timings.set(timings)
+    return timings
+
+
+@contextmanager
+def span(stage: str):
+    """Time a stage into `chat_stage_seconds` and the current request's timings."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        REGISTRY.observe("chat_stage_seconds", elapsed, stage=stage)
+        timings = _timings.get()
+        if timings is not None:
+            timings[stage] = round(timings.get(stage, 0.0) + elapsed, 6)
+
+
+def count_lookup(tier: str, hit: bool):
+    REGISTRY.inc("cache_lookups_total", tier=tier, result="hit" if hit else "miss")
@@ -0,0 +1,63 @@
+import importlib
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List
+
+from AI_ChatBot.logging import logger
+
+
+def rss_mb() -> float:
+    """Current resident set size in MB (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * resource.getpagesize() / 2**20
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # bytes on macOS, kilobytes on Linux
+        return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+class StartupReport:
+    """
+    Wall time and RSS growth of each startup step (module imports, client and
+    pipeline construction), so it is visible which dependency costs a cold start.
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.base_rss_mb = rss_mb()
+        self.steps: List[Dict[str, Any]] = []
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def step(self, name: str):
+        t0, r0 = time.perf_counter(), rss_mb()
+        try:
+            yield
+        finally:
+            entry = {
+                "step": name,
+                "seconds": round(time.perf_counter() - t0, 4),
+                "rss_mb_delta": round(rss_mb() - r0, 1),
+            }
+            with self.lock:
+                self.steps.append(entry)
+            logger.info(f"Startup step {name}: {entry['seconds']}s, {entry['rss_mb_delta']:+} MB")
+
+    def import_module(self, name: str):
+        # modules already imported by an earlier step cost nothing here
+        with self.step(f"import {name}"):
+            return importlib.import_module(name)
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self.lock:
+            steps = list(self.steps)
+        return {
+            "uptime_seconds": round(time.perf_counter() - self.started, 3),
+            "rss_mb": round(rss_mb(), 1),
+            "base_rss_mb": round(self.base_rss_mb, 1),
+            "steps": steps,
+        }